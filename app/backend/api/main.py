@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
@@ -8,12 +8,18 @@ import os
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from app.config.settings import APP_NAME, APP_DESCRIPTION, VERSION, API_PREFIX, BACKEND_HOST, BACKEND_PORT
+from app.config.settings import (
+    APP_NAME, APP_DESCRIPTION, VERSION, API_PREFIX, BACKEND_HOST, BACKEND_PORT, WARMUP_ENABLED, MAX_UPLOAD_BYTES
+)
 
 # Import routers
 from app.backend.api.routers.documents import router as documents_router
 from app.backend.api.routers.chat import router as chat_router
 from app.backend.api.routers.quiz import router as quiz_router
+from app.backend.services.warmup import get_warmup_manager
+
+# Room for the multipart framing and form fields sent along with an uploaded file
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
 
 # Create FastAPI application
 app = FastAPI(
@@ -31,16 +37,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized request bodies by their declared length, before they are read and buffered
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"message": f"File is too large. Maximum size: {MAX_UPLOAD_BYTES} bytes"},
+        )
+    return await call_next(request)
+
 # Include routers
 app.include_router(documents_router, prefix=f"{API_PREFIX}/documents", tags=["documents"])
 app.include_router(chat_router, prefix=f"{API_PREFIX}/chat", tags=["chat"])
 app.include_router(quiz_router, prefix=f"{API_PREFIX}/quiz", tags=["quiz"])
 
+# Preload recently used document sets in the background
+@app.on_event("startup")
+async def start_warmup():
+    if WARMUP_ENABLED:
+        get_warmup_manager().start()
+
 # Health check endpoint
 @app.get("/health", tags=["health"])
 async def health_check():
     return {"status": "healthy", "version": VERSION}
 
+# Readiness endpoint, failing until warm-up has finished or timed out
+@app.get("/ready", tags=["health"])
+async def readiness_check():
+    warmup = get_warmup_manager().stats()
+    if not warmup["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming", "warmup": warmup})
+    return {"status": "ready", "version": VERSION, "warmup": warmup}
+
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
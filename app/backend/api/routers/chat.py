@@ -38,7 +38,7 @@ class ChatResponse(BaseModel):
     sources: Optional[List[Dict[str, Any]]] = None
 
 @router.post("/sessions", response_model=Dict[str, Any])
-async def create_session(session: SessionCreate):
+def create_session(session: SessionCreate):
     """
     Create a new chat session.
     """
@@ -49,7 +49,7 @@ async def create_session(session: SessionCreate):
         raise HTTPException(status_code=500, detail=f"Error creating chat session: {str(e)}")
 
 @router.get("/sessions/{session_id}", response_model=List[Dict[str, Any]])
-async def get_session_history(session_id: str):
+def get_session_history(session_id: str):
     """
     Get chat history for a session.
     """
@@ -64,7 +64,7 @@ async def get_session_history(session_id: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving chat history: {str(e)}")
 
 @router.post("/message", response_model=Dict[str, Any])
-async def send_message(message: MessageCreate):
+def send_message(message: MessageCreate):
     """
     Send a message and get a response from the AI.
     """
@@ -94,7 +94,8 @@ async def send_message(message: MessageCreate):
         return {
             "response": response_data.get("response", ""),
             "chat_history": response_data.get("chat_history", []),
-            "sources": response_data.get("sources", [])
+            "sources": response_data.get("sources", []),
+            "context": response_data.get("context")
         }
     
     except HTTPException:
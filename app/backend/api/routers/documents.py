@@ -13,7 +13,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
 from app.config.settings import RAW_DATA_DIR
 from app.backend.services.document_service import save_document, get_document_list, get_document_by_id, delete_document, process_document, get_documents, get_processed_text
 from app.backend.document_processors.processor_factory import ProcessorFactory
-from app.backend.services.embedding_service import generate_embeddings_for_document
+from app.backend.services.embedding_service import (
+    generate_embeddings_for_document, get_index_report, get_cache_stats, get_search_stats,
+    search_batch_in_document, compact_corpus_index
+)
 from app.backend.services.openai_service import generate_document_summary
 
 router = APIRouter()
@@ -35,6 +38,7 @@ class Document(BaseModel):
     upload_date: str
     processed: bool
     embedding_id: Optional[str] = None
+    duplicate_of: Optional[str] = None
 
 class DocumentList(BaseModel):
     documents: List[Document]
@@ -44,6 +48,10 @@ class DocumentSummary(BaseModel):
     title: str
     summary: str
 
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 5
+
 def process_document_task(document_id: str, file_path: str):
     """
     Background task to process a document and generate embeddings.
@@ -56,7 +64,7 @@ def process_document_task(document_id: str, file_path: str):
         generate_embeddings_for_document(document_id)
 
 @router.post("/upload", response_model=Document)
-async def upload_document(
+def upload_document(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: Optional[str] = Form(None)
@@ -71,19 +79,62 @@ async def upload_document(
     try:
         document = process_document(document_id, file, title, background_tasks)
         return document
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
 @router.get("/", response_model=DocumentList)
-async def list_documents():
+def list_documents():
     """
     Get a list of all available documents.
     """
     documents = get_documents()
     return {"documents": documents}
 
+@router.get("/index/report")
+def index_report(document_id: Optional[str] = None, k: int = 10):
+    """
+    Compare recall and latency of the flat, HNSW and IVF-PQ index types on stored vectors.
+    """
+    if document_id and get_document_by_id(document_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    try:
+        report = get_index_report([document_id] if document_id else None, k)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building index report: {str(e)}")
+
+    if document_id and not report:
+        raise HTTPException(status_code=422, detail="Document has no embeddings")
+    return {"report": report}
+
+@router.post("/index/compact")
+def compact_index():
+    """
+    Rewrite the corpus index without the chunks of deleted documents.
+    """
+    try:
+        return compact_corpus_index()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error compacting index: {str(e)}")
+
+@router.get("/cache/stats")
+def cache_stats():
+    """
+    Get hit rates and sizes of the embedding and vector store caches.
+    """
+    return get_cache_stats()
+
+@router.get("/search/stats")
+def search_stats():
+    """
+    Get batching gains of search and query embedding, and context tokens saved per chat turn.
+    """
+    return get_search_stats()
+
 @router.get("/{document_id}", response_model=Document)
-async def get_document(document_id: str):
+def get_document(document_id: str):
     """
     Get information about a specific document.
     """
@@ -93,7 +144,7 @@ async def get_document(document_id: str):
     return document
 
 @router.get("/{document_id}/summary", response_model=DocumentSummary)
-async def get_document_summary(document_id: str):
+def get_document_summary(document_id: str):
     """
     Generate a summary of a specific document.
     """
@@ -137,8 +188,25 @@ async def get_document_summary(document_id: str):
         print(f"Unexpected error generating summary for document {document_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating document summary: {str(e)}")
 
+@router.post("/{document_id}/search/batch")
+def batch_search(document_id: str, request: BatchSearchRequest):
+    """
+    Search a document for several queries in one embedding request and one index search.
+    """
+    if get_document_by_id(document_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    try:
+        results = search_batch_in_document(document_id, request.queries, request.top_k)
+        return {
+            "document_id": document_id,
+            "results": [{"query": query, "results": hits} for query, hits in zip(request.queries, results)]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching document: {str(e)}")
+
 @router.delete("/{document_id}")
-async def remove_document(document_id: str):
+def remove_document(document_id: str):
     """
     Delete a document and its processed data.
     """
@@ -36,7 +36,7 @@ class QuizResponse(BaseModel):
     difficulty: str
 
 @router.post("/generate", response_model=Dict[str, Any])
-async def create_quiz(quiz_request: QuizRequest):
+def create_quiz(quiz_request: QuizRequest):
     """
     Generate a quiz based on documents.
     """
@@ -80,7 +80,7 @@ async def create_quiz(quiz_request: QuizRequest):
         raise HTTPException(status_code=500, detail=f"Error generating quiz: {str(e)}")
 
 @router.post("/generate/topic", response_model=Dict[str, Any])
-async def create_topic_quiz(quiz_request: TopicQuizRequest):
+def create_topic_quiz(quiz_request: TopicQuizRequest):
     """
     Generate a quiz for a specific topic based on documents.
     """
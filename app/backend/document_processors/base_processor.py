@@ -6,12 +6,125 @@ from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
 import os
 import sys
+import json
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from app.config.settings import PROCESSED_DATA_DIR
 
+# Segment spans of content.txt, stored next to it
+SEGMENTS_FILE = "segments.json"
+SEGMENT_TYPES = ("page", "slide", "section", "table")
+
+
+class SegmentedText:
+    """
+    Text assembled from typed segments, recording the character span of each.
+
+    Segments are contiguous: starting a segment ends the previous one.
+    """
+
+    def __init__(self):
+        """Initialize an empty text."""
+        self.parts: List[str] = []
+        self.length = 0
+        self.segments: List[Dict[str, Any]] = []
+
+    def start_segment(self, segment_type: str, label: str) -> None:
+        """
+        Start a segment at the current end of the text.
+
+        Args:
+            segment_type: One of SEGMENT_TYPES
+            label: Human-readable name of the segment, e.g. "Page 3"
+        """
+        self.end_segment()
+        self.segments.append({"type": segment_type, "label": label, "start": self.length, "end": None})
+
+    def end_segment(self) -> None:
+        """End the open segment, if any."""
+        if self.segments and self.segments[-1]["end"] is None:
+            self.segments[-1]["end"] = self.length
+
+    def append(self, text: str) -> None:
+        """Append text to the open segment."""
+        self.parts.append(text)
+        self.length += len(text)
+
+    def build(self):
+        """
+        Get the stripped text and the spans of its non-empty segments.
+
+        Returns:
+            Tuple of the text and a list of segment dictionaries with type,
+            label, start and end offsets into it
+        """
+        self.end_segment()
+        text = "".join(self.parts)
+        stripped = text.strip()
+        leading = len(text) - len(text.lstrip())
+
+        segments = []
+        for segment in self.segments:
+            start = min(max(segment["start"] - leading, 0), len(stripped))
+            end = min(max(segment["end"] - leading, 0), len(stripped))
+            if stripped[start:end].strip():
+                segments.append({**segment, "start": start, "end": end})
+        return stripped, segments
+
+
+def save_segments(folder_path: str, segments: List[Dict[str, Any]]) -> None:
+    """
+    Write segment spans as columns, or remove a stale file when there are none.
+
+    Args:
+        folder_path: Processed output folder of a document
+        segments: Segment dictionaries in text order
+    """
+    path = os.path.join(folder_path, SEGMENTS_FILE)
+    if not segments:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+
+    types = sorted({segment["type"] for segment in segments})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "types": types,
+            "type": [types.index(segment["type"]) for segment in segments],
+            "label": [segment["label"] for segment in segments],
+            "start": [segment["start"] for segment in segments],
+            "end": [segment["end"] for segment in segments]
+        }, f, separators=(",", ":"))
+
+
+def load_segments(folder_path: str) -> List[Dict[str, Any]]:
+    """
+    Read the segment spans of a processed document.
+
+    Args:
+        folder_path: Processed output folder of a document
+
+    Returns:
+        Segment dictionaries in text order; empty for documents processed
+        without segments
+    """
+    path = os.path.join(folder_path, SEGMENTS_FILE)
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            columns = json.load(f)
+        return [
+            {"type": columns["types"][code], "label": label, "start": start, "end": end}
+            for code, label, start, end in zip(columns["type"], columns["label"], columns["start"], columns["end"])
+        ]
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        print(f"Error reading segments file: {str(e)}")
+        return []
+
+
 class BaseDocumentProcessor(ABC):
     """Base abstract class for document processors."""
     
@@ -26,6 +139,8 @@ class BaseDocumentProcessor(ABC):
         self.file_path = file_path
         self.document_id = document_id
         self.output_dir = os.path.join(PROCESSED_DATA_DIR, document_id)
+        # Segment spans of the extracted text, set by processors that know the document structure
+        self.segments: List[Dict[str, Any]] = []
         
         # Create output directory if it doesn't exist
         os.makedirs(self.output_dir, exist_ok=True)
@@ -60,6 +175,7 @@ class BaseDocumentProcessor(ABC):
         Returns:
             Dictionary with text content and metadata
         """
+        self.segments = []
         text = self.extract_text()
         metadata = self.extract_metadata()
         
@@ -67,9 +183,9 @@ class BaseDocumentProcessor(ABC):
         text_output_path = os.path.join(self.output_dir, 'content.txt')
         with open(text_output_path, 'w', encoding='utf-8') as f:
             f.write(text)
+        save_segments(self.output_dir, self.segments)
         
         # Save metadata to output file
-        import json
         metadata_output_path = os.path.join(self.output_dir, 'metadata.json')
         with open(metadata_output_path, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, indent=2)
@@ -77,6 +193,7 @@ class BaseDocumentProcessor(ABC):
         return {
             'text': text,
             'metadata': metadata,
+            'segments': self.segments,
             'text_path': text_output_path,
             'metadata_path': metadata_output_path
         }
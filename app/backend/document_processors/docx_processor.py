@@ -11,7 +11,7 @@ import docx
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from app.backend.document_processors.base_processor import BaseDocumentProcessor
+from app.backend.document_processors.base_processor import BaseDocumentProcessor, SegmentedText
 
 class DOCXProcessor(BaseDocumentProcessor):
     def validate_doc_format(self):
@@ -32,26 +32,30 @@ class DOCXProcessor(BaseDocumentProcessor):
             The extracted text content as a string
         """
         try:
-            text_content = ""
+            text_content = SegmentedText()
             
             # Open the DOCX file
             doc = docx.Document(self.file_path)
             
-            # Extract text from paragraphs
+            # Extract text from paragraphs; each heading starts a section segment
             for i, para in enumerate(doc.paragraphs):
                 if para.text.strip():
-                    text_content += para.text + "\n"
+                    if para.style is not None and para.style.name.startswith('Heading'):
+                        text_content.start_segment("section", para.text.strip())
+                    text_content.append(para.text + "\n")
             
-            # Extract text from tables
+            # Extract text from tables, one segment per table
             for i, table in enumerate(doc.tables):
-                text_content += f"\n--- Table {i+1} ---\n"
+                text_content.start_segment("table", f"Table {i+1}")
+                text_content.append(f"\n--- Table {i+1} ---\n")
                 for row in table.rows:
                     row_text = []
                     for cell in row.cells:
                         row_text.append(cell.text.strip())
-                    text_content += " | ".join(row_text) + "\n"
+                    text_content.append(" | ".join(row_text) + "\n")
             
-            return text_content.strip()
+            text, self.segments = text_content.build()
+            return text
         
         except Exception as e:
             error_msg = f"Error extracting text from DOCX: {str(e)}"
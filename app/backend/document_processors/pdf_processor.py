@@ -11,7 +11,7 @@ from typing import Dict, Any, List, Optional
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from app.backend.document_processors.base_processor import BaseDocumentProcessor
+from app.backend.document_processors.base_processor import BaseDocumentProcessor, SegmentedText
 
 class PDFProcessor(BaseDocumentProcessor):
     def validate_doc_format(self):
@@ -30,23 +30,25 @@ class PDFProcessor(BaseDocumentProcessor):
             The extracted text content as a string
         """
         try:
-            text_content = ""
+            text_content = SegmentedText()
             
             # Open the PDF file
             with open(self.file_path, 'rb') as file:
                 # Create PDF reader object
                 pdf_reader = pypdf.PdfReader(file)
                 
-                # Extract text from each page
+                # Extract text from each page, recording each page as a segment
                 for page_num in range(len(pdf_reader.pages)):
                     page = pdf_reader.pages[page_num]
                     page_text = page.extract_text()
                     
                     if page_text:
-                        text_content += f"\n--- Page {page_num + 1} ---\n"
-                        text_content += page_text + "\n"
+                        text_content.start_segment("page", f"Page {page_num + 1}")
+                        text_content.append(f"\n--- Page {page_num + 1} ---\n")
+                        text_content.append(page_text + "\n")
             
-            return text_content.strip()
+            text, self.segments = text_content.build()
+            return text
         
         except Exception as e:
             error_msg = f"Error extracting text from PDF: {str(e)}"
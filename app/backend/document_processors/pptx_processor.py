@@ -11,7 +11,7 @@ import pptx
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from app.backend.document_processors.base_processor import BaseDocumentProcessor
+from app.backend.document_processors.base_processor import BaseDocumentProcessor, SegmentedText
 
 class PPTXProcessor(BaseDocumentProcessor):
     def validate_doc_format(self):
@@ -30,19 +30,20 @@ class PPTXProcessor(BaseDocumentProcessor):
             The extracted text content as a string
         """
         try:
-            text_content = ""
+            text_content = SegmentedText()
             
             # Open the PPTX file
             presentation = pptx.Presentation(self.file_path)
             
-            # Extract text from each slide
+            # Extract text from each slide, recording each slide as a segment
             for i, slide in enumerate(presentation.slides):
                 slide_num = i + 1
-                text_content += f"\n--- Slide {slide_num} ---\n"
+                text_content.start_segment("slide", f"Slide {slide_num}")
+                text_content.append(f"\n--- Slide {slide_num} ---\n")
                 
                 # Get slide title if it exists
                 if slide.shapes.title:
-                    text_content += f"Title: {slide.shapes.title.text}\n\n"
+                    text_content.append(f"Title: {slide.shapes.title.text}\n\n")
                 
                 # Get text from all shapes in the slide
                 for shape in slide.shapes:
@@ -50,12 +51,13 @@ class PPTXProcessor(BaseDocumentProcessor):
                         # Skip the title that we've already added
                         if shape == slide.shapes.title:
                             continue
-                        text_content += shape.text + "\n"
+                        text_content.append(shape.text + "\n")
                 
                 # Add a separator between slides
-                text_content += "\n"
+                text_content.append("\n")
             
-            return text_content.strip()
+            text, self.segments = text_content.build()
+            return text
         
         except Exception as e:
             error_msg = f"Error extracting text from PPTX: {str(e)}"
@@ -13,8 +13,9 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from app.config.settings import DATA_DIR, OPENAI_API_KEY
-from app.backend.services.embedding_service import get_vectorstore_for_documents, search_in_document, get_embedding_model
+from app.backend.services.embedding_service import get_retriever_for_documents, search_in_document, get_embedding_model
 from app.backend.services.document_service import get_document_by_id, get_processed_text
+from app.backend.services.warmup import get_activity_log
 
 # Langchain imports for RAG
 from langchain_openai import ChatOpenAI
@@ -226,12 +227,12 @@ class ChatService:
                 print("None of the requested documents exist in the database")
                 return None
                 
-            # Get vector store for the documents
-            print(f"Getting vectorstore for documents: {', '.join(valid_docs)}")
-            vectorstore = get_vectorstore_for_documents(valid_docs)
+            # Get a corpus index retriever restricted to the documents
+            print(f"Getting retriever for documents: {', '.join(valid_docs)}")
+            retriever = get_retriever_for_documents(valid_docs, k=5)
                 
-            if not vectorstore:
-                print(f"Failed to create vectorstore for documents: {', '.join(valid_docs)}")
+            if not retriever:
+                print(f"Failed to create retriever for documents: {', '.join(valid_docs)}")
                 return None
                 
             # Create memory for conversation history
@@ -256,7 +257,7 @@ class ChatService:
             print(f"Creating ConversationalRetrievalChain for session {session_id}")
             chain = ConversationalRetrievalChain.from_llm(
                 llm=self.llm,
-                retriever=vectorstore.as_retriever(search_kwargs={"k": 5}),
+                retriever=retriever,
                 memory=memory,
                 combine_docs_chain_kwargs={"prompt": prompt},
                 return_source_documents=True,
@@ -300,6 +301,9 @@ class ChatService:
         # Add user message to history
         self.add_message(session_id, "user", message)
         
+        # Remember the document set, so it is warmed after the next restart
+        get_activity_log().record(doc_ids)
+        
         try:
             # Check if documents are provided
             if not doc_ids:
@@ -370,16 +374,24 @@ class ChatService:
                 sources.append({
                     "document_id": doc.metadata.get("document_id", ""),
                     "source": doc.metadata.get("source", "Unknown"),
+                    "segment": doc.metadata.get("segment_label"),
                     "text": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
                 })
     
+            # Report the prompt tokens saved by context selection for this turn
+            context = getattr(chain.retriever, "last_context", None)
+            if context:
+                print(f"Context for session {session_id}: {context['chunks']} chunks, "
+                      f"{context['tokens_saved']} of {context['tokens_before']} tokens saved")
+    
             # Add assistant message to history
             self.add_message(session_id, "assistant", response)
             
             return {
                 "response": response,
                 "chat_history": self.get_session_history(session_id),
-                "sources": sources
+                "sources": sources,
+                "context": context
             }
         
         except Exception as e:
@@ -0,0 +1,231 @@
+"""
+Streaming, token-aware chunking of processed document text.
+
+Text is read from disk block by block and split at the strongest boundary
+available (paragraph, line, sentence, word), with chunk length measured in
+tokens of the chat model. Chunks are yielded one at a time, so memory use
+does not grow with the size of the document. When the processor recorded
+the pages, slides, sections or tables of the text, chunks stay within them.
+"""
+
+import os
+import re
+import sys
+from collections import deque
+from typing import Dict, Any, Iterable, Iterator, List, NamedTuple, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import LLM_MODEL, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+
+from langchain_core.documents import Document
+
+# Boundaries tried in order when a piece of text is longer than a chunk
+SEPARATORS = ["\n\n", "\n", ". ", " "]
+
+# Characters read from disk at a time
+READ_BLOCK_CHARS = 64 * 1024
+
+# Paragraphs longer than this many characters are cut, bounding the text held back
+MAX_PARAGRAPH_CHARS = 256 * 1024
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the prompt tokens of a text.
+
+    Uses the tokenizer of the chat model when tiktoken can load it, and
+    estimates four characters per token otherwise. The tokenizer is loaded
+    once per process.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(LLM_MODEL)
+        except Exception as e:
+            print(f"Could not load tokenizer, estimating token counts: {str(e)}")
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+class _Unit(NamedTuple):
+    """Piece of text that is never split, with its character offset and token count."""
+
+    start: int
+    text: str
+    tokens: int
+
+
+class StreamingChunker:
+    """
+    Splits text into overlapping chunks of at most chunk_tokens tokens.
+
+    Text is cut into units at the strongest boundary that keeps each unit
+    within a chunk, and consecutive units are packed into chunks. After a
+    chunk is emitted, its trailing units of up to overlap_tokens tokens
+    start the next one. Every chunk is an exact slice of the text, recorded
+    by its start_index.
+    """
+
+    def __init__(self, chunk_tokens: int = CHUNK_SIZE_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 block_chars: int = READ_BLOCK_CHARS):
+        """
+        Initialize the chunker.
+
+        Args:
+            chunk_tokens: Maximum tokens of a chunk
+            overlap_tokens: Maximum tokens repeated from the end of the previous chunk
+            block_chars: Characters read from disk at a time
+        """
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.block_chars = block_chars
+
+    def split_file(self, path: str, metadata: Dict[str, Any],
+                   segments: Optional[List[Dict[str, Any]]] = None) -> Iterator[Document]:
+        """
+        Stream the chunks of a text file.
+
+        With segments, no chunk crosses a segment boundary, and chunks carry
+        the type and label of their segment.
+
+        Args:
+            path: Path of a UTF-8 text file
+            metadata: Metadata copied to every chunk
+            segments: Optional segment spans with type, label, start and end offsets, in text order
+
+        Returns:
+            Iterator of chunks in text order
+        """
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            if not segments:
+                yield from self.split_stream(iter(lambda: f.read(self.block_chars), ""), metadata)
+                return
+
+            position = 0
+            for segment in segments + [None]:
+                # Text between segments is chunked on its own, without segment metadata
+                end = segment["start"] if segment is not None else None
+                if end is None or end > position:
+                    yield from self.split_stream(self._read_range(f, position, end), metadata, start=position)
+                    position = end if end is not None else position
+                if segment is None:
+                    break
+
+                segment_metadata = {**metadata, "segment_type": segment["type"], "segment_label": segment["label"]}
+                yield from self.split_stream(self._read_range(f, position, segment["end"]), segment_metadata,
+                                             start=position)
+                position = segment["end"]
+
+    def _read_range(self, f, start: int, end: Optional[int]) -> Iterator[str]:
+        """Read blocks of an open file from the current position (start) up to end, or to the end of the file."""
+        position = start
+        while end is None or position < end:
+            size = self.block_chars if end is None else min(self.block_chars, end - position)
+            block = f.read(size)
+            if not block:
+                return
+            position += len(block)
+            yield block
+
+    def split_stream(self, blocks: Iterable[str], metadata: Dict[str, Any], start: int = 0) -> Iterator[Document]:
+        """
+        Stream the chunks of text arriving in blocks.
+
+        Args:
+            blocks: Consecutive pieces of the text
+            metadata: Metadata copied to every chunk
+            start: Character offset of the text in its file
+
+        Returns:
+            Iterator of chunks in text order
+        """
+        window: deque = deque()
+        window_tokens = 0
+        for unit in self._units(blocks, start):
+            if window and window_tokens + unit.tokens > self.chunk_tokens:
+                chunk = self._make_chunk(window, metadata)
+                if chunk is not None:
+                    yield chunk
+                while window and (window_tokens > self.overlap_tokens
+                                  or window_tokens + unit.tokens > self.chunk_tokens):
+                    window_tokens -= window.popleft().tokens
+            window.append(unit)
+            window_tokens += unit.tokens
+
+        if window:
+            chunk = self._make_chunk(window, metadata)
+            if chunk is not None:
+                yield chunk
+
+    def _units(self, blocks: Iterable[str], start: int) -> Iterator[_Unit]:
+        """
+        Cut streamed text into units, holding back only the unfinished last paragraph.
+
+        Complete paragraphs are split one at a time. A paragraph longer than
+        MAX_PARAGRAPH_CHARS, as in some scanned books, is cut at its last line
+        break or space within that length, and the rest is treated as a new
+        paragraph. Cuts depend only on the text, not on how it arrives in blocks.
+        """
+        buffer = ""
+        buffer_start = start
+        for block in blocks:
+            buffer += block
+            position = 0
+            while True:
+                end = buffer.find("\n\n", position)
+                limit = position + MAX_PARAGRAPH_CHARS
+                if end + 2 > limit or (end == -1 and len(buffer) > limit):
+                    cut = max(buffer.rfind("\n", position, limit), buffer.rfind(" ", position, limit)) + 1 or limit
+                elif end != -1:
+                    cut = end + 2
+                else:
+                    break
+                yield from self._split(buffer[position:cut], buffer_start + position, 0)
+                position = cut
+
+            buffer = buffer[position:]
+            buffer_start += position
+
+        if buffer:
+            yield from self._split(buffer, buffer_start, 0)
+
+    def _split(self, text: str, start: int, level: int) -> Iterator[_Unit]:
+        """Split text at the separator of the given level, recursing into pieces longer than a chunk."""
+        if level == len(SEPARATORS):
+            # No boundary left; cut at the estimated character length of a chunk
+            tokens = count_tokens(text)
+            step = max(1, len(text) * self.chunk_tokens // max(tokens, 1))
+            for offset in range(0, len(text), step):
+                piece = text[offset:offset + step]
+                yield _Unit(start + offset, piece, count_tokens(piece))
+            return
+
+        # Each piece keeps its trailing separator, so pieces concatenate back to the text
+        separator = re.escape(SEPARATORS[level])
+        offset = 0
+        for piece in re.split(f"(?<={separator})", text):
+            if piece:
+                tokens = count_tokens(piece)
+                if tokens <= self.chunk_tokens:
+                    yield _Unit(start + offset, piece, tokens)
+                else:
+                    yield from self._split(piece, start + offset, level + 1)
+            offset += len(piece)
+
+    @staticmethod
+    def _make_chunk(window: Iterable[_Unit], metadata: Dict[str, Any]) -> Document:
+        """Join units into a chunk without surrounding whitespace, or None if there is no text."""
+        units: List[_Unit] = list(window)
+        text = "".join(unit.text for unit in units)
+        content = text.strip()
+        if not content:
+            return None
+        leading = len(text) - len(text.lstrip())
+        return Document(page_content=content, metadata={**metadata, "start_index": units[0].start + leading})
@@ -0,0 +1,206 @@
+"""
+Selection of retrieved chunks for the prompt context.
+
+Retrieval returns more candidates than the prompt needs. Maximal marginal
+relevance picks a diverse subset using the stored chunk vectors, and chunks
+of the same document whose character spans overlap are merged, so text
+repeated by the splitter's chunk overlap is only sent once.
+"""
+
+import os
+import sys
+import threading
+from typing import List, Dict, Any, Sequence, Tuple
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import CONTEXT_MMR_LAMBDA
+from app.backend.services.chunker import count_tokens
+
+from langchain_core.documents import Document
+
+# Chunks without stored offsets are merged when they share at least this many characters
+MIN_TEXT_OVERLAP = 20
+
+
+def mmr_select(relevance: Sequence[float], vectors: np.ndarray, k: int,
+               lambda_mult: float = CONTEXT_MMR_LAMBDA) -> List[int]:
+    """
+    Pick candidates by maximal marginal relevance.
+
+    Args:
+        relevance: Retrieval score of each candidate, higher is better
+        vectors: Stored vector of each candidate
+        k: Number of candidates to pick
+        lambda_mult: Weight of relevance against novelty; 1.0 keeps the retrieval order
+
+    Returns:
+        Positions of the picked candidates, in pick order
+    """
+    if not len(relevance):
+        return []
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    # Scores come from BM25 or rank fusion, so only their relative size is meaningful
+    relevance = relevance / relevance.max() if relevance.max() > 0 else np.ones_like(relevance)
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.maximum(norms, 1e-12)
+    similarity = unit @ unit.T
+
+    picked = [int(np.argmax(relevance))]
+    redundancy = similarity[picked[0]].copy()
+    while len(picked) < min(k, len(relevance)):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[picked] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
+
+
+def _text_overlap(first: str, second: str) -> int:
+    """Length of the longest suffix of first that is a prefix of second."""
+    for length in range(min(len(first), len(second)), MIN_TEXT_OVERLAP - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+
+def merge_overlapping(chunks: List[Tuple[int, Document]]) -> List[Document]:
+    """
+    Merge chunks of the same document whose spans overlap.
+
+    Spans come from the start_index metadata written at ingest. Chunks
+    without it are merged only with the chunk stored right before them, when
+    the end of one repeats the start of the other.
+
+    Args:
+        chunks: (row, chunk) pairs, most relevant first
+
+    Returns:
+        Chunks with overlapping text merged, ordered by their most relevant member
+    """
+    groups: List[List[Tuple[int, Document]]] = []
+    for row, doc in sorted(chunks, key=lambda item: (item[1].metadata.get("document_id", ""), item[0])):
+        if groups:
+            last_row, last_doc = groups[-1][-1]
+            if last_doc.metadata.get("document_id") == doc.metadata.get("document_id"):
+                start, last_start = doc.metadata.get("start_index"), last_doc.metadata.get("start_index")
+                if start is not None and last_start is not None:
+                    if start < last_start + len(last_doc.page_content):
+                        groups[-1].append((row, doc))
+                        continue
+                elif row == last_row + 1 and _text_overlap(last_doc.page_content, doc.page_content):
+                    groups[-1].append((row, doc))
+                    continue
+        groups.append([(row, doc)])
+
+    rank = {row: position for position, (row, _) in enumerate(chunks)}
+    merged = []
+    for group in sorted(groups, key=lambda members: min(rank[row] for row, _ in members)):
+        first_row, first = group[0]
+        text = first.page_content
+        end = first.metadata.get("start_index")
+        end = end + len(text) if end is not None else None
+        for _, doc in group[1:]:
+            start = doc.metadata.get("start_index")
+            if start is not None and end is not None:
+                text += doc.page_content[max(0, end - start):]
+                end = max(end, start + len(doc.page_content))
+            else:
+                text += doc.page_content[_text_overlap(text, doc.page_content):]
+
+        if len(group) == 1:
+            merged.append(first)
+        else:
+            best = min(group, key=lambda member: rank[member[0]])[1]
+            metadata = {**best.metadata, "start_index": first.metadata.get("start_index"),
+                        "merged_chunks": len(group)}
+            merged.append(Document(page_content=text, metadata=metadata))
+    return merged
+
+
+def select_chunks(hits: List[Tuple[float, int, Document]], vectors: np.ndarray,
+                  k: int) -> Tuple[List[Document], Dict[str, Any]]:
+    """
+    Pick the prompt context from retrieval candidates and record the tokens saved.
+
+    Args:
+        hits: (score, row, chunk) candidates, best first; higher scores are better
+        vectors: Stored vector of each candidate
+        k: Number of chunks to pick
+
+    Returns:
+        Tuple of the context chunks, best first, and a report with the
+        context tokens of the plain top k and of the selection
+    """
+    if not hits:
+        return [], {"candidates": 0, "chunks": 0, "tokens_before": 0, "tokens_after": 0, "tokens_saved": 0}
+
+    # Scores only need to be comparable within one ranking; shift them to be positive
+    scores = np.array([score for score, _, _ in hits], dtype=np.float32)
+    relevance = scores - scores.min() + 1e-6 if scores.min() <= 0 else scores
+    picked = mmr_select(relevance, vectors, k)
+    context = merge_overlapping([(hits[i][1], hits[i][2]) for i in picked])
+
+    tokens_before = sum(count_tokens(doc.page_content) for _, _, doc in hits[:k])
+    tokens_after = sum(count_tokens(doc.page_content) for doc in context)
+    get_context_stats().record(tokens_before, tokens_after)
+    return context, {
+        "candidates": len(hits),
+        "chunks": len(context),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after
+    }
+
+
+class ContextStats:
+    """Counters of prompt tokens saved by context selection."""
+
+    def __init__(self):
+        """Initialize the counters."""
+        self.turns = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    def record(self, tokens_before: int, tokens_after: int) -> None:
+        """Record the context token counts of one turn."""
+        with self._lock:
+            self.turns += 1
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the counters.
+
+        Returns:
+            Dictionary with the number of turns, context tokens before and
+            after selection, and tokens saved per turn
+        """
+        with self._lock:
+            saved = self.tokens_before - self.tokens_after
+            return {
+                "turns": self.turns,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": saved,
+                "tokens_saved_per_turn": saved / self.turns if self.turns else 0.0,
+                "saved_ratio": saved / self.tokens_before if self.tokens_before else 0.0
+            }
+
+
+# Create a singleton instance of ContextStats
+_context_stats = ContextStats()
+
+
+def get_context_stats() -> ContextStats:
+    """Get the process-wide context selection counters."""
+    return _context_stats
@@ -0,0 +1,842 @@
+"""
+Corpus-wide vector index shared by every document, filtered by document id at query time.
+"""
+
+import os
+import sys
+import json
+import fcntl
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, NamedTuple, Sequence, Protocol
+
+import numpy as np
+import faiss
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import (
+    CORPUS_INDEX_DIR, VECTORSTORE_LOAD_MODE, VECTOR_RERANK_FACTOR, HYBRID_SEARCH, HYBRID_CANDIDATE_FACTOR,
+    CONTEXT_DIVERSIFY, CONTEXT_FETCH_FACTOR, CORPUS_SHARDS, CORPUS_COMPACTION_DEAD_FRACTION
+)
+from app.backend.services.mmap_store import (
+    MmapFlatIndex, LazyChunkList, write_chunks, write_vectors, append_chunks, append_vectors, load_vectors,
+    has_mmap_files, write_index_info, read_index_info
+)
+from app.backend.services.embedding_backends import get_backend_id
+from app.backend.services.index_factory import (
+    build_index, read_index, index_fits, get_index_type, get_quantization, make_search_params, rerank
+)
+from app.backend.services.lexical_index import LexicalIndex, fuse_rankings
+from app.backend.services.search_dispatcher import get_search_dispatcher
+from app.backend.services.context_selector import select_chunks
+
+from langchain_core.documents import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+# Selections up to this many rows are searched exactly over the stored vectors
+EXACT_SEARCH_MAX_ROWS = 20000
+
+# A selector search that comes back short is retried once with efSearch or nprobe this many times larger
+SELECTOR_WIDEN_FACTOR = 8
+
+# Background compactions abandoned because of concurrent writes are retried this many times
+COMPACTION_ATTEMPTS = 3
+
+
+class CorpusView(NamedTuple):
+    """Index state captured for a search, with the row ranges of the selected documents."""
+
+    index: Any
+    vectors: Any
+    row_chunks: Sequence[Document]
+    lexical_index: Optional[LexicalIndex]
+    ranges: List[Tuple[int, int]]
+
+
+def search_row_ranges(vectors: np.ndarray, queries: np.ndarray, ranges: List[Tuple[int, int]],
+                      k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact search of a query matrix over the given row ranges of a vector matrix.
+
+    Args:
+        vectors: Stored vectors indexed by row
+        queries: Query matrix of shape (nq, d)
+        ranges: Row ranges [start, end) to search
+        k: Number of results per query
+
+    Returns:
+        (distances, labels) arrays of shape (nq, k), labels being absolute rows
+    """
+    all_distances = []
+    all_labels = []
+    for start, end in ranges:
+        distances, labels = faiss.knn(queries, vectors[start:end], min(k, end - start))
+        all_distances.append(distances)
+        all_labels.append(np.where(labels >= 0, labels + start, -1))
+
+    distances = np.concatenate(all_distances, axis=1)
+    labels = np.concatenate(all_labels, axis=1)
+    distances[labels < 0] = np.inf
+    order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(labels, order, axis=1)
+
+
+class SearchableCorpus(Protocol):
+    """Operations shared by CorpusIndex and ShardedCorpusIndex, as returned by get_corpus_index."""
+
+    def has_document(self, document_id: str) -> bool: ...
+
+    def add_document(self, document_id: str, vectors: np.ndarray, chunks) -> int: ...
+
+    def remove_document(self, document_id: str) -> bool: ...
+
+    def compact(self) -> bool: ...
+
+    def search(self, query_vector: List[float], document_ids: List[str], k: int = 5) -> List[Tuple[Document, float]]: ...
+
+    def hybrid_search(self, query: str, embedding_model: Embeddings, document_ids: List[str],
+                      k: int = 5) -> List[Tuple[Document, float]]: ...
+
+    def select_context(self, query: str, embedding_model: Embeddings, document_ids: List[str],
+                       k: int = 5) -> Tuple[List[Document], Dict[str, Any]]: ...
+
+    def warm(self, document_ids: List[str]) -> int: ...
+
+    def get_vectors(self, max_rows: Optional[int] = None) -> Optional[np.ndarray]: ...
+
+    def stats(self) -> Dict[str, Any]: ...
+
+
+class CorpusIndex:
+    """
+    A single vector index holding the chunks of every document.
+
+    The chunks of a document occupy one contiguous range of rows, recorded per
+    document id. Searches are restricted to a set of documents with a FAISS id
+    selector, so any combination of documents can be queried without building
+    a new index. Small selections, and memory-mapped flat indexes, are searched
+    exactly over the selected row ranges of the stored vectors instead. The
+    index type follows choose_index_type as the corpus grows. A BM25 index
+    over the same rows backs hybrid search. The index is persisted under
+    CORPUS_INDEX_DIR and reloaded when another worker process has written a
+    newer version. An index built with another embedding backend is treated
+    as empty, so documents are added again with comparable vectors.
+
+    Adding a document appends its rows to the stored vectors, chunks and
+    BM25 postings in place and to the FAISS index, so its cost follows the
+    size of the document rather than of the corpus. Removing or replacing a
+    document only tombstones its row range: it is dropped from the document
+    ranges, so searches skip its rows at once, and recorded as dead. Once
+    dead rows pass CORPUS_COMPACTION_DEAD_FRACTION of the index, a
+    background compaction rewrites the index without them.
+    """
+
+    def __init__(self, index_dir: str = CORPUS_INDEX_DIR, load_mode: str = VECTORSTORE_LOAD_MODE,
+                 embedding_backend: Optional[str] = None):
+        """
+        Initialize the corpus index.
+
+        Args:
+            index_dir: Directory where the index and its chunks are stored
+            load_mode: "memory" to load vectors into a FAISS index, "mmap" to memory-map them
+            embedding_backend: Backend identifier of the vectors (defaults to the configured backend)
+        """
+        self.index_dir = str(index_dir)
+        self.load_mode = load_mode
+        self.embedding_backend = embedding_backend or get_backend_id()
+        self.documents_path = os.path.join(self.index_dir, "documents.json")
+        self.tombstones_path = os.path.join(self.index_dir, "tombstones.json")
+        self.faiss_path = os.path.join(self.index_dir, "corpus.faiss")
+        self.lock_path = os.path.join(self.index_dir, "corpus.lock")
+
+        self.index = None
+        self.vectors = None
+        self.lexical_index = None
+        self.row_chunks = []
+        self.document_ranges: Dict[str, Tuple[int, int]] = {}
+        self.dead_ranges: List[Tuple[int, int]] = []
+        self._loaded_mtime = None
+        self._generation = None
+        self._compacting = False
+        self._lock = threading.RLock()
+        # FAISS indexes are not safe to search while rows are added to them
+        self._index_lock = threading.Lock()
+
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize writers across worker processes."""
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """Reload the index from disk if another process saved a newer version."""
+        if not os.path.exists(self.documents_path) or not has_mmap_files(self.index_dir):
+            return
+
+        mtime = os.path.getmtime(self.documents_path)
+        if mtime == self._loaded_mtime:
+            return
+
+        index_info = read_index_info(self.index_dir)
+        backend_id = index_info.get("embedding_backend", get_backend_id("openai"))
+        if backend_id != self.embedding_backend:
+            print(f"Corpus index was built with {backend_id}, not {self.embedding_backend}; starting over")
+            self.index = None
+            self.vectors = None
+            self.lexical_index = None
+            self.row_chunks = []
+            self.document_ranges = {}
+            self.dead_ranges = []
+            self._loaded_mtime = mtime
+            return
+
+        try:
+            # Documents before tombstones, the reverse of the write order
+            with open(self.documents_path, "r") as f:
+                document_ranges = {doc_id: tuple(rows) for doc_id, rows in json.load(f).items()}
+            dead_ranges = []
+            if os.path.exists(self.tombstones_path):
+                with open(self.tombstones_path, "r") as f:
+                    dead_ranges = [tuple(rows) for rows in json.load(f)]
+
+            generation = index_info.get("generation")
+            if self.index is not None and generation is not None and generation == self._generation:
+                # Only documents were removed since the last load; the index files are unchanged
+                self.document_ranges = document_ranges
+                self.dead_ranges = dead_ranges
+                self._loaded_mtime = mtime
+                return
+
+            # Rows past the last complete save were left by an interrupted append
+            vectors = load_vectors(self.index_dir)[:index_info.get("rows")]
+            if self.load_mode == "mmap":
+                index = read_index(self.faiss_path, mmap=True) if os.path.exists(self.faiss_path) else None
+                if index is None or (get_index_type(index) == "flat" and get_quantization(index) == "none"):
+                    index = MmapFlatIndex(vectors)
+            else:
+                index = read_index(self.faiss_path) if os.path.exists(self.faiss_path) else build_index(vectors)
+            if index.ntotal != len(vectors):
+                index = build_index(vectors)
+            row_chunks = LazyChunkList(self.index_dir)
+            lexical_index = LexicalIndex.load(self.index_dir)
+            if lexical_index is None:
+                # Saved before lexical indexing; kept in memory until the next commit
+                lexical_index = LexicalIndex.from_texts(chunk.page_content for chunk in row_chunks)
+        except Exception as e:
+            print(f"Error loading corpus index: {str(e)}")
+            return
+
+        self.index = index
+        self.vectors = vectors
+        self.lexical_index = lexical_index
+        self.row_chunks = row_chunks
+        self.document_ranges = document_ranges
+        self.dead_ranges = dead_ranges
+        self._loaded_mtime = mtime
+        self._generation = generation
+
+    def _snapshot(self) -> Tuple[Optional[np.ndarray], List[Document]]:
+        """Materialize every vector and chunk so the index can be rewritten."""
+        if self.vectors is None or len(self.vectors) == 0:
+            return None, []
+        return np.array(self.vectors), list(self.row_chunks)
+
+    def _write_ranges(self, document_ranges: Dict[str, Tuple[int, int]], dead_ranges: List[Tuple[int, int]]) -> None:
+        """Persist the document ranges and tombstones, and make them current."""
+        tmp_path = self.tombstones_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(dead_ranges, f)
+        os.replace(tmp_path, self.tombstones_path)
+
+        # The documents file is replaced last; its mtime marks a complete save
+        tmp_path = self.documents_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(document_ranges, f)
+        os.replace(tmp_path, self.documents_path)
+
+        self.document_ranges = document_ranges
+        self.dead_ranges = dead_ranges
+        self._loaded_mtime = os.path.getmtime(self.documents_path)
+
+    def _write_index(self, index) -> None:
+        """Persist the FAISS index; an unquantized flat index is rebuilt from the stored vectors on load instead."""
+        if get_index_type(index) == "flat" and get_quantization(index) == "none":
+            if os.path.exists(self.faiss_path):
+                os.remove(self.faiss_path)
+            return
+        faiss.write_index(index, self.faiss_path + ".tmp")
+        os.replace(self.faiss_path + ".tmp", self.faiss_path)
+
+    def _write_info(self, generation: int, rows: int) -> None:
+        """Record the backend, generation and committed row count of the index files."""
+        write_index_info(self.index_dir, {
+            "embedding_backend": self.embedding_backend, "generation": generation, "rows": rows
+        })
+
+    def _committed_rows(self) -> int:
+        """Get the number of rows of the last complete save; rows past it were left by an interrupted append."""
+        if self.vectors is None:
+            return 0
+        return read_index_info(self.index_dir).get("rows", len(self.row_chunks))
+
+    def _commit(self, vectors: np.ndarray, chunks: List[Document], document_ranges: Dict[str, Tuple[int, int]],
+                dead_ranges: List[Tuple[int, int]], index=None) -> None:
+        """
+        Persist a new version of the index from all of its rows and make it current.
+
+        The index is built (and trained) from the vectors unless an index
+        already built from them is given.
+        """
+        if index is None:
+            index = build_index(vectors)
+
+        lexical_index = LexicalIndex.from_texts(chunk.page_content for chunk in chunks)
+        generation = (self._generation or 0) + 1
+
+        write_vectors(self.index_dir, vectors)
+        write_chunks(self.index_dir, chunks)
+        lexical_index.save(self.index_dir)
+        self._write_index(index)
+        self._write_info(generation, len(chunks))
+        self._write_ranges(document_ranges, dead_ranges)
+
+        if self.load_mode == "mmap":
+            self._loaded_mtime = None
+            self._refresh()
+        else:
+            self.index = index
+            self.vectors = load_vectors(self.index_dir)
+            self.lexical_index = lexical_index
+            self.row_chunks = chunks
+            self._generation = generation
+
+    def _append(self, rows: int, vectors: np.ndarray, chunks: List[Document],
+                document_ranges: Dict[str, Tuple[int, int]], dead_ranges: List[Tuple[int, int]]) -> None:
+        """
+        Persist new rows after the first rows of the index and make them current.
+
+        Vectors, chunks and BM25 postings are appended to their files in
+        place. When the index type and quantization still fit the corpus
+        size, the vectors are added to the existing FAISS index; otherwise
+        the index is rebuilt (and trained) from all stored vectors.
+        """
+        total = rows + len(vectors)
+        append_vectors(self.index_dir, vectors, rows)
+        append_chunks(self.index_dir, chunks, rows)
+        lexical_index = self.lexical_index.append(self.index_dir, (chunk.page_content for chunk in chunks), rows)
+        all_vectors = load_vectors(self.index_dir)[:total]
+
+        index = self.index
+        if index is None or not index_fits(index, total):
+            index = build_index(all_vectors)
+        elif not isinstance(index, MmapFlatIndex):
+            if self.load_mode == "mmap":
+                # Memory-mapped indexes are read-only; add to a copy read into memory
+                index = read_index(self.faiss_path)
+            with self._index_lock:
+                index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+
+        generation = (self._generation or 0) + 1
+        self._write_index(index)
+        self._write_info(generation, total)
+        self._write_ranges(document_ranges, dead_ranges)
+
+        if self.load_mode == "mmap":
+            self._loaded_mtime = None
+            self._refresh()
+        else:
+            self.index = index
+            self.vectors = all_vectors
+            self.lexical_index = lexical_index
+            self.row_chunks = LazyChunkList(self.index_dir)
+            self._generation = generation
+
+    @staticmethod
+    def _without_rows(vectors, chunks, document_ranges, dead_ranges):
+        """Drop dead row ranges, shifting the document ranges that follow them."""
+        dead = np.zeros(len(vectors), dtype=bool)
+        for start, end in dead_ranges:
+            dead[start:end] = True
+        dead_before = np.concatenate([[0], np.cumsum(dead)])
+
+        vectors = np.ascontiguousarray(vectors[~dead])
+        chunks = [chunk for chunk, is_dead in zip(chunks, dead.tolist()) if not is_dead]
+        document_ranges = {
+            doc_id: (start - int(dead_before[start]), end - int(dead_before[end]))
+            for doc_id, (start, end) in document_ranges.items()
+        }
+        return vectors, chunks, document_ranges
+
+    def dead_fraction(self) -> float:
+        """Get the fraction of index rows that belong to removed documents."""
+        total = len(self.row_chunks)
+        return sum(end - start for start, end in self.dead_ranges) / total if total else 0.0
+
+    def _schedule_compaction(self) -> None:
+        """Start a background compaction if dead rows passed the threshold and none is running."""
+        if self._compacting or self.dead_fraction() < CORPUS_COMPACTION_DEAD_FRACTION:
+            return
+        self._compacting = True
+        threading.Thread(target=self._compact_in_background, name="corpus-compaction", daemon=True).start()
+
+    def _compact_in_background(self) -> None:
+        compacted = False
+        try:
+            # A compaction abandoned because of a concurrent write is retried on the new version
+            for _ in range(COMPACTION_ATTEMPTS):
+                compacted = self.compact()
+                if compacted:
+                    break
+                with self._lock:
+                    if self.dead_fraction() < CORPUS_COMPACTION_DEAD_FRACTION:
+                        break
+        except Exception as e:
+            print(f"Error compacting corpus index: {str(e)}")
+        finally:
+            with self._lock:
+                self._compacting = False
+                if compacted:
+                    # Documents removed while the compaction ran did not schedule one of their own
+                    self._schedule_compaction()
+
+    def compact(self) -> bool:
+        """
+        Rewrite the index without the rows of removed documents.
+
+        The new index is built without holding any lock, so searches and
+        writes continue meanwhile; if the index was written to in the
+        meantime, the compaction is abandoned.
+
+        Returns:
+            True if the index was compacted, False otherwise
+        """
+        with self._lock:
+            self._refresh()
+            if not self.dead_ranges:
+                return False
+            loaded_mtime = self._loaded_mtime
+            dead_rows = sum(end - start for start, end in self.dead_ranges)
+            vectors, chunks = self._snapshot()
+            document_ranges = dict(self.document_ranges)
+            dead_ranges = list(self.dead_ranges)
+
+        vectors, chunks, document_ranges = self._without_rows(vectors, chunks, document_ranges, dead_ranges)
+        index = build_index(vectors)
+
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self._loaded_mtime != loaded_mtime:
+                print("Corpus index changed during compaction; compaction abandoned")
+                return False
+            self._commit(vectors, chunks, document_ranges, [], index=index)
+
+        print(f"Compacted corpus index: dropped {dead_rows} dead rows, {len(chunks)} rows left")
+        return True
+
+    def has_document(self, document_id: str) -> bool:
+        """Check whether a document's chunks are in the corpus index."""
+        with self._lock:
+            self._refresh()
+            return document_id in self.document_ranges
+
+    def add_document(self, document_id: str, vectors: np.ndarray, chunks) -> int:
+        """
+        Add (or replace) a document's chunks using its stored vectors.
+
+        Args:
+            document_id: ID of the document
+            vectors: The document's original vectors, one row per chunk
+            chunks: The document's chunks aligned with the vector rows
+
+        Returns:
+            Number of chunks added
+        """
+        new_vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        new_chunks = list(chunks)
+
+        with self._lock, self._file_lock():
+            self._refresh()
+
+            # A replaced document's old rows are tombstoned, so the new ones are only appended
+            document_ranges = dict(self.document_ranges)
+            dead_ranges = list(self.dead_ranges)
+            old_start, old_end = document_ranges.pop(document_id, (0, 0))
+            if old_end > old_start:
+                dead_ranges.append((old_start, old_end))
+
+            start = self._committed_rows()
+            document_ranges[document_id] = (start, start + len(new_chunks))
+            if start and len(self.lexical_index.lengths) == start:
+                self._append(start, new_vectors, new_chunks, document_ranges, dead_ranges)
+            else:
+                # Empty, or left inconsistent by an interrupted append: write every row again
+                all_vectors, all_chunks = self._snapshot()
+                if all_vectors is None:
+                    self._commit(new_vectors, new_chunks, document_ranges, dead_ranges)
+                else:
+                    self._commit(
+                        np.concatenate([all_vectors[:start], new_vectors]),
+                        all_chunks[:start] + new_chunks,
+                        document_ranges,
+                        dead_ranges
+                    )
+            self._schedule_compaction()
+
+        return len(new_chunks)
+
+    def remove_document(self, document_id: str) -> bool:
+        """
+        Remove a document's chunks from the corpus index.
+
+        The chunks are tombstoned and skipped by searches immediately; the
+        index is rewritten without them by a later compaction.
+
+        Args:
+            document_id: ID of the document
+
+        Returns:
+            True if the document was indexed, False otherwise
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            if document_id not in self.document_ranges:
+                return False
+
+            document_ranges = dict(self.document_ranges)
+            dead_ranges = list(self.dead_ranges)
+            start, end = document_ranges.pop(document_id)
+            if end > start:
+                dead_ranges.append((start, end))
+            self._write_ranges(document_ranges, dead_ranges)
+            self._schedule_compaction()
+            return True
+
+    def _view(self, document_ids: List[str]) -> "CorpusView":
+        """
+        Capture the current index state and the row ranges of the selected documents.
+
+        Searches run on the captured view outside the lock, so concurrent
+        searches can be batched and a reload does not pull arrays out from
+        under a running search. Rows appended to the captured FAISS index are
+        outside the view's ranges; _search_vectors guards the index itself.
+        """
+        with self._lock:
+            self._refresh()
+            ranges = [self.document_ranges[doc_id] for doc_id in document_ids if doc_id in self.document_ranges]
+            return CorpusView(
+                self.index, self.vectors, self.row_chunks, self.lexical_index,
+                [(start, end) for start, end in ranges if end > start]
+            )
+
+    def search(self, query_vector: List[float], document_ids: List[str], k: int = 5) -> List[Tuple[Document, float]]:
+        """
+        Search the chunks of the selected documents.
+
+        Args:
+            query_vector: Embedded query
+            document_ids: Documents the search is restricted to
+            k: Number of results to return
+
+        Returns:
+            List of (chunk, L2 distance) pairs, closest first
+        """
+        view = self._view(document_ids)
+        hits = self._search_vectors(view, query_vector, k)
+        return [(view.row_chunks[row], float(distance)) for distance, row in hits]
+
+    def hybrid_search(self, query: str, embedding_model: Embeddings, document_ids: List[str],
+                      k: int = 5) -> List[Tuple[Document, float]]:
+        """
+        Search the chunks of the selected documents by BM25 and vector similarity.
+
+        Short queries whose terms appear as a phrase in some chunks are answered
+        from the lexical index alone, without embedding the query. Otherwise
+        the BM25 and vector rankings are combined by reciprocal rank fusion.
+
+        Args:
+            query: Query text
+            embedding_model: Embedding model used to embed the query
+            document_ids: Documents the search is restricted to
+            k: Number of results to return
+
+        Returns:
+            List of (chunk, score) pairs, best first; scores are BM25 scores on
+            the lexical fast path and fused scores otherwise
+        """
+        if not HYBRID_SEARCH:
+            return self.search(embedding_model.embed_query(query), document_ids, k)
+
+        view = self._view(document_ids)
+        hits = self._hybrid_hits(view, query, embedding_model, k)
+        return [(view.row_chunks[row], float(score)) for score, row in hits]
+
+    def _hybrid_hits(self, view: "CorpusView", query: str, embedding_model: Embeddings,
+                     k: int) -> List[Tuple[float, int]]:
+        """Hybrid search restricted to the view's row ranges, returning (score, row) pairs, best first."""
+        if not view.ranges:
+            return []
+
+        if not HYBRID_SEARCH:
+            # Negated distances, so that higher is better as for the fused scores
+            return [(-distance, row) for distance, row in
+                    self._search_vectors(view, embedding_model.embed_query(query), k)]
+
+        candidates = k * HYBRID_CANDIDATE_FACTOR
+        lexical_hits = []
+        if view.lexical_index is not None:
+            lexical_hits = view.lexical_index.search(query, candidates, view.ranges)
+            exact = view.lexical_index.exact_matches(
+                query, lexical_hits, lambda row: view.row_chunks[row].page_content
+            )
+            if exact:
+                return exact[:k]
+
+        query_vector = embedding_model.embed_query(query)
+
+        # Rows refer to the captured view, so the lexical hits stay valid alongside the vector hits
+        rankings = [
+            [row for _, row in self._search_vectors(view, query_vector, candidates)],
+            [row for _, row in lexical_hits]
+        ]
+        return fuse_rankings(rankings, k)
+
+    def select_context(self, query: str, embedding_model: Embeddings, document_ids: List[str],
+                       k: int = 5) -> Tuple[List[Document], Dict[str, Any]]:
+        """
+        Retrieve the chunks to put into a prompt, without near-duplicates.
+
+        Fetches CONTEXT_FETCH_FACTOR times k candidates by hybrid search,
+        picks k of them by maximal marginal relevance over their stored
+        vectors, and merges picked chunks whose spans overlap.
+
+        Args:
+            query: Query text
+            embedding_model: Embedding model used to embed the query
+            document_ids: Documents the search is restricted to
+            k: Number of chunks to pick
+
+        Returns:
+            Tuple of the context chunks, best first, and a report with the
+            context tokens of the plain top k and of the selection
+        """
+        view = self._view(document_ids)
+        hits = self._hybrid_hits(view, query, embedding_model, k * CONTEXT_FETCH_FACTOR)
+        rows = [row for _, row in hits]
+        vectors = view.vectors[np.array(rows)] if rows else None
+        return select_chunks([(score, row, view.row_chunks[row]) for score, row in hits], vectors, k)
+
+    def lexical_statistics(self, query: str) -> Dict[str, Any]:
+        """Get the BM25 collection statistics of a query, to be summed across shards."""
+        with self._lock:
+            self._refresh()
+            if self.lexical_index is None:
+                return {"rows": 0, "total_length": 0, "df": {}}
+            return self.lexical_index.statistics(query)
+
+    def candidates(self, query: str, query_vector: Optional[List[float]], document_ids: List[str],
+                   k: int, statistics: Optional[Dict[str, Any]] = None) -> Dict[str, List[Tuple[float, int, Document, np.ndarray]]]:
+        """
+        Collect search candidates with their chunks and vectors, for merging across shards.
+
+        Without a query vector, returns the BM25 candidates ("lexical") and
+        those that match the query as a phrase ("exact"). With one, returns
+        the vector candidates ("vector") scored by L2 distance.
+
+        Args:
+            query: Query text
+            query_vector: Embedded query, or None for the lexical candidates
+            document_ids: Documents the search is restricted to
+            k: Number of candidates of each kind
+            statistics: Summed BM25 statistics of all shards, so that scores are comparable across them
+
+        Returns:
+            Dictionary of (score, row, chunk, vector) lists, best first
+        """
+        view = self._view(document_ids)
+
+        def materialize(hits):
+            return [(float(score), row, view.row_chunks[row], np.array(view.vectors[row])) for score, row in hits]
+
+        if query_vector is not None:
+            return {"vector": materialize(self._search_vectors(view, query_vector, k))}
+
+        lexical_hits = []
+        exact = []
+        if HYBRID_SEARCH and view.lexical_index is not None and view.ranges:
+            lexical_hits = view.lexical_index.search(query, k, view.ranges, statistics)
+            exact = view.lexical_index.exact_matches(
+                query, lexical_hits, lambda row: view.row_chunks[row].page_content, statistics
+            )
+        return {"lexical": materialize(lexical_hits), "exact": materialize(exact)}
+
+    def _search_vectors(self, view: "CorpusView", query_vector: List[float], k: int) -> List[Tuple[float, int]]:
+        """
+        Vector search restricted to the view's row ranges, returning (L2 distance, row) pairs.
+
+        Large selections are searched through the FAISS index with an id
+        selector. Approximate indexes can come back short when the selector
+        rejects most of the graph or lists they visit; the search is then
+        retried with SELECTOR_WIDEN_FACTOR times the efSearch or nprobe, and
+        only if that is still short are the selected rows searched exactly.
+        Exact searches read the selected row ranges only, never the rest of
+        the corpus.
+
+        Searches of the FAISS index hold the index lock, since a commit may
+        add rows to the same index object; exact searches over the stored
+        vectors need no lock.
+        """
+        ranges = view.ranges
+        if not ranges:
+            return []
+
+        query = np.array([query_vector], dtype=np.float32)
+        selected = sum(end - start for start, end in ranges)
+        wanted = min(k, selected)
+
+        hits = []
+        if not isinstance(view.index, MmapFlatIndex) and selected > EXACT_SEARCH_MAX_ROWS:
+            # Selector searches differ per selection and are not batched
+            rows = np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges])
+            selector = faiss.IDSelectorBatch(rows)
+            for widen in (1, SELECTOR_WIDEN_FACTOR):
+                hits = self._search_selected(view, query, k, make_search_params(view.index, selector, widen))
+                if len(hits) >= wanted:
+                    return hits
+
+        vectors = view.vectors
+        distances, labels = get_search_dispatcher().search(
+            ("corpus", id(vectors), tuple(ranges), k),
+            lambda queries: search_row_ranges(vectors, queries, ranges, k),
+            query
+        )
+        return [(d, row) for d, row in zip(distances[0].tolist(), labels[0].tolist()) if row != -1]
+
+    def _search_selected(self, view: "CorpusView", query: np.ndarray, k: int, params) -> List[Tuple[float, int]]:
+        """Search the FAISS index with selector search parameters, returning (L2 distance, row) pairs."""
+        if get_quantization(view.index) != "none":
+            # Re-rank quantized candidates against the original vectors
+            with self._index_lock:
+                _, candidates = view.index.search(query, k * VECTOR_RERANK_FACTOR, params=params)
+            distances, labels = rerank(query, candidates, view.vectors, k)
+        else:
+            with self._index_lock:
+                distances, labels = view.index.search(query, k, params=params)
+        return [(d, row) for d, row in zip(distances[0].tolist(), labels[0].tolist()) if row != -1]
+
+    def warm(self, document_ids: List[str]) -> int:
+        """
+        Load the index and page in the rows of the given documents.
+
+        Runs one vector and one BM25 search over them, so the first real
+        search finds the index, its memory-mapped files and the search
+        paths already loaded.
+
+        Args:
+            document_ids: Documents to warm
+
+        Returns:
+            Number of rows warmed
+        """
+        view = self._view(document_ids)
+        if not view.ranges:
+            return 0
+
+        rows = 0
+        for start, end in view.ranges:
+            np.asarray(view.vectors[start:end]).sum()
+            rows += end - start
+
+        first = view.ranges[0][0]
+        self._search_vectors(view, np.asarray(view.vectors[first]).tolist(), 1)
+        if view.lexical_index is not None:
+            view.lexical_index.search(view.row_chunks[first].page_content, 1, view.ranges)
+        return rows
+
+    def get_vectors(self, max_rows: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Get the stored vectors of live chunks.
+
+        Args:
+            max_rows: Return a random sample of at most this many rows, or None for all of them
+
+        Returns:
+            Vector matrix in row order, memory-mapped when it holds every row
+        """
+        with self._lock:
+            self._refresh()
+            vectors = self.vectors
+            if vectors is None or (not self.dead_ranges and (max_rows is None or len(vectors) <= max_rows)):
+                return vectors
+            ranges = sorted(self.document_ranges.values())
+
+        rows = np.concatenate([np.arange(start, end, dtype=np.int64) for start, end in ranges] or [[]]).astype(np.int64)
+        if max_rows is not None and len(rows) > max_rows:
+            rows = np.sort(np.random.default_rng(0).choice(rows, size=max_rows, replace=False))
+        return np.asarray(vectors[rows])
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of indexed documents and chunks."""
+        with self._lock:
+            self._refresh()
+            return {
+                "documents": len(self.document_ranges),
+                "chunks": len(self.row_chunks),
+                "dead_chunks": sum(end - start for start, end in self.dead_ranges),
+                "dead_fraction": self.dead_fraction(),
+                "index_type": get_index_type(self.index) if self.index is not None else None,
+                "quantization": get_quantization(self.index) if self.index is not None else None,
+                "load_mode": self.load_mode,
+                "embedding_backend": self.embedding_backend
+            }
+
+
+class CorpusRetriever(BaseRetriever):
+    """LangChain retriever over the corpus index, restricted to a set of documents."""
+
+    # A SearchableCorpus; pydantic cannot validate protocols
+    corpus_index: Any
+    embedding_model: Embeddings
+    document_ids: List[str]
+    k: int = 5
+    diversify: bool = CONTEXT_DIVERSIFY
+    # Context selection report of the last retrieval
+    last_context: Optional[Dict[str, Any]] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if self.diversify:
+            docs, self.last_context = self.corpus_index.select_context(
+                query, self.embedding_model, self.document_ids, self.k
+            )
+            return docs
+        results = self.corpus_index.hybrid_search(query, self.embedding_model, self.document_ids, self.k)
+        return [doc for doc, _ in results]
+
+
+def _create_corpus_index() -> SearchableCorpus:
+    """Create the corpus index, sharded when CORPUS_SHARDS is above one."""
+    if CORPUS_SHARDS > 1:
+        from app.backend.services.sharded_index import ShardedCorpusIndex
+        return ShardedCorpusIndex()
+    return CorpusIndex()
+
+
+# Create a singleton instance of CorpusIndex, or of ShardedCorpusIndex
+_corpus_index = _create_corpus_index()
+
+
+def get_corpus_index() -> SearchableCorpus:
+    """Get the process-wide corpus index."""
+    return _corpus_index
@@ -1,11 +1,12 @@
 """
 Refactor to a DocumentService class for better separation of concerns and
-dependency injection. We will still store data in JSON for now.
+dependency injection. Document records are kept in an SQLite document store.
 """
 
 import os
 import json
 import shutil
+import hashlib
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 import sys
@@ -14,14 +15,16 @@ import uuid
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from app.config.settings import RAW_DATA_DIR, PROCESSED_DATA_DIR, EMBEDDINGS_DIR, DATA_DIR
+from app.config.settings import RAW_DATA_DIR, PROCESSED_DATA_DIR, EMBEDDINGS_DIR, DATA_DIR, MAX_UPLOAD_BYTES
+from app.backend.services.document_store import DocumentStore
 
-DOCUMENTS_DB_PATH = os.path.join(DATA_DIR, "documents.json")
+# Uploads are written and hashed in blocks of this many bytes
+UPLOAD_BLOCK_BYTES = 1024 * 1024
 
 class DocumentService:
     """
     A class-based implementation of the document service, allowing dependency injection
-    of ProcessorFactory and embedding generation logic. Data is still stored in JSON for now.
+    of ProcessorFactory and embedding generation logic. Records are stored in a DocumentStore.
     """
     def __init__(self, processor_factory, data_dir=DATA_DIR,
                  raw_data_dir=RAW_DATA_DIR, processed_data_dir=PROCESSED_DATA_DIR,
@@ -31,34 +34,17 @@ class DocumentService:
         self.raw_data_dir = raw_data_dir
         self.processed_data_dir = processed_data_dir
         self.embeddings_dir = embeddings_dir
-        self.documents_db_path = os.path.join(self.data_dir, "documents.json")
-
-    def _load_documents(self) -> List[Dict[str, Any]]:
-        """Load documents from the JSON file."""
-        if not os.path.exists(self.documents_db_path):
-            return []
-        try:
-            with open(self.documents_db_path, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return []
-
-    def _save_documents(self, documents: List[Dict[str, Any]]) -> None:
-        """Save documents to the JSON file."""
-        with open(self.documents_db_path, 'w') as f:
-            json.dump(documents, f, indent=2)
+        self.documents_db_path = os.path.join(self.data_dir, "documents.sqlite3")
+        # Records of the documents.json file used by earlier versions are imported on first use
+        self.store = DocumentStore(self.documents_db_path, os.path.join(self.data_dir, "documents.json"))
 
     def get_document_list(self) -> List[Dict[str, Any]]:
         """Get a list of all documents."""
-        return self._load_documents()
+        return self.store.list_all()
 
     def get_document_by_id(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """Get a document by its ID."""
-        documents = self._load_documents()
-        for doc in documents:
-            if doc["id"] == doc_id:
-                return doc
-        return None
+        return self.store.get(doc_id)
 
     def save_document(self, document: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -70,23 +56,12 @@ class DocumentService:
         document.setdefault("processed", False)
         document["last_modified"] = now
 
-        documents = self._load_documents()
-        documents.append(document)
-        self._save_documents(documents)
+        self.store.insert(document)
         return document
 
     def update_document_status(self, doc_id: str, status: str, processed: bool = False) -> Optional[Dict[str, Any]]:
         """Update the status of a document."""
-        documents = self._load_documents()
-        for i, doc in enumerate(documents):
-            if doc["id"] == doc_id:
-                doc["status"] = status
-                doc["processed"] = processed
-                doc["last_modified"] = datetime.now().isoformat()
-                documents[i] = doc
-                self._save_documents(documents)
-                return doc
-        return None
+        return self.store.update_status(doc_id, status, processed, datetime.now().isoformat())
 
     def delete_document(self, doc_id: str) -> bool:
         """Delete a document and its associated files."""
@@ -94,9 +69,7 @@ class DocumentService:
         if not document:
             return False
 
-        documents = self._load_documents()
-        documents = [doc for doc in documents if doc["id"] != doc_id]
-        self._save_documents(documents)
+        self.store.delete(doc_id)
 
         # Remove raw file
         raw_file_path = document.get("file_path")
@@ -113,6 +86,12 @@ class DocumentService:
         if os.path.exists(embeddings_dir):
             shutil.rmtree(embeddings_dir)
 
+        # Remove the document's chunks from the corpus index and loaded stores
+        from app.backend.services.corpus_index import get_corpus_index
+        from app.backend.services.vectorstore_cache import get_vectorstore_cache
+        get_corpus_index().remove_document(doc_id)
+        get_vectorstore_cache().invalidate(doc_id)
+
         return True
 
     def process_document(self, document_id: str, file, title: Optional[str] = None, background_tasks=None) -> Dict[str, Any]:
@@ -129,10 +108,12 @@ class DocumentService:
         safe_filename = f"{document_id}{file_ext}"
         os.makedirs(self.raw_data_dir, exist_ok=True)
         file_path = os.path.join(self.raw_data_dir, safe_filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        file_size, content_hash = self._save_upload(file, file_path)
 
-        file_size = os.path.getsize(file_path)
+        # A file already processed under another document is linked instead of processed again
+        duplicate = next(
+            (doc for doc in self.store.find_by_hash(content_hash) if doc.get("processed")), None
+        )
 
         doc_meta = {
             "id": document_id,
@@ -142,14 +123,26 @@ class DocumentService:
             "file_type": file_ext.lstrip("."),
             "file_path": file_path,
             "file_size": file_size,
+            "content_hash": content_hash,
             "processed": False,
             "embedding_id": None
         }
+        if duplicate:
+            doc_meta["duplicate_of"] = duplicate["id"]
         self.save_document(doc_meta)
 
         # Optionally process in background
         if background_tasks:
             def process_in_background(doc_id, path):
+                if duplicate and self._link_processed(duplicate["id"], doc_id, path):
+                    from app.backend.services.embedding_service import link_embeddings_for_document
+                    if link_embeddings_for_document(doc_id, duplicate["id"]):
+                        self.update_document_status(doc_id, "processed", processed=True)
+                        return
+                    print(f"Could not link document {doc_id} to {duplicate['id']}, processing it")
+                    # Start from an empty folder, as a document processed from scratch does
+                    shutil.rmtree(os.path.join(self.processed_data_dir, doc_id), ignore_errors=True)
+
                 processor = self.processor_factory.get_processor(path, doc_id)
                 if processor:
                     processor.process()
@@ -164,6 +157,79 @@ class DocumentService:
 
         return doc_meta
 
+    def _save_upload(self, file, file_path: str):
+        """
+        Stream an upload to disk, hashing it on the way.
+
+        Uploads over MAX_UPLOAD_BYTES are rejected as soon as the limit is
+        passed, or before reading when the client declared the size. Request
+        bodies declaring a larger Content-Length are already turned away by
+        the API before FastAPI buffers them.
+
+        Args:
+            file: The uploaded file
+            file_path: Path to write the file to
+
+        Returns:
+            Tuple of the file size in bytes and the SHA-256 hex digest of its content
+        """
+        declared_size = getattr(file, "size", None)
+        if declared_size is not None and declared_size > MAX_UPLOAD_BYTES:
+            raise ValueError(f"File is too large. Maximum size: {MAX_UPLOAD_BYTES} bytes")
+
+        digest = hashlib.sha256()
+        file_size = 0
+        try:
+            with open(file_path, "wb") as buffer:
+                for block in iter(lambda: file.file.read(UPLOAD_BLOCK_BYTES), b""):
+                    file_size += len(block)
+                    if file_size > MAX_UPLOAD_BYTES:
+                        raise ValueError(f"File is too large. Maximum size: {MAX_UPLOAD_BYTES} bytes")
+                    digest.update(block)
+                    buffer.write(block)
+        except BaseException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        return file_size, digest.hexdigest()
+
+    def _link_processed(self, source_id: str, doc_id: str, file_path: str) -> bool:
+        """
+        Give a document the processed text of an identical document.
+
+        The text and segment files are copied rather than hard-linked, as
+        processors rewrite them in place and would otherwise change the
+        source document too; metadata.json is rewritten with the id and file
+        path of the new document.
+
+        Returns:
+            True if the processed text was linked
+        """
+        source_dir = os.path.join(self.processed_data_dir, source_id)
+        target_dir = os.path.join(self.processed_data_dir, doc_id)
+        if not os.path.exists(os.path.join(source_dir, "content.txt")):
+            return False
+        try:
+            os.makedirs(target_dir, exist_ok=True)
+            for name in os.listdir(source_dir):
+                source_path = os.path.join(source_dir, name)
+                target_path = os.path.join(target_dir, name)
+                if name == "metadata.json" or not os.path.isfile(source_path):
+                    continue
+                shutil.copyfile(source_path, target_path)
+
+            metadata_path = os.path.join(source_dir, "metadata.json")
+            if os.path.exists(metadata_path):
+                with open(metadata_path, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+                metadata.update({"document_id": doc_id, "file_path": file_path})
+                with open(os.path.join(target_dir, "metadata.json"), 'w', encoding='utf-8') as f:
+                    json.dump(metadata, f, indent=2)
+            return True
+        except OSError as e:
+            print(f"Error linking processed text of {source_id}: {str(e)}")
+            return False
+
     def get_processed_text(self, document_id: str) -> str:
         """Retrieve the processed text of a document."""
         document = self.get_document_by_id(document_id)
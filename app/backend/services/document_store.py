@@ -0,0 +1,360 @@
+"""
+SQLite store of document records.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import STATUS_JOURNAL_COMPACT_ENTRIES
+
+
+class DocumentStore:
+    """
+    Document records in an SQLite table, one row per document.
+
+    Each record is stored as JSON next to indexed id, status, category and
+    content hash columns, so lookups do not read the other records. The database runs in
+    WAL mode: readers never block, and writers in other worker processes
+    wait for the write lock instead of overwriting each other. Records are
+    returned in insertion order, as the JSON file listed them.
+
+    Status changes are appended to a status journal and set in the status
+    column instead of rewriting the record JSON, and every compact_entries
+    appends the journal is folded into the JSON. The status column and its
+    index are always current; the records returned here include the journal.
+
+    Reads are served from an in-process copy of all records, which writes
+    through this store update in place. Commits by other processes change
+    SQLite's data_version, checked on every read: new journal entries are
+    then applied to the copy, and other changes reload it.
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: Optional[str] = None,
+                 compact_entries: int = STATUS_JOURNAL_COMPACT_ENTRIES):
+        """
+        Initialize the document store.
+
+        Args:
+            db_path: Path of the SQLite database file
+            legacy_json_path: documents.json written by earlier versions, imported once if present
+            compact_entries: Status journal entries appended between compactions
+        """
+        self.db_path = str(db_path)
+        self.compact_entries = max(1, compact_entries)
+        self._lock = threading.Lock()
+        self._records: Optional[Dict[str, Dict[str, Any]]] = None
+        # Version of the records table and last journal entry reflected in the in-process copy
+        self._records_version = None
+        self._journal_seq = 0
+        self._data_version = None
+        self.reloads = 0
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # Transactions are opened explicitly, so read-modify-write updates hold the write lock throughout
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction():
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    id TEXT PRIMARY KEY,
+                    status TEXT,
+                    category TEXT,
+                    content_hash TEXT,
+                    data TEXT NOT NULL
+                )
+                """
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(documents)").fetchall()]
+            if "content_hash" not in columns:
+                self._conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_status ON documents (status)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_category ON documents (category)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash)")
+            # AUTOINCREMENT keeps sequence numbers increasing after compaction deletes the journal
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS status_journal (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    document_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    processed INTEGER NOT NULL,
+                    changed_at TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_status_journal_document ON status_journal (document_id)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value TEXT)")
+            # Earlier versions left the status column stale until the journal was folded
+            self._fold_journal()
+
+        if legacy_json_path:
+            self._migrate(str(legacy_json_path))
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Run statements in a write transaction, serialized with other threads and processes.
+
+        The in-process copy is brought up to date first, so writes can be
+        applied to it.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._records is not None:
+                    if self._read_records_version() == self._records_version:
+                        self._apply_journal()
+                    else:
+                        self._records = None
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _read_records_version(self) -> int:
+        row = self._conn.execute("SELECT value FROM store_info WHERE key = 'records_version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _records_changed(self) -> None:
+        """Mark the records table as changed, keeping the in-process copy current. Call in a write transaction."""
+        version = self._read_records_version() + 1
+        self._conn.execute("INSERT OR REPLACE INTO store_info (key, value) VALUES ('records_version', ?)", (str(version),))
+        if self._records is not None:
+            self._records_version = version
+
+    @staticmethod
+    def _apply_status(document: Dict[str, Any], status: str, processed: int, changed_at: str) -> None:
+        document["status"] = status
+        document["processed"] = bool(processed)
+        document["last_modified"] = changed_at
+
+    def _apply_journal(self) -> None:
+        """Apply journal entries newer than the in-process copy to it."""
+        rows = self._conn.execute(
+            "SELECT seq, document_id, status, processed, changed_at FROM status_journal WHERE seq > ? ORDER BY seq",
+            (self._journal_seq,)
+        ).fetchall()
+        for seq, doc_id, status, processed, changed_at in rows:
+            if doc_id in self._records:
+                self._apply_status(self._records[doc_id], status, processed, changed_at)
+            self._journal_seq = seq
+
+    def _cached_records(self) -> Dict[str, Dict[str, Any]]:
+        """Get the in-process records, catching up with changes of other processes. Call with the lock held."""
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._records is not None and data_version == self._data_version:
+            return self._records
+
+        # Read the records and the journal from one snapshot
+        self._conn.execute("BEGIN")
+        try:
+            records_version = self._read_records_version()
+            if self._records is None or records_version != self._records_version:
+                rows = self._conn.execute("SELECT id, data FROM documents ORDER BY rowid").fetchall()
+                self._records = {doc_id: json.loads(data) for doc_id, data in rows}
+                self._records_version = records_version
+                self._journal_seq = 0
+                self.reloads += 1
+            self._apply_journal()
+        finally:
+            self._conn.execute("COMMIT")
+        self._data_version = data_version
+        return self._records
+
+    def _fold_journal(self, doc_id: Optional[str] = None) -> None:
+        """
+        Fold status journal entries into the records and delete them. Call in a write transaction.
+
+        Args:
+            doc_id: Only fold the entries of this document; all entries if None
+        """
+        if doc_id is None:
+            rows = self._conn.execute(
+                "SELECT seq, document_id, status, processed, changed_at FROM status_journal ORDER BY seq"
+            ).fetchall()
+        else:
+            rows = self._conn.execute(
+                "SELECT seq, document_id, status, processed, changed_at FROM status_journal "
+                "WHERE document_id = ? ORDER BY seq", (doc_id,)
+            ).fetchall()
+        if not rows:
+            return
+
+        latest = {}
+        for _, entry_doc_id, status, processed, changed_at in rows:
+            latest[entry_doc_id] = (status, processed, changed_at)
+        for entry_doc_id, entry in latest.items():
+            row = self._conn.execute("SELECT data FROM documents WHERE id = ?", (entry_doc_id,)).fetchone()
+            if row:
+                document = json.loads(row[0])
+                self._apply_status(document, *entry)
+                self._conn.execute(
+                    "UPDATE documents SET status = ?, category = ?, content_hash = ?, data = ? WHERE id = ?",
+                    self._row(document)[1:] + (entry_doc_id,)
+                )
+
+        if doc_id is None:
+            self._conn.execute("DELETE FROM status_journal WHERE seq <= ?", (rows[-1][0],))
+        else:
+            self._conn.execute("DELETE FROM status_journal WHERE document_id = ?", (doc_id,))
+        self._records_changed()
+
+    @staticmethod
+    def _row(document: Dict[str, Any]) -> tuple:
+        return (document["id"], document.get("status"), document.get("category"), document.get("content_hash"),
+                json.dumps(document))
+
+    def _migrate(self, json_path: str) -> None:
+        """Import the records of a documents.json file once; the file is left in place as a backup."""
+        with self._transaction():
+            if self._conn.execute("SELECT 1 FROM store_info WHERE key = 'migrated_from'").fetchone():
+                return
+
+            documents = []
+            if os.path.exists(json_path):
+                try:
+                    with open(json_path, 'r') as f:
+                        documents = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Error reading {json_path}, not migrating documents: {str(e)}")
+                    return
+
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO documents (id, status, category, content_hash, data) VALUES (?, ?, ?, ?, ?)",
+                [self._row(document) for document in documents if "id" in document]
+            )
+            self._conn.execute("INSERT INTO store_info (key, value) VALUES ('migrated_from', ?)", (json_path,))
+            self._records_changed()
+
+        if documents:
+            print(f"Migrated {len(documents)} documents from {json_path} to {self.db_path}")
+
+    def list_all(self) -> List[Dict[str, Any]]:
+        """
+        Get all document records.
+
+        Returns:
+            Records in insertion order
+        """
+        with self._lock:
+            return [dict(document) for document in self._cached_records().values()]
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a document record by its ID.
+
+        Returns:
+            The record, or None if there is none
+        """
+        with self._lock:
+            document = self._cached_records().get(doc_id)
+            return dict(document) if document is not None else None
+
+    def find_by_hash(self, content_hash: str) -> List[Dict[str, Any]]:
+        """
+        Get the document records with the given content hash.
+
+        Returns:
+            Records in insertion order
+        """
+        with self._lock:
+            records = self._cached_records()
+            rows = self._conn.execute(
+                "SELECT id FROM documents WHERE content_hash = ? ORDER BY rowid", (content_hash,)
+            ).fetchall()
+            return [dict(records[doc_id]) for doc_id, in rows if doc_id in records]
+
+    def insert(self, document: Dict[str, Any]) -> None:
+        """Add a document record, replacing any record with the same ID."""
+        with self._transaction():
+            self._conn.execute("DELETE FROM status_journal WHERE document_id = ?", (document["id"],))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (id, status, category, content_hash, data) VALUES (?, ?, ?, ?, ?)",
+                self._row(document)
+            )
+            self._records_changed()
+            if self._records is not None:
+                # A replaced record moves to the end, as its row does
+                self._records.pop(document["id"], None)
+                self._records[document["id"]] = dict(document)
+
+    def update(self, doc_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Update fields of a document record atomically.
+
+        Args:
+            doc_id: ID of the document
+            fields: Fields to set
+
+        Returns:
+            The updated record, or None if there is none
+        """
+        with self._transaction():
+            self._fold_journal(doc_id)
+            row = self._conn.execute("SELECT data FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            if not row:
+                return None
+            document = {**json.loads(row[0]), **fields}
+            self._conn.execute(
+                "UPDATE documents SET status = ?, category = ?, content_hash = ?, data = ? WHERE id = ?",
+                self._row(document)[1:] + (doc_id,)
+            )
+            self._records_changed()
+            if self._records is not None and doc_id in self._records:
+                self._records[doc_id] = dict(document)
+        return document
+
+    def update_status(self, doc_id: str, status: str, processed: bool, changed_at: str) -> Optional[Dict[str, Any]]:
+        """
+        Record a status change of a document in the status journal and the status column.
+
+        Args:
+            doc_id: ID of the document
+            status: New status
+            processed: Whether the document is processed
+            changed_at: ISO timestamp of the change
+
+        Returns:
+            The updated record, or None if there is none
+        """
+        with self._transaction():
+            if not self._conn.execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,)).fetchone():
+                return None
+            seq = self._conn.execute(
+                "INSERT INTO status_journal (document_id, status, processed, changed_at) VALUES (?, ?, ?, ?)",
+                (doc_id, status, int(processed), changed_at)
+            ).lastrowid
+            self._conn.execute("UPDATE documents SET status = ? WHERE id = ?", (status, doc_id))
+            if self._records is not None and doc_id in self._records:
+                self._apply_status(self._records[doc_id], status, processed, changed_at)
+
+            if seq % self.compact_entries == 0:
+                self._fold_journal()
+
+        return self.get(doc_id)
+
+    def delete(self, doc_id: str) -> bool:
+        """
+        Delete a document record.
+
+        Returns:
+            True if a record was deleted
+        """
+        with self._transaction():
+            self._conn.execute("DELETE FROM status_journal WHERE document_id = ?", (doc_id,))
+            cursor = self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            self._records_changed()
+            if self._records is not None:
+                self._records.pop(doc_id, None)
+        return cursor.rowcount > 0
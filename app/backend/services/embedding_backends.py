@@ -0,0 +1,155 @@
+"""
+Embedding backends selectable with EMBEDDING_BACKEND.
+
+"openai" calls the OpenAI embeddings API. "hashing" and
+"sentence-transformers" run on the local CPU, so ingestion is not bound by
+network latency or API rate limits and works offline.
+"""
+
+import os
+import sys
+import hashlib
+from typing import List, Optional
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import (
+    OPENAI_API_KEY, EMBEDDING_MODEL, EMBEDDING_BACKEND, LOCAL_EMBEDDING_MODEL, HASHING_EMBEDDING_DIMENSION
+)
+from app.backend.services.lexical_index import tokenize
+from app.backend.services.embedding_coalescer import CoalescingEmbeddings
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+EMBEDDING_BACKENDS = ("openai", "hashing", "sentence-transformers")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Feature-hashing embedder over terms and term bigrams.
+
+    Each feature is hashed to a signed bucket of a fixed-size vector, which is
+    then L2-normalized. Needs no model download and embeds thousands of chunks
+    per second on one core; quality is lexical rather than semantic.
+    """
+
+    def __init__(self, dimension: int = HASHING_EMBEDDING_DIMENSION):
+        """
+        Initialize the hashing embedder.
+
+        Args:
+            dimension: Length of the produced vectors
+        """
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        terms = tokenize(text)
+        features = terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in features:
+            # A stable hash, so every process maps a feature to the same bucket
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts."""
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query string."""
+        return self._embed(text)
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    Small transformer embedder run locally with the sentence-transformers package.
+
+    The package is an optional dependency, imported when the backend is created.
+    """
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL):
+        """
+        Initialize the transformer embedder.
+
+        Args:
+            model_name: Name or path of a sentence-transformers model
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "The sentence-transformers embedding backend requires the sentence-transformers package"
+            )
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts."""
+        vectors = self.model.encode(texts, batch_size=64, normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query string."""
+        return self.embed_documents([text])[0]
+
+
+def get_backend_id(backend: str = EMBEDDING_BACKEND) -> str:
+    """
+    Get the identifier of an embedding backend and its model.
+
+    Vectors are only comparable between indexes with the same identifier; it
+    is recorded with every index and used in embedding cache keys. The OpenAI
+    backend is identified by its bare model name, which indexes and cache
+    entries created before backends were selectable implicitly carry.
+
+    Args:
+        backend: One of EMBEDDING_BACKENDS
+
+    Returns:
+        Identifier such as "text-embedding-ada-002" or "hashing:768"
+    """
+    if backend == "hashing":
+        return f"hashing:{HASHING_EMBEDDING_DIMENSION}"
+    if backend == "sentence-transformers":
+        return f"sentence-transformers:{LOCAL_EMBEDDING_MODEL}"
+    return EMBEDDING_MODEL
+
+
+def create_embeddings(backend: str = EMBEDDING_BACKEND) -> Optional[Embeddings]:
+    """
+    Create the embedding model of a backend.
+
+    Concurrent queries to the OpenAI backend are coalesced into multi-input
+    requests; local backends embed in-process and gain nothing from waiting.
+
+    Args:
+        backend: One of EMBEDDING_BACKENDS
+
+    Returns:
+        Embedding model, or None if it could not be created
+    """
+    try:
+        if backend == "hashing":
+            return HashingEmbeddings()
+        if backend == "sentence-transformers":
+            return SentenceTransformerEmbeddings()
+        if backend != "openai":
+            print(f"Unknown embedding backend: {backend}")
+            return None
+        return CoalescingEmbeddings(
+            OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL), EMBEDDING_MODEL
+        )
+    except Exception as e:
+        print(f"Error creating {backend} embedding backend: {str(e)}")
+        return None
@@ -0,0 +1,446 @@
+"""
+Content-addressed cache of embedding vectors shared across documents, and an
+LRU cache of query embeddings.
+"""
+
+import os
+import sys
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import (
+    EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES,
+    QUERY_EMBEDDING_CACHE_MAX_ENTRIES, QUERY_EMBEDDING_CACHE_TTL_SECONDS, QUERY_EMBEDDING_CACHE_PERSIST
+)
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so that trivially different copies share a cache entry."""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split())
+
+
+def make_cache_key(model: str, text: str) -> str:
+    """Build the cache key for a text embedded with a given model."""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}:{digest}"
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (embedding model, normalized text hash).
+
+    Vectors are stored as float32 blobs in SQLite so the cache survives restarts
+    and is shared by every worker process. Once the cache grows past
+    max_entries, the least recently used entries are evicted.
+    """
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        """
+        Initialize the embedding cache.
+
+        Args:
+            db_path: Path of the SQLite database file
+            max_entries: Maximum number of vectors kept before evicting
+        """
+        self.db_path = str(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+        # Row count kept by triggers, so eviction checks do not scan the table; shared by all processes
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embedding_count (entries INTEGER NOT NULL)")
+        if self._conn.execute("SELECT COUNT(*) FROM embedding_count").fetchone()[0] == 0:
+            self._conn.execute("INSERT INTO embedding_count (entries) SELECT COUNT(*) FROM embeddings")
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_count_insert AFTER INSERT ON embeddings "
+            "BEGIN UPDATE embedding_count SET entries = entries + 1; END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_count_delete AFTER DELETE ON embeddings "
+            "BEGIN UPDATE embedding_count SET entries = entries - 1; END"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up cached vectors for a batch of texts.
+
+        Args:
+            model: Name of the embedding model
+            texts: Texts to look up
+
+        Returns:
+            List aligned with texts holding the vector, or None on a miss
+        """
+        keys = [make_cache_key(model, text) for text in texts]
+        found = {}
+
+        with self._lock:
+            unique_keys = list(set(keys))
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            results = [found.get(key) for key in keys]
+            hit_count = sum(1 for vector in results if vector is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]) -> None:
+        """
+        Store vectors for a batch of texts.
+
+        Args:
+            model: Name of the embedding model
+            texts: Texts that were embedded
+            vectors: Embedding vectors aligned with texts
+        """
+        now = time.time()
+        rows = [
+            (make_cache_key(model, text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire the count trigger
+            self._conn.executemany(
+                "INSERT INTO embeddings (key, vector, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used", rows
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _entries(self) -> int:
+        """Number of stored vectors, from the trigger-maintained count."""
+        return self._conn.execute("SELECT entries FROM embedding_count").fetchone()[0]
+
+    def _evict(self) -> None:
+        """Drop the least recently used entries above max_entries."""
+        excess = self._entries() - self.max_entries
+        if excess <= 0:
+            return
+
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,)
+        )
+        self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary with hits, misses, hit rate and number of stored entries
+        """
+        with self._lock:
+            entries = self._entries()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries
+            }
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache from normalized query text to its embedding, with a TTL.
+
+    Popular questions are answered from memory without a call to the embedding
+    model. With persistence enabled, entries are also written to a table of
+    the embedding cache database, so they survive restarts and are shared by
+    worker processes; memory misses are then looked up there.
+    """
+
+    def __init__(self, max_entries: int = QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+                 db_path: Optional[str] = EMBEDDING_CACHE_PATH if QUERY_EMBEDDING_CACHE_PERSIST else None):
+        """
+        Initialize the query embedding cache.
+
+        Args:
+            max_entries: Maximum number of query vectors kept in memory (and on disk)
+            ttl_seconds: Age after which a cached vector is embedded again
+            db_path: Path of the SQLite database to persist to, or None for memory only
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if db_path:
+            os.makedirs(os.path.dirname(str(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_query_embeddings_created_at ON query_embeddings (created_at)"
+            )
+            self._conn.commit()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """
+        Look up the cached vector of a query.
+
+        Args:
+            model: Name of the embedding model
+            text: Query text
+
+        Returns:
+            The vector, or None if it is missing or expired
+        """
+        key = make_cache_key(model, text)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, created_at = entry
+                if now - created_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+                self.expired += 1
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT vector, created_at FROM query_embeddings WHERE key = ? AND created_at > ?",
+                    (key, now - self.ttl_seconds)
+                ).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+                    self._store(key, vector, row[1])
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, vector: List[float]) -> None:
+        """
+        Store the vector of a query.
+
+        Args:
+            model: Name of the embedding model
+            text: Query text
+            vector: Embedding vector of the query
+        """
+        key = make_cache_key(model, text)
+        now = time.time()
+
+        with self._lock:
+            self._store(key, list(vector), now)
+
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                    (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                )
+                self._conn.execute(
+                    "DELETE FROM query_embeddings WHERE created_at <= ? OR key IN "
+                    "(SELECT key FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (now - self.ttl_seconds, self.max_entries)
+                )
+                self._conn.commit()
+
+    def _store(self, key: str, vector: List[float], created_at: float) -> None:
+        """Insert an entry as most recently used, evicting the least recently used above max_entries."""
+        self._entries[key] = (vector, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary with hits (from memory and disk), misses, expirations,
+            hit rate and number of entries in memory
+        """
+        with self._lock:
+            hits = self.hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self._conn is not None
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults the embedding cache before the wrapped model.
+
+    Only texts missing from the cache are sent to the wrapped model, and
+    duplicates within a batch are embedded once. Queries are served from the
+    query embedding cache.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: Optional[EmbeddingCache] = None,
+                 query_cache: Optional[QueryEmbeddingCache] = None):
+        """
+        Initialize the cached embeddings.
+
+        Args:
+            embeddings: Embedding model to call on cache misses
+            model_name: Name of the embedding model, used in the cache key
+            cache: Cache to use (defaults to the shared cache)
+            query_cache: Query cache to use (defaults to the shared query cache)
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache or get_embedding_cache()
+        self.query_cache = query_cache or get_query_embedding_cache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts, reusing cached vectors where possible."""
+        vectors = self.cache.get_many(self.model_name, texts)
+
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(normalize_text(texts[i]), []).append(i)
+
+        if missing:
+            positions = list(missing.values())
+            new_texts = [texts[indexes[0]] for indexes in positions]
+            new_vectors = self.embeddings.embed_documents(new_texts)
+            self.cache.put_many(self.model_name, new_texts, new_vectors)
+
+            for indexes, vector in zip(positions, new_vectors):
+                for i in indexes:
+                    vectors[i] = vector
+
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query string, reusing the vector of a recent identical query."""
+        vector = self.query_cache.get(self.model_name, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.query_cache.put(self.model_name, text, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several query strings, sending all uncached ones in one request.
+
+        Args:
+            texts: Query strings
+
+        Returns:
+            Query vectors aligned with texts
+        """
+        vectors = [self.query_cache.get(self.model_name, text) for text in texts]
+
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(normalize_text(texts[i]), []).append(i)
+
+        if missing:
+            positions = list(missing.values())
+            new_texts = [texts[indexes[0]] for indexes in positions]
+            new_vectors = self.embeddings.embed_documents(new_texts)
+            for text, indexes, vector in zip(new_texts, positions, new_vectors):
+                self.query_cache.put(self.model_name, text, vector)
+                for i in indexes:
+                    vectors[i] = vector
+
+        return vectors
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get the process-wide embedding cache, creating it on first use."""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache()
+        return _embedding_cache
+
+
+_query_embedding_cache = None
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Get the process-wide query embedding cache, creating it on first use."""
+    global _query_embedding_cache
+    with _embedding_cache_lock:
+        if _query_embedding_cache is None:
+            _query_embedding_cache = QueryEmbeddingCache()
+        return _query_embedding_cache
@@ -0,0 +1,127 @@
+"""
+Coalescing of concurrent embedding requests into multi-input API calls.
+"""
+
+import os
+import sys
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, List
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_BATCH_MAX_SIZE
+from app.backend.services.micro_batcher import MicroBatcher
+
+from langchain_core.embeddings import Embeddings
+
+# Number of recent requests kept for latency percentiles
+_LATENCY_SAMPLES = 1000
+
+
+class EmbeddingCoalescer(MicroBatcher):
+    """
+    Gathers concurrent single-text embedding requests into one multi-input request.
+
+    Batches are gathered as by MicroBatcher, with max_batch counted in
+    texts. A batch embeds all its texts with one call, so N concurrent chat
+    turns cost one request against the rate limit instead of N.
+    """
+
+    def __init__(self, window_ms: float = EMBEDDING_BATCH_WINDOW_MS, max_batch: int = EMBEDDING_BATCH_MAX_SIZE):
+        """
+        Initialize the coalescer.
+
+        Args:
+            window_ms: How long a batch stays open for more requests; 0 disables coalescing
+            max_batch: Number of texts that closes a batch early
+        """
+        super().__init__(window_ms, max_batch)
+        self._latencies = deque(maxlen=_LATENCY_SAMPLES)
+
+    def embed(self, key: Hashable, embed: Callable[[List[str]], List[List[float]]], text: str) -> List[float]:
+        """
+        Embed a text, batched with concurrent requests sharing its key.
+
+        Args:
+            key: Identifies requests that can share a call, e.g. the API and model
+            embed: Callable embedding a list of texts
+            text: Text to embed
+
+        Returns:
+            The embedding vector of the text
+        """
+        if self.window_ms <= 0:
+            return embed([text])[0]
+
+        enqueued = time.perf_counter()
+        result = self.submit(key, embed, text)
+        with self._lock:
+            self._latencies.append(time.perf_counter() - enqueued)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get coalescing counters.
+
+        Returns:
+            Dictionary with request and API call counts, the batch size
+            distribution, and queue delay and end-to-end latency percentiles
+        """
+        with self._lock:
+            stats = self._batch_stats()
+            latencies = np.array(self._latencies) * 1000 if self._latencies else np.zeros(1)
+            return {
+                "window_ms": stats["window_ms"],
+                "requests": stats["requests"],
+                "api_calls": stats["batches"],
+                "api_calls_saved": stats["requests"] - stats["batches"],
+                "batch_size_histogram": stats["batch_size_histogram"],
+                "queue_delay_ms_p50": stats["queue_delay_ms_p50"],
+                "queue_delay_ms_p95": stats["queue_delay_ms_p95"],
+                "latency_ms_p50": float(np.percentile(latencies, 50)),
+                "latency_ms_p99": float(np.percentile(latencies, 99))
+            }
+
+
+class CoalescingEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that coalesces concurrent query embeddings.
+
+    Single queries are sent through the embedding coalescer as one
+    multi-input embed_documents call; document batches are already batched
+    and go straight to the wrapped model.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, coalescer: "EmbeddingCoalescer" = None):
+        """
+        Initialize the coalescing embeddings.
+
+        Args:
+            embeddings: Embedding model to call
+            model_name: Name of the embedding model, used to key batches
+            coalescer: Coalescer to use (defaults to the shared coalescer)
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.coalescer = coalescer or get_embedding_coalescer()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts."""
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query string together with concurrent queries."""
+        return self.coalescer.embed(("embeddings", self.model_name), self.embeddings.embed_documents, text)
+
+
+# Create a singleton instance of EmbeddingCoalescer
+_embedding_coalescer = EmbeddingCoalescer()
+
+
+def get_embedding_coalescer() -> EmbeddingCoalescer:
+    """Get the process-wide embedding coalescer."""
+    return _embedding_coalescer
@@ -7,32 +7,55 @@ import sys
 import json
 import numpy as np
 import shutil
-from typing import List, Dict, Any, Optional, Tuple
+import itertools
+from typing import List, Dict, Any, Optional, Tuple, Iterable
 from datetime import datetime
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from app.config.settings import EMBEDDINGS_DIR, PROCESSED_DATA_DIR, DATA_DIR, OPENAI_API_KEY
+from app.config.settings import (
+    EMBEDDINGS_DIR, PROCESSED_DATA_DIR, VECTORSTORE_LOAD_MODE, HYBRID_SEARCH, HYBRID_CANDIDATE_FACTOR,
+    CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_EMBEDDING_BATCH_SIZE, INDEX_REPORT_MAX_VECTORS
+)
+from app.backend.services.embedding_backends import create_embeddings, get_backend_id
+from app.backend.services.embedding_cache import CachedEmbeddings, make_cache_key, get_embedding_cache, get_query_embedding_cache
+from app.backend.services.corpus_index import get_corpus_index, CorpusRetriever
+from app.backend.services.vectorstore_cache import get_vectorstore_cache
+from app.backend.services.mmap_store import (
+    save_mmap_files, save_index, load_mmap_vectorstore, has_mmap_files, load_vectors, LazyChunkList,
+    write_vectors, write_chunks, write_index_info, read_index_info, link_or_copy
+)
+from app.backend.services.lexical_index import LexicalIndex, fuse_rankings
+from app.backend.services.search_dispatcher import get_search_dispatcher
+from app.backend.services.embedding_coalescer import get_embedding_coalescer
+from app.backend.services.context_selector import get_context_stats
+from app.backend.services.chunker import StreamingChunker
+from app.backend.document_processors.base_processor import load_segments
+from app.backend.services.warmup import get_activity_log
+from app.backend.services.index_factory import (
+    build_index, build_vectorstore, get_index_type, get_quantization, recall_latency_report
+)
 
 # Langchain imports for RAG
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
-# Create a properly configured OpenAIEmbeddings instance
+_embedding_model = None
+
+# Create the embedding model of the configured backend
 def get_embedding_model():
-    """Create an OpenAIEmbeddings instance with the correct configuration."""
-    try:
-        # Set OpenAI API key from environment
-        return OpenAIEmbeddings(
-            openai_api_key=OPENAI_API_KEY,
-            model="text-embedding-ada-002"
-        )
-    except Exception as e:
-        print(f"Error creating embedding model: {str(e)}")
+    """Get the process-wide embedding model of EMBEDDING_BACKEND, backed by the shared embedding cache."""
+    global _embedding_model
+    if _embedding_model is not None:
+        return _embedding_model
+    
+    embeddings = create_embeddings()
+    if embeddings is None:
         return None
+    
+    _embedding_model = CachedEmbeddings(embeddings, get_backend_id())
+    return _embedding_model
 
 class EmbeddingService:
     """
@@ -49,27 +72,31 @@ class EmbeddingService:
         self.document_id = document_id
         self.embeddings_dir = os.path.join(EMBEDDINGS_DIR, document_id)
         
-        # Create embeddings directory if it doesn't exist
-        os.makedirs(self.embeddings_dir, exist_ok=True)
-        
-        # Paths for storing index and metadata
+        # Path for storing the index with its vectors and chunks
         self.faiss_index_path = os.path.join(self.embeddings_dir, 'faiss_index')
-        self.metadata_path = os.path.join(self.embeddings_dir, 'chunks_metadata.json')
+        # Per-chunk metadata file written by earlier versions, superseded by the chunk store
+        self.legacy_metadata_path = os.path.join(self.embeddings_dir, 'chunks_metadata.json')
         
         # Initialize OpenAI embeddings
         self.embedding_model = get_embedding_model()
     
-    def generate_embeddings(self, chunk_size: int = 1000, chunk_overlap: int = 200) -> bool:
+    def generate_embeddings(self, chunk_tokens: int = CHUNK_SIZE_TOKENS,
+                            chunk_overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> bool:
         """
-        Generate embeddings for document chunks using Langchain.
+        Generate embeddings for document chunks.
+        
+        The processed text is streamed from disk through the chunker and the
+        embedding model into the new chunk store, so the document text is
+        never held in memory as a whole.
         
         Args:
-            chunk_size: Size of text chunks in characters
-            chunk_overlap: Overlap between chunks in characters
+            chunk_tokens: Maximum size of text chunks in tokens
+            chunk_overlap_tokens: Overlap between chunks in tokens
             
         Returns:
             True if successful, False otherwise
         """
+        tmp_path = f"{self.faiss_index_path}.tmp-{os.getpid()}"
         try:
             if not self.embedding_model:
                 print("Embedding model not initialized")
@@ -83,17 +110,6 @@ class EmbeddingService:
                 print(f"Processed content not found for document: {self.document_id}")
                 return False
             
-            # Read the document content
-            with open(content_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Create chunks using Langchain's text splitter
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-                length_function=len,
-            )
-            
             # Get document metadata from metadata.json if it exists
             doc_metadata = {}
             metadata_path = os.path.join(processed_dir, 'metadata.json')
@@ -104,63 +120,240 @@ class EmbeddingService:
                 except Exception as e:
                     print(f"Error reading metadata file: {str(e)}")
             
-            # Create Langchain documents with metadata
-            langchain_docs = [
-                Document(
-                    page_content=content,
-                    metadata={
-                        "document_id": self.document_id,
-                        "source": doc_metadata.get("title", "Unknown"),
-                        "created_at": doc_metadata.get("created_at", datetime.now().isoformat()),
-                        **doc_metadata
-                    }
-                )
-            ]
+            metadata = {
+                "document_id": self.document_id,
+                "source": doc_metadata.get("title", "Unknown"),
+                "created_at": doc_metadata.get("created_at", datetime.now().isoformat()),
+                **doc_metadata
+            }
+            chunker = StreamingChunker(chunk_tokens, chunk_overlap_tokens)
             
-            # Split documents into chunks
-            chunks = text_splitter.split_documents(langchain_docs)
+            # Embed the chunks as they are split and write them to a folder next to the current index
+            os.makedirs(self.embeddings_dir, exist_ok=True)
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            # Chunks stay within the pages, slides, sections and tables the processor recorded
+            segments = load_segments(processed_dir)
+            vectors = self._embed_changed_chunks(chunker.split_file(content_path, metadata, segments), tmp_path)
             
-            if not chunks:
+            if not len(vectors):
                 print(f"No chunks generated for document: {self.document_id}")
+                shutil.rmtree(tmp_path, ignore_errors=True)
                 return False
             
-            # Generate embeddings and create FAISS index
-            vectorstore = FAISS.from_documents(chunks, self.embedding_model)
-            
-            # Save FAISS index
-            vectorstore.save_local(self.faiss_index_path)
+            index = build_index(vectors)
             
-            # Save chunks metadata for reference
-            chunks_metadata = []
-            for i, chunk in enumerate(chunks):
-                    chunks_metadata.append({
-                        "chunk_id": i,
-                        "document_id": self.document_id,
-                    "text": chunk.page_content[:100] + "..." if len(chunk.page_content) > 100 else chunk.page_content,
-                    "metadata": chunk.metadata
-                })
+            # Complete the new index and swap it in
+            self._save_index_atomically(index, vectors, tmp_path)
+            get_vectorstore_cache().invalidate(self.document_id)
+            if os.path.exists(self.legacy_metadata_path):
+                os.remove(self.legacy_metadata_path)
             
-            with open(self.metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(chunks_metadata, f, indent=2)
+            # Make the chunks searchable through the corpus-wide index
+            get_corpus_index().add_document(self.document_id, vectors, LazyChunkList(self.faiss_index_path))
             
             return True
         
         except Exception as e:
             print(f"Error generating embeddings: {str(e)}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return False
+    
+    def _embed_changed_chunks(self, chunks: Iterable[Document], folder_path: str) -> np.ndarray:
+        """
+        Embed a stream of chunks into a chunk store, reusing the vectors of unchanged chunks.
+        
+        Chunks are matched to the previous index by the hash of their text;
+        only chunks without a match are sent to the embedding model, in
+        batches of CHUNK_EMBEDDING_BATCH_SIZE, and vectors of chunks that
+        disappeared are dropped. Each batch is written to the chunk store
+        before the next is split.
+        
+        Args:
+            chunks: The new chunks of the document, in order
+            folder_path: Folder to write the chunk store to
+            
+        Returns:
+            float32 matrix with one row per chunk
+        """
+        previous = {}
+        if self.has_embeddings():
+            try:
+                old_vectors, old_chunks = self.get_stored_chunks()
+                for row, chunk in enumerate(old_chunks):
+                    previous.setdefault(make_cache_key(get_backend_id(), chunk.page_content), row)
+            except Exception as e:
+                print(f"Could not read previous embeddings, embedding all chunks: {str(e)}")
+                previous = {}
+        
+        batches = []
+        embedded = 0
+        
+        def embed_batches():
+            nonlocal embedded
+            batch = []
+            for chunk in itertools.chain(chunks, [None]):
+                if chunk is not None:
+                    batch.append(chunk)
+                    if len(batch) < CHUNK_EMBEDDING_BATCH_SIZE:
+                        continue
+                if not batch:
+                    break
+                
+                hashes = [make_cache_key(get_backend_id(), doc.page_content) for doc in batch]
+                changed = [i for i, chunk_hash in enumerate(hashes) if chunk_hash not in previous]
+                new_vectors = []
+                if changed:
+                    new_vectors = self.embedding_model.embed_documents([batch[i].page_content for i in changed])
+                
+                vectors = [old_vectors[previous[chunk_hash]] if chunk_hash in previous else None for chunk_hash in hashes]
+                for i, vector in zip(changed, new_vectors):
+                    vectors[i] = vector
+                batches.append(np.array(vectors, dtype=np.float32))
+                embedded += len(changed)
+                
+                yield from batch
+                batch = []
+        
+        write_chunks(folder_path, embed_batches())
+        total = sum(len(batch) for batch in batches)
+        print(f"Embedded {embedded} of {total} chunks for document {self.document_id}, "
+              f"reused {total - embedded}")
+        return np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+    
+    def _save_index_atomically(self, index, vectors: np.ndarray, tmp_path: str) -> None:
+        """
+        Complete an index folder holding the new chunk store and rename it over
+        the current one.
+        
+        Readers never see a half-written index; processes that still map the
+        previous files keep reading them until they reload.
+        """
+        # Save the original vectors and lexical index first, then the FAISS index
+        write_vectors(tmp_path, vectors)
+        chunks = LazyChunkList(tmp_path)
+        LexicalIndex.from_texts(chunk.page_content for chunk in chunks).save(tmp_path)
+        write_index_info(tmp_path, {
+            "index_type": get_index_type(index),
+            "quantization": get_quantization(index),
+            "chunk_count": len(chunks),
+            "dimension": int(vectors.shape[1]),
+            "embedding_backend": get_backend_id()
+        })
+        save_index(tmp_path, index)
+        self._swap_in(tmp_path)
+    
+    def _swap_in(self, tmp_path: str) -> None:
+        """Rename a complete index folder over the document's current index."""
+        old_path = f"{self.faiss_index_path}.old-{os.getpid()}"
+        if os.path.exists(self.faiss_index_path):
+            os.rename(self.faiss_index_path, old_path)
+            try:
+                os.rename(tmp_path, self.faiss_index_path)
+            except OSError:
+                os.rename(old_path, self.faiss_index_path)
+                raise
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.rename(tmp_path, self.faiss_index_path)
+    
+    def link_embeddings_from(self, source_id: str) -> bool:
+        """
+        Give the document the index of another document with identical content.
+        
+        The vectors, FAISS index and lexical index files are hard-linked and
+        only the chunk store is rewritten, with the metadata of this
+        document; nothing is embedded.
+        
+        Args:
+            source_id: ID of the processed document with the same content
+            
+        Returns:
+            True if successful, False if the source has no usable index
+        """
+        tmp_path = f"{self.faiss_index_path}.tmp-{os.getpid()}"
+        try:
+            source = EmbeddingService(source_id)
+            if not source.has_embeddings():
+                return False
+            _, source_chunks = source.get_stored_chunks()
+            if read_index_info(source.faiss_index_path).get("embedding_backend", get_backend_id()) != get_backend_id():
+                print(f"Index of document {source_id} was built with another embedding backend, not linking")
+                return False
+            
+            # The chunks carry the processed metadata of this document, e.g. its id and file path
+            doc_metadata = {}
+            metadata_path = os.path.join(PROCESSED_DATA_DIR, self.document_id, 'metadata.json')
+            if os.path.exists(metadata_path):
+                with open(metadata_path, 'r', encoding='utf-8') as f:
+                    doc_metadata = json.load(f)
+            
+            os.makedirs(self.embeddings_dir, exist_ok=True)
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            for name in os.listdir(source.faiss_index_path):
+                path = os.path.join(source.faiss_index_path, name)
+                if os.path.isfile(path):
+                    link_or_copy(path, os.path.join(tmp_path, name))
+            write_chunks(tmp_path, (
+                Document(page_content=chunk.page_content,
+                         metadata={**chunk.metadata, **doc_metadata, "document_id": self.document_id})
+                for chunk in source_chunks
+            ))
+            self._swap_in(tmp_path)
+            get_vectorstore_cache().invalidate(self.document_id)
+            
+            # Make the chunks searchable through the corpus-wide index
+            get_corpus_index().add_document(
+                self.document_id, load_vectors(self.faiss_index_path), LazyChunkList(self.faiss_index_path)
+            )
+            print(f"Linked embeddings of document {self.document_id} to identical document {source_id}")
+            return True
+        
+        except Exception as e:
+            print(f"Error linking embeddings: {str(e)}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
             return False
     
     def has_embeddings(self) -> bool:
         """
         Check if embeddings exist for the document.
         
+        Embeddings built with another embedding backend do not count, as their
+        vectors cannot be compared with queries embedded by the current one.
+        
         Returns:
-            True if embeddings exist, False otherwise
+            True if embeddings of the current backend exist, False otherwise
         """
-        return os.path.exists(self.faiss_index_path)
+        if not os.path.exists(self.faiss_index_path):
+            return False
+        
+        backend_id = read_index_info(self.faiss_index_path).get("embedding_backend", get_backend_id("openai"))
+        if backend_id != get_backend_id():
+            print(f"Embeddings of document {self.document_id} were built with {backend_id}, not {get_backend_id()}")
+            return False
+        return True
     
     def get_vectorstore(self):
         """
-        Load the vector store for the document.
+        Get the vector store for the document.
+        
+        Stores are served from the process-wide vector store cache and only
+        loaded from disk when missing or when the saved index has changed.
+        
+        Returns:
+            FAISS vector store if it exists, None otherwise
+        """
+        return get_vectorstore_cache().get(self.document_id, self.faiss_index_path, self._load_vectorstore)
+    
+    def _load_vectorstore(self):
+        """
+        Load the vector store for the document from disk.
+        
+        Chunks are always read lazily from the chunk store; the load mode
+        decides whether the FAISS index is read into memory or mapped. The
+        document's lexical index is attached to the store as lexical_index,
+        and its memory-mapped original vectors as stored_vectors.
         
         Returns:
             FAISS vector store if it exists, None otherwise
@@ -169,11 +362,50 @@ class EmbeddingService:
             return None
             
         try:
-            return FAISS.load_local(self.faiss_index_path, self.embedding_model)
+            self._export_stored_chunks()
+            vectorstore = load_mmap_vectorstore(
+                self.faiss_index_path, self.embedding_model, mmap_vectors=VECTORSTORE_LOAD_MODE == "mmap"
+            )
+            if vectorstore is not None:
+                vectorstore.lexical_index = self._load_lexical_index()
+                vectorstore.stored_vectors = load_vectors(self.faiss_index_path)
+            return vectorstore
         except Exception as e:
             print(f"Error loading vector store: {str(e)}")
             return None
     
+    def _export_stored_chunks(self) -> None:
+        """Write the vectors and chunk store of an index saved with a pickled docstore."""
+        if has_mmap_files(self.faiss_index_path):
+            return
+        
+        # Such indexes are always flat, so their vectors can be reconstructed exactly
+        vectorstore = FAISS.load_local(self.faiss_index_path, self.embedding_model)
+        rows = sorted(vectorstore.index_to_docstore_id.items())
+        save_mmap_files(
+            self.faiss_index_path,
+            vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal),
+            [vectorstore.docstore.search(docstore_id) for _, docstore_id in rows]
+        )
+    
+    def _load_lexical_index(self) -> LexicalIndex:
+        """Load the document's lexical index, building it for indexes saved without one."""
+        lexical_index = LexicalIndex.load(self.faiss_index_path)
+        if lexical_index is None:
+            lexical_index = LexicalIndex.from_texts(chunk.page_content for chunk in LazyChunkList(self.faiss_index_path))
+            lexical_index.save(self.faiss_index_path)
+        return lexical_index
+    
+    def get_stored_chunks(self) -> Tuple[np.ndarray, LazyChunkList]:
+        """
+        Get the original vectors and chunks of the document's index.
+        
+        Returns:
+            Memory-mapped vector matrix and the chunks aligned with its rows
+        """
+        self._export_stored_chunks()
+        return load_vectors(self.faiss_index_path), LazyChunkList(self.faiss_index_path)
+    
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
         Search for the most relevant document chunks for a query.
@@ -183,30 +415,98 @@ class EmbeddingService:
             top_k: Number of top results to return
             
         Returns:
-            List of the top_k most similar chunks with their metadata
+            List of the top_k most similar chunks with their metadata; chunks
+            found by the lexical fast path carry their BM25 score as
+            bm25_score and no similarity_score, as the query was not embedded
+        """
+        return self.search_batch([query], top_k)[0]
+    
+    def search_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
         """
+        Search for the most relevant document chunks for several queries at once.
+        
+        All queries that need a vector are embedded in one request and searched
+        in one vectorized FAISS call, so N lookups cost about as much as one;
+        the search dispatcher also batches it with concurrent searches.
+        With hybrid search, BM25 rankings are fused in per query, and short
+        queries matching chunks as an exact phrase skip embedding entirely.
+        
+        Args:
+            queries: Query strings
+            top_k: Number of top results to return per query
+            
+        Returns:
+            One list of results per query, as returned by search
+        """
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
         try:
             vectorstore = self.get_vectorstore()
-            if not vectorstore:
-                return []
+            if not vectorstore or not queries:
+                return [[] for _ in queries]
+            
+            def get_chunk(row):
+                return vectorstore.docstore.search(vectorstore.index_to_docstore_id[row])
             
-            # Search for similar chunks
-            search_results = vectorstore.similarity_search_with_score(query, k=top_k)
+            lexical_index = getattr(vectorstore, "lexical_index", None) if HYBRID_SEARCH else None
+            candidates = top_k * HYBRID_CANDIDATE_FACTOR if lexical_index is not None else top_k
+            lexical_hits = [[] for _ in queries]
             
-            # Format results
-            results = []
-            for doc, score in search_results:
-                results.append({
-                    "text": doc.page_content,
-                    "metadata": doc.metadata,
-                    "similarity_score": float(1.0 / (1.0 + score))  # Convert distance to similarity
-                })
+            if lexical_index is not None:
+                for i, query in enumerate(queries):
+                    lexical_hits[i] = lexical_index.search(query, candidates)
+                    exact = lexical_index.exact_matches(query, lexical_hits[i], lambda row: get_chunk(row).page_content)
+                    if exact:
+                        results[i] = [self._format_lexical_result(get_chunk(row), score) for score, row in exact[:top_k]]
+            
+            pending = [i for i, result in enumerate(results) if result is None]
+            if pending:
+                query_vectors = np.array(
+                    self.embedding_model.embed_queries([queries[i] for i in pending]), dtype=np.float32
+                )
+                index = vectorstore.index
+                fetch_k = min(candidates, index.ntotal)
+                distances, labels = get_search_dispatcher().search(
+                    ("index", id(index), fetch_k), lambda batch: index.search(batch, fetch_k), query_vectors
+                )
+                vectors = vectorstore.stored_vectors
+                
+                for j, i in enumerate(pending):
+                    dense = [(d, row) for d, row in zip(distances[j].tolist(), labels[j].tolist()) if row != -1]
+                    if lexical_index is None:
+                        results[i] = [self._format_result(get_chunk(row), d) for d, row in dense]
+                        continue
+                    
+                    # Report the exact distance of every fused result, including lexical-only ones
+                    fused = fuse_rankings([[row for _, row in dense], [row for _, row in lexical_hits[i]]], top_k)
+                    results[i] = [
+                        self._format_result(get_chunk(row), float(((vectors[row] - query_vectors[j]) ** 2).sum()))
+                        for _, row in fused
+                    ]
             
             return results
         
         except Exception as e:
             print(f"Error searching embeddings: {str(e)}")
-            return []
+            return [result or [] for result in results]
+    
+    @staticmethod
+    def _format_result(doc: Document, distance: float) -> Dict[str, Any]:
+        """Format a chunk and its L2 distance as a search result."""
+        return {
+            "text": doc.page_content,
+            "metadata": doc.metadata,
+            "similarity_score": float(1.0 / (1.0 + distance))  # Convert distance to similarity
+        }
+    
+    @staticmethod
+    def _format_lexical_result(doc: Document, score: float) -> Dict[str, Any]:
+        """Format a chunk found without embedding the query, with its BM25 score."""
+        return {
+            "text": doc.page_content,
+            "metadata": doc.metadata,
+            "similarity_score": None,
+            "bm25_score": float(score)
+        }
 
 
 def generate_embeddings_for_document(document_id: str) -> bool:
@@ -223,6 +523,21 @@ def generate_embeddings_for_document(document_id: str) -> bool:
     return embedding_service.generate_embeddings()
 
 
+def link_embeddings_for_document(document_id: str, source_id: str) -> bool:
+    """
+    Give a document the index of an identical, already embedded document.
+    
+    Args:
+        document_id: ID of the document
+        source_id: ID of the document with the same content
+        
+    Returns:
+        True if successful, False otherwise
+    """
+    embedding_service = EmbeddingService(document_id)
+    return embedding_service.link_embeddings_from(source_id)
+
+
 def search_in_document(document_id: str, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
     """
     Search for relevant content in a document.
@@ -237,12 +552,36 @@ def search_in_document(document_id: str, query: str, top_k: int = 5) -> List[Dic
     """
     embedding_service = EmbeddingService(document_id)
     
-    # Generate embeddings if they don't exist
-    if not embedding_service.has_embeddings():
+    # Generate embeddings if they don't exist; a cached store was checked for the backend when loaded
+    if embedding_service.get_vectorstore() is None:
         if not embedding_service.generate_embeddings():
             return []
     
-    return embedding_service.search(query, top_k) 
+    get_activity_log().record([document_id])
+    return embedding_service.search(query, top_k)
+
+
+def search_batch_in_document(document_id: str, queries: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+    """
+    Search for relevant content in a document for several queries at once.
+    
+    Args:
+        document_id: ID of the document
+        queries: Search queries
+        top_k: Number of top results to return per query
+        
+    Returns:
+        One list of the top_k most similar chunks per query
+    """
+    embedding_service = EmbeddingService(document_id)
+    
+    # Generate embeddings if they don't exist; a cached store was checked for the backend when loaded
+    if embedding_service.get_vectorstore() is None:
+        if not embedding_service.generate_embeddings():
+            return [[] for _ in queries]
+    
+    get_activity_log().record([document_id])
+    return embedding_service.search_batch(queries, top_k)
 
 
 def get_vectorstore_for_documents(document_ids: List[str]):
@@ -266,10 +605,11 @@ def get_vectorstore_for_documents(document_ids: List[str]):
             print("Failed to initialize embedding model for combined vectorstore")
             return None
             
-        combined_docs = []
+        all_vectors = []
+        all_chunks = []
         missing_embeddings = []
         
-        # Get individual vector stores
+        # Get the stored vectors of each document
         for doc_id in document_ids:
             embedding_service = EmbeddingService(doc_id)
             
@@ -282,32 +622,220 @@ def get_vectorstore_for_documents(document_ids: List[str]):
                     missing_embeddings.append(doc_id)
                     continue
             
-            # Now try to get the vectorstore
-            vectorstore = embedding_service.get_vectorstore()
-            
-            if vectorstore:
-                # Get the documents from the vector store
-                try:
-                    faiss_docs = vectorstore.similarity_search("", k=1000)  # Get all docs
-                    combined_docs.extend(faiss_docs)
-                    print(f"Added {len(faiss_docs)} chunks from document {doc_id}")
-                except Exception as e:
-                    print(f"Error retrieving documents from vectorstore for {doc_id}: {str(e)}")
-            else:
-                print(f"Failed to get vectorstore for document {doc_id}")
+            try:
+                vectors, chunks = embedding_service.get_stored_chunks()
+            except Exception as e:
+                print(f"Failed to get stored vectors for document {doc_id}: {str(e)}")
                 missing_embeddings.append(doc_id)
+                continue
+            
+            all_vectors.append(vectors)
+            all_chunks.extend(chunks)
+            print(f"Added {len(chunks)} chunks from document {doc_id}")
         
         if missing_embeddings:
             print(f"Warning: Could not get embeddings for documents: {', '.join(missing_embeddings)}")
         
-        if not combined_docs:
+        if not all_chunks:
             print("No document chunks found for any of the requested documents")
             return None
             
-        # Create a new vector store with all documents
-        print(f"Creating combined vectorstore with {len(combined_docs)} chunks from {len(document_ids) - len(missing_embeddings)} documents")
-        return FAISS.from_documents(combined_docs, embedding_model)
+        # Build the combined store from the stored vectors; no chunk is embedded again
+        combined_vectors = np.concatenate(all_vectors)
+        combined = build_vectorstore(combined_vectors, all_chunks, embedding_model, rerank_vectors=combined_vectors)
+        print(f"Created combined vectorstore with {len(all_chunks)} chunks from {len(all_vectors)} documents")
+        return combined
     
     except Exception as e:
         print(f"Error creating combined vector store: {str(e)}")
-        return None 
\ No newline at end of file
+        return None
+
+
+def get_retriever_for_documents(document_ids: List[str], k: int = 5) -> Optional[CorpusRetriever]:
+    """
+    Get a retriever over the corpus index restricted to the given documents.
+    
+    Documents missing from the corpus index are added from their own vector
+    store (generating it first if needed); no combined store is built.
+    
+    Args:
+        document_ids: List of document IDs
+        k: Number of chunks to retrieve per query
+        
+    Returns:
+        Retriever over the selected documents, or None if none of them are searchable
+    """
+    if not document_ids:
+        print("No document IDs provided for retriever creation")
+        return None
+    
+    try:
+        embedding_model = get_embedding_model()
+        if not embedding_model:
+            print("Failed to initialize embedding model for retriever")
+            return None
+        
+        corpus_index = get_corpus_index()
+        indexed_ids = []
+        missing_embeddings = []
+        
+        for doc_id in document_ids:
+            if not corpus_index.has_document(doc_id):
+                embedding_service = EmbeddingService(doc_id)
+                
+                if not embedding_service.has_embeddings():
+                    print(f"Embeddings not found for document {doc_id}, generating now...")
+                    if not embedding_service.generate_embeddings():
+                        print(f"Failed to generate embeddings for document {doc_id}")
+                        missing_embeddings.append(doc_id)
+                        continue
+                else:
+                    try:
+                        corpus_index.add_document(doc_id, *embedding_service.get_stored_chunks())
+                    except Exception as e:
+                        print(f"Failed to get stored vectors for document {doc_id}: {str(e)}")
+                        missing_embeddings.append(doc_id)
+                        continue
+            
+            indexed_ids.append(doc_id)
+        
+        if missing_embeddings:
+            print(f"Warning: Could not get embeddings for documents: {', '.join(missing_embeddings)}")
+        
+        if not indexed_ids:
+            print("No document chunks found for any of the requested documents")
+            return None
+        
+        return CorpusRetriever(
+            corpus_index=corpus_index,
+            embedding_model=embedding_model,
+            document_ids=indexed_ids,
+            k=k
+        )
+    
+    except Exception as e:
+        print(f"Error creating corpus retriever: {str(e)}")
+        return None
+
+
+def warm_documents(document_ids: List[str]) -> int:
+    """
+    Preload the vector stores and corpus index rows of a document set.
+    
+    Documents without embeddings are skipped rather than embedded, so
+    warm-up never calls the embedding API.
+    
+    Args:
+        document_ids: List of document IDs
+        
+    Returns:
+        Number of corpus index rows warmed
+    """
+    ready_ids = [doc_id for doc_id in document_ids if EmbeddingService(doc_id).has_embeddings()]
+    if not ready_ids:
+        return 0
+    
+    for doc_id in ready_ids:
+        EmbeddingService(doc_id).get_vectorstore()
+    
+    retriever = get_retriever_for_documents(ready_ids)
+    if not retriever:
+        return 0
+    return retriever.corpus_index.warm(retriever.document_ids)
+
+
+def get_index_report(document_ids: Optional[List[str]] = None, k: int = 10) -> List[Dict[str, Any]]:
+    """
+    Report recall@k and latency of each index type over stored vectors.
+    
+    Indexes are built over a sample of at most INDEX_REPORT_MAX_VECTORS
+    vectors, so the report stays cheap on large corpora. For given
+    documents, rows are sampled across them before any vector is read from
+    their memory-mapped stores; documents without embeddings are skipped.
+    
+    Args:
+        document_ids: Documents whose vectors are measured (defaults to the whole corpus)
+        k: Number of neighbours compared for recall
+        
+    Returns:
+        One entry per index type and search setting, empty if no document has embeddings
+    """
+    if document_ids:
+        vectors = _sample_document_vectors(document_ids, INDEX_REPORT_MAX_VECTORS)
+    else:
+        vectors = get_corpus_index().get_vectors(INDEX_REPORT_MAX_VECTORS)
+    
+    if vectors is None or len(vectors) == 0:
+        return []
+    
+    return recall_latency_report(vectors, k=k, max_vectors=INDEX_REPORT_MAX_VECTORS)
+
+
+def _sample_document_vectors(document_ids: List[str], max_rows: int) -> Optional[np.ndarray]:
+    """
+    Read a random sample of at most max_rows stored vectors of the given documents.
+
+    Rows are drawn uniformly over all documents, so each contributes in
+    proportion to its chunks, and only the sampled rows are read.
+    """
+    stored = []
+    for doc_id in document_ids:
+        embedding_service = EmbeddingService(doc_id)
+        if not embedding_service.has_embeddings():
+            print(f"Skipping document {doc_id} without embeddings in the index report")
+            continue
+        stored.append(embedding_service.get_stored_chunks()[0])
+    if not stored:
+        return None
+
+    offsets = np.cumsum([0] + [len(vectors) for vectors in stored])
+    rows = np.arange(offsets[-1], dtype=np.int64)
+    if len(rows) > max_rows:
+        rows = np.sort(np.random.default_rng(0).choice(rows, size=max_rows, replace=False))
+    bounds = np.searchsorted(rows, offsets)
+    return np.concatenate([
+        np.asarray(vectors[rows[bounds[i]:bounds[i + 1]] - offsets[i]]) for i, vectors in enumerate(stored)
+    ])
+
+
+def compact_corpus_index() -> Dict[str, Any]:
+    """
+    Rewrite the corpus index without the chunks of removed documents.
+    
+    Compaction also runs in the background once enough chunks are dead;
+    this runs it right away.
+    
+    Returns:
+        Whether the index was compacted, and its statistics afterwards
+    """
+    corpus_index = get_corpus_index()
+    compacted = corpus_index.compact()
+    return {"compacted": compacted, **corpus_index.stats()}
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    Get the counters of the embedding, query embedding and vector store caches.
+    
+    Returns:
+        Dictionary of cache statistics keyed by cache name
+    """
+    return {
+        "embeddings": get_embedding_cache().stats(),
+        "query_embeddings": get_query_embedding_cache().stats(),
+        "vectorstores": get_vectorstore_cache().stats()
+    }
+
+
+def get_search_stats() -> Dict[str, Any]:
+    """
+    Get the counters of search and query embedding batching, and of context selection.
+    
+    Returns:
+        Dictionary of statistics keyed by stage name
+    """
+    return {
+        "vector_search": get_search_dispatcher().stats(),
+        "query_embedding": get_embedding_coalescer().stats(),
+        "context_selection": get_context_stats().stats()
+    }
@@ -0,0 +1,427 @@
+"""
+Construction of FAISS indexes of selectable type (flat, HNSW, IVF-PQ).
+
+Indexes start out flat and are promoted to an approximate type once their
+number of vectors passes VECTOR_INDEX_PROMOTION_THRESHOLD. Flat and HNSW
+indexes can store scalar-quantized vectors (VECTOR_QUANTIZATION); their
+candidates are then re-ranked against the original float32 vectors.
+"""
+
+import os
+import sys
+import time
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+import faiss
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import (
+    VECTOR_INDEX_TYPE, VECTOR_INDEX_PROMOTION_THRESHOLD, VECTOR_INDEX_APPROXIMATE_TYPE,
+    HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, IVF_NPROBE, IVFPQ_M,
+    VECTOR_QUANTIZATION, VECTOR_RERANK_FACTOR, INDEX_REPORT_MAX_VECTORS
+)
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+QUANTIZATIONS = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Product quantization with 8-bit codes needs 256 centroids per sub-quantizer
+IVFPQ_MIN_TRAINING_VECTORS = 256 * 39
+
+
+def choose_index_type(n_vectors: int, index_type: str = VECTOR_INDEX_TYPE) -> str:
+    """
+    Choose the index type for a number of vectors.
+
+    Args:
+        n_vectors: Number of vectors to index
+        index_type: Configured type; "auto" promotes by VECTOR_INDEX_PROMOTION_THRESHOLD
+
+    Returns:
+        One of INDEX_TYPES
+    """
+    if index_type != "auto":
+        return index_type
+    if n_vectors < VECTOR_INDEX_PROMOTION_THRESHOLD:
+        return "flat"
+    return VECTOR_INDEX_APPROXIMATE_TYPE
+
+
+def get_index_type(index) -> str:
+    """Get the INDEX_TYPES name of a FAISS index."""
+    if isinstance(index, RerankingIndex):
+        index = index.index
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+def get_quantization(index) -> str:
+    """Get the scalar quantization of a FAISS index ("none", "fp16" or "int8")."""
+    if isinstance(index, RerankingIndex):
+        index = index.index
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        for name, qtype in QUANTIZATIONS.items():
+            if index.sq.qtype == qtype:
+                return name
+    return "none"
+
+
+def get_index_bytes(index) -> int:
+    """
+    Measure the memory held by a loaded FAISS index from its contents.
+
+    Counts the stored codes, HNSW graph links, and IVF lists with their
+    centroids and PQ codebooks; indexes that report resident_bytes
+    themselves, like MmapFlatIndex, are taken at their word.
+    """
+    if isinstance(index, RerankingIndex):
+        index = index.index
+    resident_bytes = getattr(index, "resident_bytes", None)
+    if resident_bytes is not None:
+        return int(resident_bytes)
+    if isinstance(index, faiss.IndexHNSW):
+        hnsw = index.hnsw
+        links = hnsw.neighbors.size() * 4 + hnsw.levels.size() * 4 + hnsw.offsets.size() * 8
+        return index.storage.sa_code_size() * index.ntotal + links
+    if isinstance(index, faiss.IndexIVF):
+        index = faiss.downcast_index(index)
+        entries = sum(index.invlists.list_size(i) for i in range(index.nlist))
+        size = entries * (index.code_size + 8) + index.quantizer.ntotal * index.d * 4
+        if isinstance(index, faiss.IndexIVFPQ):
+            size += index.pq.centroids.size() * 4
+        return size
+    return index.sa_code_size() * index.ntotal
+
+
+def index_fits(index, n_vectors: int) -> bool:
+    """Check whether an index has the type and quantization configured for its size."""
+    index_type = choose_index_type(n_vectors)
+    quantization = VECTOR_QUANTIZATION if index_type != "ivfpq" else "none"
+    return get_index_type(index) == index_type and get_quantization(index) == quantization
+
+
+def _ivfpq_nlist(n_vectors: int) -> int:
+    """Number of IVF lists: about 4 * sqrt(n), with enough training points per list."""
+    return int(max(1, min(4 * np.sqrt(n_vectors), n_vectors // 39)))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest divisor of the dimension not above IVFPQ_M."""
+    m = min(IVFPQ_M, dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def build_index(vectors: np.ndarray, index_type: Optional[str] = None, quantization: Optional[str] = None):
+    """
+    Build a FAISS index over a vector matrix.
+
+    IVF-PQ indexes are trained on the vectors themselves; with too few vectors
+    to train, a flat index is built instead. Scalar quantization applies to
+    flat and HNSW indexes only, as IVF-PQ codes are already compressed.
+
+    Args:
+        vectors: float32 matrix of shape (n, d)
+        index_type: One of INDEX_TYPES, or None to choose by size
+        quantization: "none", "fp16" or "int8", or None for VECTOR_QUANTIZATION
+
+    Returns:
+        FAISS index containing the vectors in row order
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dimension = vectors.shape
+    index_type = index_type or choose_index_type(n_vectors)
+    qtype = QUANTIZATIONS.get(quantization or VECTOR_QUANTIZATION)
+
+    if index_type == "ivfpq" and n_vectors < IVFPQ_MIN_TRAINING_VECTORS:
+        print(f"Too few vectors ({n_vectors}) to train an IVF-PQ index, building a flat index")
+        index_type = "flat"
+
+    if index_type == "hnsw":
+        if qtype is not None:
+            index = faiss.IndexHNSWSQ(dimension, qtype, HNSW_M)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == "ivfpq":
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, _ivfpq_nlist(n_vectors), _pq_subquantizers(dimension), 8)
+    elif qtype is not None:
+        index = faiss.IndexScalarQuantizer(dimension, qtype, faiss.METRIC_L2)
+    else:
+        index = faiss.IndexFlatL2(dimension)
+
+    if not index.is_trained and n_vectors:
+        index.train(vectors)
+
+    if n_vectors:
+        index.add(vectors)
+    apply_search_params(index)
+    return index
+
+
+def apply_search_params(index) -> None:
+    """Apply the configured search-time parameters to an index."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = IVF_NPROBE
+
+
+def make_search_params(index, selector, widen: int = 1):
+    """
+    Build search parameters restricting an index to the ids accepted by selector.
+
+    Args:
+        index: FAISS index to search
+        selector: FAISS id selector
+        widen: Factor applied to efSearch (HNSW) or nprobe (IVF), to explore more of the index
+    """
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch * widen)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(index.nprobe * widen, index.nlist))
+    return faiss.SearchParameters(sel=selector)
+
+
+def read_index(path: str, mmap: bool = False):
+    """
+    Read a saved FAISS index and apply the configured search parameters.
+
+    Args:
+        path: Path of the index file
+        mmap: Memory-map the inverted lists of IVF indexes instead of reading them
+
+    Returns:
+        The FAISS index
+    """
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(path, flags)
+    apply_search_params(index)
+    return index
+
+
+class RerankingIndex:
+    """
+    Wraps a scalar-quantized index and re-ranks its candidates exactly.
+
+    The quantized index returns VECTOR_RERANK_FACTOR times more candidates
+    than requested; their distances are recomputed against the original
+    vectors (typically memory-mapped) and the closest k are returned.
+    """
+
+    def __init__(self, index, vectors: np.ndarray, rerank_factor: int = VECTOR_RERANK_FACTOR):
+        self.index = index
+        self.vectors = vectors
+        self.rerank_factor = rerank_factor
+        self.d = index.d
+        self.metric_type = index.metric_type
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def search(self, x: np.ndarray, k: int, params=None):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        fetch_k = k * self.rerank_factor
+        if params is None:
+            _, candidates = self.index.search(x, fetch_k)
+        else:
+            _, candidates = self.index.search(x, fetch_k, params=params)
+        return rerank(x, candidates, self.vectors, k)
+
+    def reconstruct(self, row: int) -> np.ndarray:
+        return np.array(self.vectors[row])
+
+    def reconstruct_n(self, start: int, n: int) -> np.ndarray:
+        return np.array(self.vectors[start:start + n])
+
+
+def rerank(queries: np.ndarray, candidates: np.ndarray, vectors: np.ndarray, k: int):
+    """
+    Re-rank candidate rows by exact L2 distance to the original vectors.
+
+    Args:
+        queries: Query matrix of shape (nq, d)
+        candidates: Candidate rows of shape (nq, m), -1 for missing
+        vectors: Original vectors indexed by row
+        k: Number of results per query
+
+    Returns:
+        (distances, labels) arrays of shape (nq, k), as returned by FAISS
+    """
+    distances = np.full((len(queries), k), np.finfo(np.float32).max, dtype=np.float32)
+    labels = np.full((len(queries), k), -1, dtype=np.int64)
+
+    for i, (query, rows) in enumerate(zip(queries, candidates)):
+        rows = np.sort(rows[rows >= 0])
+        if not len(rows):
+            continue
+        exact = ((np.asarray(vectors[rows], dtype=np.float32) - query) ** 2).sum(axis=1)
+        order = np.argsort(exact)[:k]
+        distances[i, :len(order)] = exact[order]
+        labels[i, :len(order)] = rows[order]
+
+    return distances, labels
+
+
+def wrap_for_search(index, vectors: np.ndarray):
+    """Wrap a scalar-quantized index so its results are re-ranked with the original vectors."""
+    if get_quantization(index) != "none" and VECTOR_RERANK_FACTOR > 1:
+        return RerankingIndex(index, vectors)
+    return index
+
+
+def build_vectorstore(vectors: np.ndarray, chunks: Sequence[Document], embedding_model,
+                      index_type: Optional[str] = None, rerank_vectors: Optional[np.ndarray] = None) -> FAISS:
+    """
+    Build a FAISS vector store from precomputed vectors, without embedding anything.
+
+    Chunks are stored under their row number as docstore id.
+
+    Args:
+        vectors: float32 matrix with one row per chunk
+        chunks: Chunks aligned with the vector rows
+        embedding_model: Embedding model used to embed queries
+        index_type: One of INDEX_TYPES, or None to choose by size
+        rerank_vectors: Original vectors to re-rank quantized results with; the
+            raw index is kept (e.g. for saving) when omitted
+
+    Returns:
+        FAISS vector store
+    """
+    index = build_index(vectors, index_type)
+    if rerank_vectors is not None:
+        index = wrap_for_search(index, rerank_vectors)
+    docstore = InMemoryDocstore({str(row): chunk for row, chunk in enumerate(chunks)})
+    index_to_docstore_id = {row: str(row) for row in range(len(chunks))}
+    return FAISS(embedding_model, index, docstore, index_to_docstore_id)
+
+
+def recall_latency_report(
+    vectors: np.ndarray,
+    queries: Optional[np.ndarray] = None,
+    k: int = 10,
+    n_queries: int = 200,
+    max_vectors: int = INDEX_REPORT_MAX_VECTORS,
+    hnsw_ef_search: Sequence[int] = (16, 32, 64, 128, 256),
+    ivf_nprobe: Sequence[int] = (1, 4, 16, 64)
+) -> List[Dict[str, Any]]:
+    """
+    Measure recall@k and query latency of each index type against exact search.
+
+    Flat and HNSW indexes are also measured with fp16 and int8 scalar
+    quantization, reporting recall before and after re-ranking with the
+    original vectors; latency includes the re-ranking. Every variant is
+    built over the same random sample of at most max_vectors vectors, so
+    the cost of a report does not grow with the corpus; only sampled rows
+    of memory-mapped vectors are read.
+
+    Args:
+        vectors: Stored vectors to index
+        queries: Query vectors; defaults to perturbed samples of the indexed vectors
+        k: Number of neighbours compared for recall
+        n_queries: Number of sampled queries when queries is None
+        max_vectors: Number of vectors the indexes are built over
+        hnsw_ef_search: efSearch values to measure for HNSW
+        ivf_nprobe: nprobe values to measure for IVF-PQ
+
+    Returns:
+        One entry per index type, quantization and setting, with recall, latency and size
+    """
+    rng = np.random.default_rng(0)
+    if len(vectors) > max_vectors:
+        vectors = vectors[np.sort(rng.choice(len(vectors), size=max_vectors, replace=False))]
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if queries is None:
+        sample = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+        queries = sample + rng.normal(scale=float(vectors.std()) * 0.1, size=sample.shape).astype(np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    k = min(k, len(vectors))
+
+    variants = [("flat", "none")] + [
+        (index_type, quantization)
+        for index_type in INDEX_TYPES
+        for quantization in ["none"] + list(QUANTIZATIONS)
+        if (index_type, quantization) != ("flat", "none") and (index_type != "ivfpq" or quantization == "none")
+    ]
+
+    report = []
+    truth = None
+    for index_type, quantization in variants:
+        start = time.perf_counter()
+        try:
+            index = build_index(vectors, index_type, quantization)
+        except Exception as e:
+            print(f"Could not build {index_type} index for report: {str(e)}")
+            continue
+        build_seconds = time.perf_counter() - start
+
+        if get_index_type(index) != index_type:
+            # Fell back to another type (e.g. too few vectors to train)
+            continue
+
+        if isinstance(index, faiss.IndexHNSW):
+            settings = [("efSearch", value) for value in hnsw_ef_search]
+        elif isinstance(index, faiss.IndexIVF):
+            settings = [("nprobe", min(value, index.nlist)) for value in ivf_nprobe]
+        else:
+            settings = [(None, None)]
+
+        size_bytes = len(faiss.serialize_index(index))
+        reranking = RerankingIndex(index, vectors) if quantization != "none" else None
+        for name, value in settings:
+            if name == "efSearch":
+                index.hnsw.efSearch = value
+            elif name == "nprobe":
+                index.nprobe = value
+
+            searched = reranking or index
+            start = time.perf_counter()
+            for query in queries:
+                _, labels = searched.search(query[None, :], k)
+            per_query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            _, labels = index.search(queries, k)
+            if truth is None:
+                truth = labels
+            entry = {
+                "index_type": index_type,
+                "quantization": quantization,
+                "parameter": name,
+                "value": value,
+                "recall_at_k": _recall(labels, truth, k),
+                "latency_ms": per_query_ms,
+                "build_seconds": build_seconds,
+                "size_bytes": size_bytes,
+                "n_vectors": len(vectors)
+            }
+            if reranking is not None:
+                entry["recall_at_k_reranked"] = _recall(reranking.search(queries, k)[1], truth, k)
+            report.append(entry)
+
+    return report
+
+
+def _recall(labels: np.ndarray, truth: np.ndarray, k: int) -> float:
+    """Mean fraction of the true k nearest neighbours found per query."""
+    return float(np.mean([
+        len(set(found[found >= 0]) & set(expected)) / k
+        for found, expected in zip(labels, truth)
+    ]))
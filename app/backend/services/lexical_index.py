@@ -0,0 +1,318 @@
+"""
+BM25 inverted index over chunks, built at ingest time and fused with vector search.
+
+The index is stored next to the vectors it belongs to: a vocabulary mapping
+each term to its slices of the postings, and postings, term frequencies and
+chunk lengths as memory-mapped arrays. Chunks appended later add one slice
+per term at the end of the postings, so an index grows without being rebuilt.
+"""
+
+import os
+import re
+import sys
+import json
+from collections import Counter
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Callable
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import HYBRID_RRF_K, LEXICAL_FAST_PATH_MAX_TERMS, LEXICAL_FAST_PATH_MAX_DF_FRACTION
+from app.backend.services.mmap_store import append_array
+
+VOCABULARY_FILE = "lexical.vocab.json"
+POSTINGS_FILE = "lexical.postings.npy"
+FREQUENCIES_FILE = "lexical.freqs.npy"
+LENGTHS_FILE = "lexical.lengths.npy"
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Words joined by dots or dashes stay one term, so "3.2" or "x-ray" match exactly
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-]\w+)*")
+
+# Tokens naming something specific: with a digit, an underscore, a dot or a capital after a lowercase letter
+IDENTIFIER_PATTERN = re.compile(r"[\d_.]|[a-z][A-Z]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    BM25 index over the chunks of a vector store, addressed by chunk row.
+    """
+
+    def __init__(self, vocabulary: Dict[str, List[int]], postings: np.ndarray, frequencies: np.ndarray,
+                 lengths: np.ndarray):
+        """
+        Initialize the lexical index.
+
+        Args:
+            vocabulary: Term to its [start, end) slices of the postings, flattened as [start, end, start, end, ...]
+            postings: Chunk rows of every term, grouped by term
+            frequencies: Term frequency aligned with the postings
+            lengths: Number of terms of each chunk
+        """
+        self.vocabulary = vocabulary
+        self.postings = postings
+        self.frequencies = frequencies
+        self.lengths = lengths
+        self.average_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "LexicalIndex":
+        """Build an index from chunk texts in row order."""
+        term_rows: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for row, text in enumerate(texts):
+            terms = tokenize(text)
+            lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                term_rows.setdefault(term, []).append((row, count))
+
+        vocabulary = {}
+        postings = []
+        frequencies = []
+        for term in sorted(term_rows):
+            start = len(postings)
+            for row, count in term_rows[term]:
+                postings.append(row)
+                frequencies.append(count)
+            vocabulary[term] = [start, len(postings)]
+
+        return cls(
+            vocabulary,
+            np.array(postings, dtype=np.int32),
+            np.array(frequencies, dtype=np.int32),
+            np.array(lengths, dtype=np.int32)
+        )
+
+    def _postings(self, term: str, ranges: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the chunk rows and term frequencies of an indexed term, over all its slices.
+
+        Rows are sorted within each slice, so with ranges (an array of sorted
+        [start, end) rows) each slice is narrowed to them by binary search and
+        only the postings inside the ranges are read.
+        """
+        slices = self.vocabulary[term]
+        rows, frequencies = [], []
+        for start, end in zip(slices[0::2], slices[1::2]):
+            slice_rows = self.postings[start:end]
+            if ranges is None:
+                rows.append(np.asarray(slice_rows))
+                frequencies.append(np.asarray(self.frequencies[start:end]))
+                continue
+            lows = np.searchsorted(slice_rows, ranges[:, 0])
+            highs = np.searchsorted(slice_rows, ranges[:, 1])
+            for low, high in zip(lows[lows < highs].tolist(), highs[lows < highs].tolist()):
+                rows.append(np.asarray(slice_rows[low:high]))
+                frequencies.append(np.asarray(self.frequencies[start + low:start + high]))
+        if not rows:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        return np.concatenate(rows), np.concatenate(frequencies)
+
+    def _document_frequency(self, term: str) -> int:
+        """Get the number of chunks containing an indexed term."""
+        slices = self.vocabulary[term]
+        return sum(end - start for start, end in zip(slices[0::2], slices[1::2]))
+
+    def append(self, folder_path: str, texts: Iterable[str], first_row: int) -> "LexicalIndex":
+        """
+        Append chunks to this index and write them to its folder in place.
+
+        The postings of the new chunks follow the existing ones as one more
+        slice per term, so the cost follows the size of the new text; only
+        the vocabulary is rewritten. Building with from_texts merges the
+        slices again.
+
+        Args:
+            folder_path: Folder the index is saved in; it is saved first if it is not
+            texts: Chunk texts in row order, starting at first_row
+            first_row: Row of the first new chunk, the number of chunks kept
+
+        Returns:
+            The index with the new chunks, memory-mapped from the folder
+        """
+        if not os.path.exists(os.path.join(folder_path, VOCABULARY_FILE)):
+            self.save(folder_path)
+
+        added = LexicalIndex.from_texts(texts)
+        # Postings past the last slice were left by an interrupted append and are overwritten
+        kept = max((slices[-1] for slices in self.vocabulary.values()), default=0)
+        vocabulary = {term: list(slices) for term, slices in self.vocabulary.items()}
+        for term, (start, end) in added.vocabulary.items():
+            vocabulary.setdefault(term, []).extend([kept + start, kept + end])
+
+        append_array(os.path.join(folder_path, POSTINGS_FILE), added.postings + np.int32(first_row), kept)
+        append_array(os.path.join(folder_path, FREQUENCIES_FILE), added.frequencies, kept)
+        append_array(os.path.join(folder_path, LENGTHS_FILE), added.lengths, first_row)
+
+        # The vocabulary is written last, as by save
+        path = os.path.join(folder_path, VOCABULARY_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(vocabulary, f)
+        os.replace(path + ".tmp", path)
+        return LexicalIndex.load(folder_path)
+
+    def save(self, folder_path: str) -> None:
+        """Write the index to a folder."""
+        for name, array in ((POSTINGS_FILE, self.postings), (FREQUENCIES_FILE, self.frequencies),
+                            (LENGTHS_FILE, self.lengths)):
+            path = os.path.join(folder_path, name)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+
+        # The vocabulary is written last; its presence marks a complete index
+        path = os.path.join(folder_path, VOCABULARY_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.vocabulary, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, folder_path: str) -> Optional["LexicalIndex"]:
+        """Load the index of a folder with memory-mapped arrays, or None if it has none."""
+        try:
+            with open(os.path.join(folder_path, VOCABULARY_FILE), "r") as f:
+                vocabulary = json.load(f)
+            return cls(
+                vocabulary,
+                np.load(os.path.join(folder_path, POSTINGS_FILE), mmap_mode="r"),
+                np.load(os.path.join(folder_path, FREQUENCIES_FILE), mmap_mode="r"),
+                np.load(os.path.join(folder_path, LENGTHS_FILE), mmap_mode="r")
+            )
+        except (OSError, ValueError):
+            return None
+
+    def statistics(self, query: str) -> Dict[str, Any]:
+        """
+        Get the collection statistics BM25 needs for a query.
+
+        Statistics of several indexes add up, so indexes searched together
+        (such as corpus shards) can score with the statistics of their union.
+
+        Args:
+            query: Query text
+
+        Returns:
+            Dictionary with the number of rows, their total length and the
+            document frequency of each query term
+        """
+        frequencies = {}
+        for term in set(tokenize(query)):
+            if term in self.vocabulary:
+                frequencies[term] = self._document_frequency(term)
+        return {"rows": len(self.lengths), "total_length": int(np.sum(self.lengths)), "df": frequencies}
+
+    def search(self, query: str, k: int, ranges: Optional[List[Tuple[int, int]]] = None,
+               statistics: Optional[Dict[str, Any]] = None) -> List[Tuple[float, int]]:
+        """
+        Rank chunks by BM25 score.
+
+        Args:
+            query: Query text
+            k: Number of results to return
+            ranges: Row ranges the search is restricted to, or None for all rows
+            statistics: Summed statistics of several indexes to score with, or None for this index's own
+
+        Returns:
+            List of (score, row) pairs, best first
+        """
+        n_rows = len(self.lengths)
+        if not n_rows:
+            return []
+
+        average_length = self.average_length
+        if statistics is not None:
+            n_rows = statistics["rows"]
+            average_length = statistics["total_length"] / n_rows if n_rows else 0.0
+
+        if ranges is not None:
+            ranges = np.array(sorted(ranges), dtype=np.int64).reshape(-1, 2)
+
+        term_rows, term_scores = [], []
+        for term in set(tokenize(query)):
+            if term not in self.vocabulary:
+                continue
+            rows, frequencies = self._postings(term, ranges)
+            if not len(rows):
+                continue
+            frequencies = frequencies.astype(np.float32)
+            df = self._document_frequency(term)
+            if statistics is not None:
+                df = statistics["df"].get(term, df)
+
+            idf = np.log(1.0 + (n_rows - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * np.asarray(self.lengths[rows]) / average_length)
+            term_rows.append(rows)
+            term_scores.append(idf * frequencies * (BM25_K1 + 1.0) / (frequencies + norm))
+
+        if not term_rows:
+            return []
+        rows, inverse = np.unique(np.concatenate(term_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(term_scores))
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(float(scores[i]), int(rows[i])) for i in top]
+
+    def exact_matches(self, query: str, hits: List[Tuple[float, int]], get_text: Callable[[int], str],
+                      statistics: Optional[Dict[str, Any]] = None) -> List[Tuple[float, int]]:
+        """
+        Keep the hits whose chunk contains the query terms as a phrase.
+
+        Only short queries whose terms are all indexed qualify, and only when
+        they name something specific: an identifier-like token (with a digit,
+        an underscore, a dot or an inner capital, as in "3.2", "max_len" or
+        "softMax") or a term in at most LEXICAL_FAST_PATH_MAX_DF_FRACTION of
+        the chunks. Questions made of common words, such as "what is a
+        derivative", always go through vector search.
+
+        Args:
+            query: Query text
+            hits: Lexical hits as returned by search
+            get_text: Callable returning the text of a chunk row
+            statistics: Summed statistics of several indexes to judge rarity with, or None for this index's own
+
+        Returns:
+            The exact-match hits, in the order given
+        """
+        terms = tokenize(query)
+        if not terms or len(terms) > LEXICAL_FAST_PATH_MAX_TERMS:
+            return []
+        if any(term not in self.vocabulary for term in terms):
+            return []
+        if not any(IDENTIFIER_PATTERN.search(token) for token in TOKEN_PATTERN.findall(query)):
+            n_rows = statistics["rows"] if statistics is not None else len(self.lengths)
+            frequencies = [statistics["df"].get(term, 0) if statistics is not None else self._document_frequency(term)
+                           for term in terms]
+            if min(frequencies) > LEXICAL_FAST_PATH_MAX_DF_FRACTION * n_rows:
+                return []
+
+        phrase = f" {' '.join(terms)} "
+        return [(score, row) for score, row in hits if phrase in f" {' '.join(tokenize(get_text(row)))} "]
+
+
+def fuse_rankings(rankings: List[List[int]], k: int, rrf_k: int = HYBRID_RRF_K) -> List[Tuple[float, int]]:
+    """
+    Combine ranked lists of rows with reciprocal rank fusion.
+
+    Args:
+        rankings: Lists of rows, best first
+        k: Number of results to return
+        rrf_k: Rank offset damping the weight of the top ranks
+
+    Returns:
+        List of (fused score, row) pairs, best first
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+    ranked = sorted(scores.items(), key=lambda item: -item[1])[:k]
+    return [(score, row) for row, score in ranked]
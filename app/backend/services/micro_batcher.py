@@ -0,0 +1,156 @@
+"""
+Micro-batching of concurrent calls that can share one batched call.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Number of recent requests kept for queue delay percentiles
+_DELAY_SAMPLES = 1000
+
+
+class _Batch:
+    """Items gathered for one batched call during a batching window."""
+
+    def __init__(self, call: Callable[[List[Any]], List[Any]]):
+        self.call = call
+        self.items: List[Any] = []
+        self.requests: List[Tuple[Future, float]] = []
+        self.size = 0
+        self.full = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Gathers concurrent calls sharing a key into one batched call.
+
+    The first request for a key opens a batch and leads it. If no call with
+    that key is running, the batch runs at once, so a lone request never
+    waits. Otherwise it stays open for more requests until the running call
+    finishes, window_ms pass, or max_batch units of work have arrived. The
+    leader then makes one call over all gathered items and hands every
+    caller its own result. Requests run on their callers' threads; no
+    background worker is needed.
+
+    Subclasses add the call they batch and may record their own counters
+    in _record.
+    """
+
+    def __init__(self, window_ms: float, max_batch: int):
+        """
+        Initialize the batcher.
+
+        Args:
+            window_ms: How long a batch stays open for more requests; 0 disables batching
+            max_batch: Units of work that close a batch early
+        """
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.requests = 0
+        self.batches = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self._queue_delays = deque(maxlen=_DELAY_SAMPLES)
+        self._open: Dict[Hashable, _Batch] = {}
+        self._running: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, call: Callable[[List[Any]], List[Any]], item: Any, size: int = 1) -> Any:
+        """
+        Process an item, batched with concurrent items sharing its key.
+
+        Args:
+            key: Identifies items that can share a call
+            call: Callable processing a list of items, returning one result per item
+            item: Item to process
+            size: Units of work of the item, counted against max_batch
+
+        Returns:
+            The result of the item
+        """
+        if self.window_ms <= 0:
+            return call([item])[0]
+
+        future = Future()
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch(call)
+                self._open[key] = batch
+                # Requests arriving while a call runs are the ones worth waiting for
+                busy = self._running.get(key, 0) > 0
+            batch.items.append(item)
+            batch.requests.append((future, time.perf_counter()))
+            batch.size += size
+            if batch.size >= self.max_batch:
+                del self._open[key]
+                batch.full.set()
+
+        if leader:
+            if busy:
+                batch.full.wait(self.window_ms / 1000.0)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+                self._running[key] = self._running.get(key, 0) + 1
+            try:
+                self._run(batch)
+            finally:
+                with self._lock:
+                    self._running[key] -= 1
+                    if not self._running[key]:
+                        del self._running[key]
+                    # The batch gathered during this call can run now
+                    waiting = self._open.get(key)
+                    if waiting is not None:
+                        waiting.full.set()
+
+        return future.result()
+
+    def _run(self, batch: _Batch) -> None:
+        """Make the call of a closed batch and resolve the futures of its requests."""
+        started = time.perf_counter()
+        try:
+            results = batch.call(batch.items)
+        except Exception as e:
+            for future, _ in batch.requests:
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - started
+
+        for (future, _), result in zip(batch.requests, results):
+            future.set_result(result)
+
+        with self._lock:
+            self.requests += len(batch.requests)
+            self.batches += 1
+            bucket = 1 << (len(batch.requests) - 1).bit_length()
+            self.batch_sizes[bucket] = self.batch_sizes.get(bucket, 0) + 1
+            self._queue_delays.extend(started - enqueued for _, enqueued in batch.requests)
+            self._record(batch, elapsed)
+
+    def _record(self, batch: _Batch, elapsed: float) -> None:
+        """Update counters of a subclass after a batch ran; called with the lock held."""
+
+    def _batch_stats(self) -> Dict[str, Any]:
+        """Get the shared counters; called with the lock held."""
+        delays = np.array(self._queue_delays) * 1000 if self._queue_delays else np.zeros(1)
+        return {
+            "window_ms": self.window_ms,
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "batch_size_histogram": {f"<={size}": count for size, count in sorted(self.batch_sizes.items())},
+            "queue_delay_ms_p50": float(np.percentile(delays, 50)),
+            "queue_delay_ms_p95": float(np.percentile(delays, 95))
+        }
@@ -0,0 +1,450 @@
+"""
+Memory-mapped storage for vector indexes and their chunks.
+
+Vectors are kept in a .npy file. Chunk texts are kept in one UTF-8 blob with
+a row offset table, and chunk metadata in dictionary-encoded columns: each
+distinct value is stored once, and an int32 code matrix maps every row to its
+value per key. All arrays are memory-mapped on load, so worker processes share
+the page cache instead of holding private copies and loading does not scale
+with the number of chunks.
+"""
+
+import io
+import os
+import sys
+import json
+import mmap
+import shutil
+from collections.abc import Mapping, Sequence
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+import numpy as np
+import faiss
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.backend.services.index_factory import read_index, wrap_for_search
+
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+VECTORS_FILE = "vectors.npy"
+CHUNK_TEXT_FILE = "chunks.txt"
+OFFSETS_FILE = "chunks.offsets.npy"
+METADATA_CODES_FILE = "chunks.metadata.npy"
+METADATA_VALUES_FILE = "chunks.metadata.json"
+# Chunk files written before metadata columns were introduced
+LEGACY_CHUNKS_FILE = "chunks.jsonl"
+INDEX_INFO_FILE = "index_info.json"
+
+
+def _atomic_save_array(path: str, array: np.ndarray) -> None:
+    """Save a numpy array through a temporary file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def append_array(path: str, rows: np.ndarray, keep_rows: int) -> None:
+    """
+    Append rows to a saved array in place, after its first keep_rows rows.
+
+    Rows past keep_rows, left by an interrupted append, are overwritten. The
+    header with the new shape is written last, and numpy pads it so the row
+    count can grow without moving the data; arrays whose header would change
+    length, or whose dtype or row shape differ, are rewritten instead.
+
+    Args:
+        path: Path of a .npy file
+        rows: Rows to append
+        keep_rows: Number of existing rows to keep
+    """
+    rows = np.ascontiguousarray(rows)
+    if not os.path.exists(path):
+        _atomic_save_array(path, rows)
+        return
+
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        else:
+            shape, fortran_order, dtype = None, True, None
+        data_offset = f.tell()
+
+        header = io.BytesIO()
+        if shape is not None and not fortran_order and dtype == rows.dtype and tuple(shape[1:]) == rows.shape[1:]:
+            new_shape = (keep_rows + len(rows),) + rows.shape[1:]
+            header_data = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": new_shape}
+            if version == (1, 0):
+                np.lib.format.write_array_header_1_0(header, header_data)
+            else:
+                np.lib.format.write_array_header_2_0(header, header_data)
+
+        if len(header.getvalue()) == data_offset:
+            row_bytes = int(np.prod(rows.shape[1:], dtype=np.int64)) * rows.itemsize
+            f.seek(data_offset + keep_rows * row_bytes)
+            f.write(rows.tobytes())
+            f.truncate()
+            f.flush()
+            f.seek(0)
+            f.write(header.getvalue())
+            return
+
+    existing = np.load(path)[:keep_rows]
+    _atomic_save_array(path, np.concatenate([existing.astype(rows.dtype), rows]))
+
+
+def write_vectors(folder_path: str, vectors: np.ndarray) -> None:
+    """Write a float32 vector matrix to a folder."""
+    _atomic_save_array(os.path.join(folder_path, VECTORS_FILE), np.ascontiguousarray(vectors, dtype=np.float32))
+
+
+def append_vectors(folder_path: str, vectors: np.ndarray, keep_rows: int) -> None:
+    """Append rows to the float32 vector matrix of a folder, after its first keep_rows rows."""
+    append_array(os.path.join(folder_path, VECTORS_FILE), np.ascontiguousarray(vectors, dtype=np.float32), keep_rows)
+
+
+def _encode_metadata(metadata: Dict[str, Any], keys: Dict[str, int], tables: List[Dict[str, int]]) -> Dict[int, int]:
+    """Encode a metadata dictionary as column codes, adding new keys and values to the columns."""
+    row = {}
+    for key, value in metadata.items():
+        column = keys.setdefault(key, len(keys))
+        if column == len(tables):
+            tables.append({})
+        encoded = json.dumps(value, sort_keys=True)
+        row[column] = tables[column].setdefault(encoded, len(tables[column]))
+    return row
+
+
+def _code_matrix(rows: List[Dict[int, int]], n_columns: int) -> np.ndarray:
+    """Build the metadata code matrix of encoded rows; -1 marks a missing key."""
+    codes = np.full((len(rows), n_columns), -1, dtype=np.int32)
+    for i, row in enumerate(rows):
+        for column, code in row.items():
+            codes[i, column] = code
+    return codes
+
+
+def _write_metadata_values(folder_path: str, keys: Dict[str, int], tables: List[Dict[str, int]]) -> None:
+    """Write the keys and distinct values of the metadata columns."""
+    values_path = os.path.join(folder_path, METADATA_VALUES_FILE)
+    with open(values_path + ".tmp", "w") as f:
+        json.dump({
+            "keys": list(keys),
+            "values": [[json.loads(encoded) for encoded in table] for table in tables]
+        }, f)
+    os.replace(values_path + ".tmp", values_path)
+
+
+def write_chunks(folder_path: str, documents: Iterable[Document]) -> None:
+    """
+    Write chunk texts as one blob with byte offsets, and metadata as encoded columns.
+
+    Args:
+        folder_path: Folder to write to
+        documents: Chunks in row order
+    """
+    text_path = os.path.join(folder_path, CHUNK_TEXT_FILE)
+    tmp_path = text_path + ".tmp"
+    offsets = [0]
+    keys: Dict[str, int] = {}
+    tables: List[Dict[str, int]] = []
+    rows: List[Dict[int, int]] = []
+
+    with open(tmp_path, "wb") as f:
+        for doc in documents:
+            data = doc.page_content.encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+            rows.append(_encode_metadata(doc.metadata, keys, tables))
+
+    os.replace(tmp_path, text_path)
+    _atomic_save_array(os.path.join(folder_path, METADATA_CODES_FILE), _code_matrix(rows, len(keys)))
+    _write_metadata_values(folder_path, keys, tables)
+    # The offsets are written last; has_mmap_files checks for them
+    _atomic_save_array(os.path.join(folder_path, OFFSETS_FILE), np.array(offsets, dtype=np.int64))
+
+    legacy_path = os.path.join(folder_path, LEGACY_CHUNKS_FILE)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+def append_chunks(folder_path: str, documents: Iterable[Document], keep_rows: int) -> None:
+    """
+    Append chunks to the chunk files of a folder, after its first keep_rows rows.
+
+    Texts are appended to the blob and rows to the offset table and code
+    matrix in place; only the distinct metadata values are rewritten, and the
+    code matrix when a new metadata key appears. Chunk files in the legacy
+    format are rewritten in the current one.
+
+    Args:
+        folder_path: Folder to write to
+        documents: Chunks in row order, starting at row keep_rows
+    """
+    text_path = os.path.join(folder_path, CHUNK_TEXT_FILE)
+    if not os.path.exists(text_path):
+        existing = LazyChunkList(folder_path)
+        write_chunks(folder_path, [existing[row] for row in range(keep_rows)] + list(documents))
+        return
+
+    offsets_path = os.path.join(folder_path, OFFSETS_FILE)
+    codes_path = os.path.join(folder_path, METADATA_CODES_FILE)
+    position = int(np.load(offsets_path, mmap_mode="r")[keep_rows])
+    with open(os.path.join(folder_path, METADATA_VALUES_FILE), "r") as f:
+        columns = json.load(f)
+    keys = {key: column for column, key in enumerate(columns["keys"])}
+    tables = [
+        {json.dumps(value, sort_keys=True): code for code, value in enumerate(values)}
+        for values in columns["values"]
+    ]
+    n_columns = len(keys)
+
+    offsets = []
+    rows = []
+    with open(text_path, "r+b") as f:
+        f.seek(position)
+        for doc in documents:
+            data = doc.page_content.encode("utf-8")
+            f.write(data)
+            position += len(data)
+            offsets.append(position)
+            rows.append(_encode_metadata(doc.metadata, keys, tables))
+        f.truncate()
+
+    codes = _code_matrix(rows, len(keys))
+    if len(keys) == n_columns:
+        append_array(codes_path, codes, keep_rows)
+    else:
+        # A new metadata key adds a column to every row
+        existing = np.load(codes_path)[:keep_rows]
+        padding = np.full((len(existing), len(keys) - n_columns), -1, dtype=np.int32)
+        _atomic_save_array(codes_path, np.concatenate([np.hstack([existing, padding]), codes]))
+    _write_metadata_values(folder_path, keys, tables)
+    # The offsets are written last, as by write_chunks
+    append_array(offsets_path, np.array(offsets, dtype=np.int64), keep_rows + 1)
+
+
+def link_or_copy(source_path: str, target_path: str) -> None:
+    """Hard-link a file, or copy it where the filesystem does not allow links."""
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copy2(source_path, target_path)
+
+
+def has_mmap_files(folder_path: str) -> bool:
+    """Check whether a folder holds memory-mappable vectors and chunks."""
+    def exists(name):
+        return os.path.exists(os.path.join(folder_path, name))
+
+    chunk_files = (CHUNK_TEXT_FILE, METADATA_CODES_FILE, METADATA_VALUES_FILE)
+    return exists(VECTORS_FILE) and exists(OFFSETS_FILE) and (all(map(exists, chunk_files)) or exists(LEGACY_CHUNKS_FILE))
+
+
+def load_vectors(folder_path: str, mmap_mode: Optional[str] = "r") -> np.ndarray:
+    """Load the vector matrix of a folder, memory-mapped by default."""
+    return np.load(os.path.join(folder_path, VECTORS_FILE), mmap_mode=mmap_mode)
+
+
+class LazyChunkList(Sequence):
+    """
+    Read-only sequence of chunks decoded from memory-mapped chunk files on access.
+
+    Texts are sliced out of the mapped blob and metadata is assembled from the
+    mapped code matrix, so opening the list reads no chunk data.
+    """
+
+    def __init__(self, folder_path: str):
+        self.offsets = np.load(os.path.join(folder_path, OFFSETS_FILE), mmap_mode="r")
+        self._buffer = None
+        self._legacy = not os.path.exists(os.path.join(folder_path, CHUNK_TEXT_FILE))
+
+        if self._legacy:
+            self.keys, self.values, self.codes = [], [], None
+        else:
+            with open(os.path.join(folder_path, METADATA_VALUES_FILE), "r") as f:
+                columns = json.load(f)
+            self.keys = columns["keys"]
+            self.values = columns["values"]
+            self.codes = np.load(os.path.join(folder_path, METADATA_CODES_FILE), mmap_mode="r")
+
+        if self.offsets[-1] > 0:
+            name = LEGACY_CHUNKS_FILE if self._legacy else CHUNK_TEXT_FILE
+            with open(os.path.join(folder_path, name), "rb") as f:
+                self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def resident_bytes(self) -> int:
+        """Size of the mapped chunk text, offsets and metadata codes."""
+        size = self.offsets.nbytes + (len(self._buffer) if self._buffer is not None else 0)
+        return size + (self.codes.nbytes if self.codes is not None else 0)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+
+        data = self._buffer[int(self.offsets[row]):int(self.offsets[row + 1])] if self._buffer else b""
+        if self._legacy:
+            data = json.loads(data)
+            return Document(page_content=data["page_content"], metadata=data["metadata"])
+
+        metadata = {
+            key: self.values[column][code]
+            for column, (key, code) in enumerate(zip(self.keys, self.codes[row].tolist()))
+            if code >= 0
+        }
+        return Document(page_content=data.decode("utf-8"), metadata=metadata)
+
+
+class LazyDocstore(Docstore):
+    """Docstore over a LazyChunkList, addressed by row number."""
+
+    def __init__(self, chunks: LazyChunkList):
+        self.chunks = chunks
+
+    def search(self, search: str):
+        try:
+            return self.chunks[int(search)]
+        except (ValueError, IndexError):
+            return f"ID {search} not found."
+
+
+class RowIdMap(Mapping):
+    """Identity mapping from index row to docstore id, without a per-row dictionary."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __getitem__(self, row: int) -> str:
+        if not 0 <= row < self.size:
+            raise KeyError(row)
+        return str(row)
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class MmapFlatIndex:
+    """
+    Exact L2 index searching a memory-mapped vector matrix.
+
+    Implements the subset of the FAISS index interface used by the vector
+    store: d, ntotal, search and reconstruct_n. Distances match IndexFlatL2.
+    """
+
+    metric_type = faiss.METRIC_L2
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+
+    def search(self, x: np.ndarray, k: int, params=None) -> Tuple[np.ndarray, np.ndarray]:
+        if params is not None:
+            raise ValueError("Search parameters are not supported by MmapFlatIndex")
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        if self.ntotal == 0:
+            return np.full((len(x), k), np.inf, dtype=np.float32), np.full((len(x), k), -1, dtype=np.int64)
+        return faiss.knn(x, self.vectors, k)
+
+    def search_range(self, x: np.ndarray, k: int, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Search only rows [start, end); returned labels are absolute rows."""
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        distances, labels = faiss.knn(x, self.vectors[start:end], min(k, end - start))
+        return distances, np.where(labels >= 0, labels + start, -1)
+
+    def reconstruct(self, row: int) -> np.ndarray:
+        return np.array(self.vectors[row])
+
+    def reconstruct_n(self, start: int, n: int) -> np.ndarray:
+        return np.array(self.vectors[start:start + n])
+
+    @property
+    def resident_bytes(self) -> int:
+        """Memory private to this process; the vectors themselves live in the shared page cache."""
+        return self.ntotal * 16
+
+
+def write_index_info(folder_path: str, info: Dict[str, Any]) -> None:
+    """Record how the index in a folder was built."""
+    tmp_path = os.path.join(folder_path, INDEX_INFO_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp_path, os.path.join(folder_path, INDEX_INFO_FILE))
+
+
+def read_index_info(folder_path: str) -> Dict[str, Any]:
+    """Read how the index in a folder was built; empty for indexes saved without it."""
+    try:
+        with open(os.path.join(folder_path, INDEX_INFO_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_mmap_files(folder_path: str, vectors: np.ndarray, chunks: Iterable[Document]) -> None:
+    """
+    Write the original vectors and chunks of an index in memory-mappable form.
+
+    Args:
+        folder_path: Folder of the saved index
+        vectors: float32 matrix with one row per chunk
+        chunks: Chunks aligned with the vector rows
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    write_chunks(folder_path, chunks)
+    write_vectors(folder_path, vectors)
+
+
+def save_index(folder_path: str, index) -> None:
+    """Write a raw FAISS index to the index.faiss file of a folder."""
+    path = os.path.join(folder_path, "index.faiss")
+    faiss.write_index(getattr(index, "index", index), path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def load_mmap_vectorstore(folder_path: str, embedding_model, mmap_vectors: bool = True) -> Optional[FAISS]:
+    """
+    Load a vector store whose chunks are memory-mapped from disk.
+
+    With mmap_vectors, unquantized flat indexes are searched directly over the
+    mapped vectors and IVF indexes are read with their inverted lists
+    memory-mapped; otherwise the FAISS index is read into memory.
+    Scalar-quantized indexes are re-ranked against the mapped vectors.
+
+    Args:
+        folder_path: Folder of the saved index
+        embedding_model: Embedding model used to embed queries
+        mmap_vectors: Map the vectors from disk instead of reading the index into memory
+
+    Returns:
+        FAISS vector store, or None if the folder has no memory-mappable files
+    """
+    if not has_mmap_files(folder_path):
+        return None
+
+    info = read_index_info(folder_path)
+    vectors = load_vectors(folder_path)
+    if mmap_vectors and info.get("index_type", "flat") == "flat" and info.get("quantization", "none") == "none":
+        index = MmapFlatIndex(vectors)
+    else:
+        index = wrap_for_search(read_index(os.path.join(folder_path, "index.faiss"), mmap=mmap_vectors), vectors)
+
+    chunks = LazyChunkList(folder_path)
+    return FAISS(embedding_model, index, LazyDocstore(chunks), RowIdMap(len(chunks)))
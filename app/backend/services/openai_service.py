@@ -12,6 +12,7 @@ from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_excep
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from app.config.settings import OPENAI_API_KEY, LLM_MODEL, LLM_VISION_MODEL, EMBEDDING_MODEL, MAX_TOKENS, TEMPERATURE
+from app.backend.services.embedding_cache import get_embedding_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -93,6 +94,8 @@ def get_embeddings(text: str, model: str = EMBEDDING_MODEL) -> List[float]:
     """
     Get embeddings for a text string with retry logic.
     
+    Identical text embedded with the same model is served from the embedding cache.
+    
     Args:
         text: Text to embed
         model: Embedding model to use
@@ -105,6 +108,11 @@ def get_embeddings(text: str, model: str = EMBEDDING_MODEL) -> List[float]:
         return []
     
     try:
+        cache = get_embedding_cache()
+        cached = cache.get_many(model, [text])[0]
+        if cached is not None:
+            return cached
+        
         def make_api_call():
             return client.embeddings.create(
                 model=model,
@@ -113,7 +121,9 @@ def get_embeddings(text: str, model: str = EMBEDDING_MODEL) -> List[float]:
         
         # Make API call with retry logic
         response = api_call_with_retry(make_api_call)
-        return response.data[0].embedding
+        embedding = response.data[0].embedding
+        cache.put_many(model, [text], [embedding])
+        return embedding
     
     except Exception as e:
         logger.error(f"Error getting embeddings: {str(e)}")
@@ -0,0 +1,456 @@
+"""
+Corpus index partitioned across shards, searched by scatter-gather.
+
+Documents are assigned to shards by a stable hash of their id, so a
+document's chunks and row range live in exactly one shard. Every shard is a
+CorpusIndex in its own directory; it runs either in this process or in a
+worker process of its own. Searches fan out in parallel to the shards
+holding the selected documents and their candidates are merged into a
+global top k.
+"""
+
+import os
+import sys
+import hashlib
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import (
+    CORPUS_INDEX_DIR, CORPUS_SHARDS, CORPUS_SHARD_MODE, CORPUS_SHARD_WORKER_THREADS, VECTORSTORE_LOAD_MODE,
+    HYBRID_SEARCH, HYBRID_CANDIDATE_FACTOR, CONTEXT_FETCH_FACTOR
+)
+from app.backend.services.corpus_index import CorpusIndex
+from app.backend.services.lexical_index import fuse_rankings
+from app.backend.services.context_selector import select_chunks
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+SHARD_MODES = ("thread", "process")
+
+# Held by the process serving a shard from worker processes, one per host
+SHARD_LOCK_FILE = "worker.lock"
+
+# Rows of different shards are told apart by adding the shard number times this offset
+_SHARD_ROW_OFFSET = 1 << 40
+
+
+def _serve_shard(index_dir: str, load_mode: str, conn, threads: int) -> None:
+    """
+    Answer corpus index calls received over a pipe until it is closed.
+
+    Calls carry a request id and run on a pool of threads, so a slow call
+    does not hold up the others; answers are sent back tagged with their
+    request id as they complete.
+    """
+    index = CorpusIndex(index_dir, load_mode)
+    send_lock = threading.Lock()
+
+    def answer(request_id, method, args, kwargs):
+        try:
+            reply = (request_id, True, getattr(index, method)(*args, **kwargs))
+        except Exception as e:
+            reply = (request_id, False, f"{type(e).__name__}: {str(e)}")
+        with send_lock:
+            conn.send(reply)
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="shard-worker") as executor:
+        while True:
+            try:
+                request_id, method, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            executor.submit(answer, request_id, method, args, kwargs)
+
+
+def _claim_shard(index_dir: str):
+    """
+    Take the host-wide lock of a shard served by a worker process.
+
+    Returns:
+        The open lock file, to keep for the life of the shard, or None if
+        another process on this host already serves the shard
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    lock_file = open(os.path.join(index_dir, SHARD_LOCK_FILE), "w")
+    try:
+        import fcntl
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except ImportError:
+        # Without flock (Windows) the one-server-per-host assumption is not checked
+        pass
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class LocalShard:
+    """Shard served by a CorpusIndex in this process."""
+
+    def __init__(self, index_dir: str, load_mode: str):
+        """
+        Initialize the shard.
+
+        Args:
+            index_dir: Directory of the shard's corpus index
+            load_mode: Load mode of the shard's corpus index
+        """
+        self.index = CorpusIndex(index_dir, load_mode)
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        """Call a method of the shard's corpus index."""
+        return getattr(self.index, method)(*args, **kwargs)
+
+
+class ProcessShard:
+    """
+    Shard served by a CorpusIndex in a worker process.
+
+    The worker is started on first use and restarted if it has exited.
+    Calls are pickled over a pipe tagged with a request id, so concurrent
+    calls share the pipe: a reader thread hands each answer to the caller
+    waiting for it, and the worker runs up to CORPUS_SHARD_WORKER_THREADS
+    calls at once.
+
+    Worker processes are meant to exist once per host: every process serving
+    the API with CORPUS_SHARD_MODE=process starts its own set, each holding
+    the whole corpus. The first process to start a shard's worker takes a
+    lock on the shard directory; later ones print a warning that memory is
+    duplicated, so run a single API server process in this mode.
+    """
+
+    def __init__(self, index_dir: str, load_mode: str, threads: int = CORPUS_SHARD_WORKER_THREADS):
+        """
+        Initialize the shard.
+
+        Args:
+            index_dir: Directory of the shard's corpus index
+            load_mode: Load mode of the shard's corpus index
+            threads: Number of calls the worker process runs at once
+        """
+        self.index_dir = index_dir
+        self.load_mode = load_mode
+        self.threads = threads
+        self._process = None
+        self._conn = None
+        self._pending: Dict[int, Future] = {}
+        self._request_ids = itertools.count()
+        self._host_lock = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        """Start the worker process and the thread reading its answers."""
+        if self._host_lock is None:
+            self._host_lock = _claim_shard(self.index_dir)
+            if self._host_lock is None:
+                print(f"Another process on this host already serves shard {self.index_dir}; "
+                      f"its index is now held in memory twice. Run one API server process with "
+                      f"CORPUS_SHARD_MODE=process")
+
+        # Spawned rather than forked, so the worker does not inherit FAISS or HTTP client threads
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_serve_shard, args=(self.index_dir, self.load_mode, child_conn, self.threads), daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self._pending = {}
+        threading.Thread(
+            target=self._read_answers, args=(parent_conn, self._pending), daemon=True, name="shard-reader"
+        ).start()
+
+    def _read_answers(self, conn, pending: Dict[int, Future]) -> None:
+        """Resolve the futures of calls as their answers arrive, failing the rest once the worker exits."""
+        while True:
+            try:
+                request_id, ok, result = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = pending.pop(request_id, None)
+            if future is not None:
+                future.set_result((ok, result))
+
+        with self._lock:
+            futures = list(pending.values())
+            pending.clear()
+        for future in futures:
+            future.set_result((False, "shard worker exited"))
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        """Call a method of the shard's corpus index in the worker process."""
+        future = Future()
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                if self._process is not None:
+                    print(f"Shard worker for {self.index_dir} exited; restarting it")
+                self._start()
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+            try:
+                self._conn.send((request_id, method, args, kwargs))
+            except Exception:
+                self._pending.pop(request_id, None)
+                raise
+        ok, result = future.result()
+        if not ok:
+            raise RuntimeError(f"Shard {self.index_dir} failed in {method}: {result}")
+        return result
+
+
+class ShardedCorpusIndex:
+    """
+    Corpus index whose documents are partitioned across CORPUS_SHARDS shards.
+
+    Offers the search and maintenance methods of CorpusIndex, so retrievers
+    and services use either interchangeably. Vector candidates of all shards
+    are merged by distance, which is comparable across shards as they hold
+    vectors of the same embedding backend. BM25 candidates are scored with
+    the summed collection statistics of all shards, so their scores are
+    those of one unsharded index, and the two global rankings are fused as
+    in CorpusIndex.
+    Changing the number of shards reassigns documents; they are then added
+    again from their own vector stores, like documents never indexed.
+    """
+
+    def __init__(self, index_dir: str = CORPUS_INDEX_DIR, shards: int = CORPUS_SHARDS,
+                 mode: str = CORPUS_SHARD_MODE, load_mode: str = VECTORSTORE_LOAD_MODE):
+        """
+        Initialize the sharded corpus index.
+
+        Args:
+            index_dir: Directory holding one subdirectory per shard
+            shards: Number of shards
+            mode: One of SHARD_MODES
+            load_mode: Load mode of every shard's corpus index
+        """
+        if mode not in SHARD_MODES:
+            print(f"Unknown corpus shard mode: {mode}, using thread")
+            mode = "thread"
+
+        shard_class = ProcessShard if mode == "process" else LocalShard
+        self.index_dir = str(index_dir)
+        self.mode = mode
+        self.shards = [
+            shard_class(os.path.join(self.index_dir, f"shard-{number:02d}"), load_mode)
+            for number in range(shards)
+        ]
+        self._executor = ThreadPoolExecutor(max_workers=shards, thread_name_prefix="corpus-shard")
+
+    def shard_of(self, document_id: str) -> int:
+        """Get the number of the shard holding a document."""
+        digest = hashlib.blake2b(document_id.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % len(self.shards)
+
+    def _scatter(self, method: str, document_ids: List[str], *args, **kwargs) -> List[Tuple[int, Any]]:
+        """
+        Call a search method in parallel on the shards holding the given documents.
+
+        Each shard receives only its own documents as the document_ids argument.
+
+        Returns:
+            List of (shard number, result) pairs
+        """
+        by_shard: Dict[int, List[str]] = {}
+        for document_id in document_ids:
+            by_shard.setdefault(self.shard_of(document_id), []).append(document_id)
+
+        futures = [
+            (number, self._executor.submit(self.shards[number].call, method, *args, document_ids=ids, **kwargs))
+            for number, ids in by_shard.items()
+        ]
+        return [(number, future.result()) for number, future in futures]
+
+    def _broadcast(self, method: str, *args) -> List[Any]:
+        """Call a method in parallel on every shard."""
+        futures = [self._executor.submit(shard.call, method, *args) for shard in self.shards]
+        return [future.result() for future in futures]
+
+    def has_document(self, document_id: str) -> bool:
+        """Check whether a document's chunks are in the corpus index."""
+        return self.shards[self.shard_of(document_id)].call("has_document", document_id)
+
+    def add_document(self, document_id: str, vectors: np.ndarray, chunks) -> int:
+        """
+        Add (or replace) a document's chunks in its shard.
+
+        Args:
+            document_id: ID of the document
+            vectors: The document's original vectors, one row per chunk
+            chunks: The document's chunks aligned with the vector rows
+
+        Returns:
+            Number of chunks added
+        """
+        return self.shards[self.shard_of(document_id)].call(
+            "add_document", document_id, np.ascontiguousarray(vectors, dtype=np.float32), list(chunks)
+        )
+
+    def remove_document(self, document_id: str) -> bool:
+        """
+        Remove a document's chunks from its shard.
+
+        Args:
+            document_id: ID of the document
+
+        Returns:
+            True if the document was indexed, False otherwise
+        """
+        return self.shards[self.shard_of(document_id)].call("remove_document", document_id)
+
+    def compact(self) -> bool:
+        """
+        Compact every shard that has tombstoned rows.
+
+        Returns:
+            True if any shard was compacted, False otherwise
+        """
+        return any(self._broadcast("compact"))
+
+    def search(self, query_vector: List[float], document_ids: List[str], k: int = 5) -> List[Tuple[Document, float]]:
+        """
+        Search the chunks of the selected documents across shards.
+
+        Args:
+            query_vector: Embedded query
+            document_ids: Documents the search is restricted to
+            k: Number of results to return
+
+        Returns:
+            List of (chunk, L2 distance) pairs, closest first
+        """
+        results = [hit for _, hits in self._scatter("search", document_ids, query_vector, k=k) for hit in hits]
+        return sorted(results, key=lambda hit: hit[1])[:k]
+
+    def _gather(self, phase: List[Tuple[int, Dict[str, list]]], kind: str,
+                reverse: bool) -> List[Tuple[float, int, Document, np.ndarray]]:
+        """Merge one kind of shard candidates into a global ranking keyed by shard-qualified rows."""
+        merged = [
+            (score, number * _SHARD_ROW_OFFSET + row, chunk, vector)
+            for number, candidates in phase
+            for score, row, chunk, vector in candidates[kind]
+        ]
+        return sorted(merged, key=lambda hit: hit[0], reverse=reverse)
+
+    def _hybrid_candidates(self, query: str, embedding_model: Embeddings, document_ids: List[str],
+                           k: int) -> List[Tuple[float, int, Document, np.ndarray]]:
+        """Global hybrid ranking of (score, row, chunk, vector) candidates, higher scores first."""
+        candidates = k * HYBRID_CANDIDATE_FACTOR
+        lexical = []
+        if HYBRID_SEARCH:
+            # BM25 is scored with the statistics of all shards, as if they were one index
+            statistics = {"rows": 0, "total_length": 0, "df": {}}
+            for shard_statistics in self._broadcast("lexical_statistics", query):
+                statistics["rows"] += shard_statistics["rows"]
+                statistics["total_length"] += shard_statistics["total_length"]
+                for term, df in shard_statistics["df"].items():
+                    statistics["df"][term] = statistics["df"].get(term, 0) + df
+
+            lexical_phase = self._scatter(
+                "candidates", document_ids, query, None, k=candidates, statistics=statistics
+            )
+            exact = self._gather(lexical_phase, "exact", reverse=True)
+            if exact:
+                return exact[:k]
+            lexical = self._gather(lexical_phase, "lexical", reverse=True)[:candidates]
+
+        # The query is embedded once, however many shards are searched
+        query_vector = embedding_model.embed_query(query)
+        vector_phase = self._scatter("candidates", document_ids, query, query_vector, k=candidates)
+        vector = self._gather(vector_phase, "vector", reverse=False)[:candidates]
+        if not HYBRID_SEARCH:
+            return [(-distance, row, chunk, vec) for distance, row, chunk, vec in vector[:k]]
+
+        by_row = {row: (chunk, vec) for _, row, chunk, vec in lexical + vector}
+        fused = fuse_rankings([[row for _, row, _, _ in vector], [row for _, row, _, _ in lexical]], k)
+        return [(score, row, *by_row[row]) for score, row in fused]
+
+    def hybrid_search(self, query: str, embedding_model: Embeddings, document_ids: List[str],
+                      k: int = 5) -> List[Tuple[Document, float]]:
+        """
+        Search the chunks of the selected documents by BM25 and vector similarity across shards.
+
+        Args:
+            query: Query text
+            embedding_model: Embedding model used to embed the query
+            document_ids: Documents the search is restricted to
+            k: Number of results to return
+
+        Returns:
+            List of (chunk, score) pairs, best first
+        """
+        if not HYBRID_SEARCH:
+            return self.search(embedding_model.embed_query(query), document_ids, k)
+        hits = self._hybrid_candidates(query, embedding_model, document_ids, k)
+        return [(chunk, float(score)) for score, _, chunk, _ in hits]
+
+    def select_context(self, query: str, embedding_model: Embeddings, document_ids: List[str],
+                       k: int = 5) -> Tuple[List[Document], Dict[str, Any]]:
+        """
+        Retrieve the chunks to put into a prompt, without near-duplicates, across shards.
+
+        Args:
+            query: Query text
+            embedding_model: Embedding model used to embed the query
+            document_ids: Documents the search is restricted to
+            k: Number of chunks to pick
+
+        Returns:
+            Tuple of the context chunks, best first, and a context token report
+        """
+        hits = self._hybrid_candidates(query, embedding_model, document_ids, k * CONTEXT_FETCH_FACTOR)
+        vectors = np.stack([vector for _, _, _, vector in hits]) if hits else None
+        return select_chunks([(score, row, chunk) for score, row, chunk, _ in hits], vectors, k)
+
+    def warm(self, document_ids: List[str]) -> int:
+        """
+        Load the shards holding the given documents and page in their rows.
+
+        Args:
+            document_ids: Documents to warm
+
+        Returns:
+            Number of rows warmed
+        """
+        return sum(rows for _, rows in self._scatter("warm", document_ids))
+
+    def get_vectors(self, max_rows: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Get the stored vectors of live chunks, shard after shard.
+
+        Args:
+            max_rows: Return a random sample of at most this many rows, or None for all of them
+
+        Returns:
+            Vector matrix, or None if no shard has vectors
+        """
+        shard_rows = -(-max_rows // len(self.shards)) if max_rows is not None else None
+        vectors = [np.asarray(v) for v in self._broadcast("get_vectors", shard_rows) if v is not None and len(v)]
+        if not vectors:
+            return None
+        vectors = np.concatenate(vectors)
+        if max_rows is not None and len(vectors) > max_rows:
+            vectors = vectors[np.sort(np.random.default_rng(0).choice(len(vectors), size=max_rows, replace=False))]
+        return vectors
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of indexed documents and chunks, in total and per shard."""
+        shard_stats = self._broadcast("stats")
+        return {
+            "documents": sum(stats["documents"] for stats in shard_stats),
+            "chunks": sum(stats["chunks"] for stats in shard_stats),
+            "dead_chunks": sum(stats["dead_chunks"] for stats in shard_stats),
+            "shard_mode": self.mode,
+            "shards": shard_stats
+        }
@@ -0,0 +1,168 @@
+"""
+Process-wide LRU cache of loaded per-document vector stores.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import VECTORSTORE_CACHE_MAX_BYTES, VECTORSTORE_CACHE_REVALIDATE_SECONDS
+from app.backend.services.index_factory import get_index_bytes
+
+
+def get_index_mtime(index_path: str) -> Optional[float]:
+    """Get the modification time of a saved index, or None if it does not exist."""
+    try:
+        return os.path.getmtime(os.path.join(index_path, "index.faiss"))
+    except OSError:
+        return None
+
+
+def get_resident_bytes(vectorstore) -> int:
+    """
+    Measure the memory a loaded vector store occupies, from its loaded objects.
+
+    Counts the FAISS index, the original vectors, the chunk text and metadata
+    codes and the lexical index arrays. Memory-mapped arrays count in full,
+    as the pages of a store in use stay resident.
+    """
+    size = get_index_bytes(vectorstore.index)
+    vectors = getattr(vectorstore, "stored_vectors", None)
+    if vectors is not None:
+        size += vectors.nbytes
+    chunks = getattr(vectorstore.docstore, "chunks", None)
+    if chunks is not None:
+        size += chunks.resident_bytes
+    lexical_index = getattr(vectorstore, "lexical_index", None)
+    if lexical_index is not None:
+        size += lexical_index.postings.nbytes + lexical_index.frequencies.nbytes + lexical_index.lengths.nbytes
+    return size
+
+
+class VectorStoreCache:
+    """
+    LRU cache of loaded vector stores, keyed by document id.
+
+    A hit is served from memory without touching the disk. A document's
+    store is dropped explicitly when this process rewrites or deletes its
+    index (generate_embeddings, link_embeddings_from, delete_document).
+    Indexes rewritten by other worker processes are noticed by the mtime of
+    the index file, checked at most every revalidate_seconds per store.
+    Least recently used stores are evicted once the resident size of all
+    cached stores, measured from the loaded objects, exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = VECTORSTORE_CACHE_MAX_BYTES,
+                 revalidate_seconds: float = VECTORSTORE_CACHE_REVALIDATE_SECONDS):
+        """
+        Initialize the vector store cache.
+
+        Args:
+            max_bytes: Memory budget for cached stores in bytes
+            revalidate_seconds: How long a store is served before its index mtime is checked again
+        """
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resident_bytes = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, document_id: str, index_path: str, loader: Callable[[], Any]) -> Any:
+        """
+        Get the vector store of a document, loading it on a miss.
+
+        Args:
+            document_id: ID of the document
+            index_path: Directory of the saved index
+            loader: Callable loading the store from disk
+
+        Returns:
+            The loaded vector store, or None if it could not be loaded
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(document_id)
+            if entry and now - entry["checked_at"] < self.revalidate_seconds:
+                self._entries.move_to_end(document_id)
+                self.hits += 1
+                return entry["vectorstore"]
+
+        mtime = get_index_mtime(index_path)
+        if mtime is None:
+            self.invalidate(document_id)
+            return None
+
+        with self._lock:
+            if entry and entry["mtime"] == mtime and self._entries.get(document_id) is entry:
+                entry["checked_at"] = now
+                self._entries.move_to_end(document_id)
+                self.hits += 1
+                return entry["vectorstore"]
+            self.misses += 1
+
+        vectorstore = loader()
+        if vectorstore is None:
+            return None
+
+        size = get_resident_bytes(vectorstore)
+        with self._lock:
+            self._remove(document_id)
+            self._entries[document_id] = {"vectorstore": vectorstore, "mtime": mtime, "checked_at": now, "size": size}
+            self.resident_bytes += size
+            self._evict()
+
+        return vectorstore
+
+    def invalidate(self, document_id: str) -> None:
+        """Drop a document's store from the cache."""
+        with self._lock:
+            self._remove(document_id)
+
+    def _remove(self, document_id: str) -> None:
+        entry = self._entries.pop(document_id, None)
+        if entry:
+            self.resident_bytes -= entry["size"]
+
+    def _evict(self) -> None:
+        """Evict least recently used stores until the budget is met, keeping the newest."""
+        while self.resident_bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self.resident_bytes -= entry["size"]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Dictionary with hits, misses, evictions, hit rate, entry count and resident size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+# Create a singleton instance of VectorStoreCache
+_vectorstore_cache = VectorStoreCache()
+
+
+def get_vectorstore_cache() -> VectorStoreCache:
+    """Get the process-wide vector store cache."""
+    return _vectorstore_cache
@@ -0,0 +1,227 @@
+"""
+Startup warm-up of the document sets used most recently.
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.config.settings import (
+    WARMUP_ENABLED, WARMUP_ACTIVITY_PATH, WARMUP_MAX_SETS, WARMUP_MAX_AGE_DAYS, WARMUP_CONCURRENCY,
+    WARMUP_TIMEOUT_SECONDS
+)
+
+# A worker records the same document set at most once per this many seconds
+RECORD_INTERVAL_SECONDS = 60
+
+
+class ActivityLog:
+    """
+    Record of the document sets used recently, shared by all worker processes.
+
+    Each set is stored with its last use time and use count in a JSON file,
+    updated under a file lock. Only the WARMUP_MAX_SETS most recent sets are
+    kept. Repeated uses within RECORD_INTERVAL_SECONDS are not written again,
+    so busy sessions do not rewrite the file on every turn.
+    """
+
+    def __init__(self, path: str = WARMUP_ACTIVITY_PATH, max_sets: int = WARMUP_MAX_SETS,
+                 max_age_days: int = WARMUP_MAX_AGE_DAYS):
+        """
+        Initialize the activity log.
+
+        Args:
+            path: Path of the JSON file
+            max_sets: Number of document sets kept
+            max_age_days: Sets unused for longer are dropped
+        """
+        self.path = str(path)
+        self.max_sets = max_sets
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self._last_recorded: Dict[str, float] = {}
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, document_ids: List[str]) -> None:
+        """
+        Record a use of a document set.
+
+        Args:
+            document_ids: Documents used together, e.g. by a chat session
+        """
+        if not document_ids:
+            return
+
+        key = ",".join(sorted(set(document_ids)))
+        now = time.time()
+        if now - self._last_recorded.get(key, 0.0) < RECORD_INTERVAL_SECONDS:
+            return
+        self._last_recorded[key] = now
+
+        try:
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    sets = self._read()
+                    entry = sets.get(key, {"document_ids": sorted(set(document_ids)), "count": 0})
+                    entry["count"] += 1
+                    entry["last_used"] = now
+                    sets[key] = entry
+
+                    recent = sorted(
+                        (item for item in sets.items() if now - item[1]["last_used"] <= self.max_age_seconds),
+                        key=lambda item: -item[1]["last_used"]
+                    )[:self.max_sets]
+
+                    tmp_path = self.path + ".tmp"
+                    with open(tmp_path, "w") as f:
+                        json.dump(dict(recent), f)
+                    os.replace(tmp_path, self.path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except OSError as e:
+            print(f"Error recording document set activity: {str(e)}")
+
+    def recent(self) -> List[List[str]]:
+        """
+        Get the recently used document sets, most used first.
+
+        Returns:
+            List of document id lists
+        """
+        now = time.time()
+        sets = [entry for entry in self._read().values() if now - entry["last_used"] <= self.max_age_seconds]
+        sets.sort(key=lambda entry: (-entry["count"], -entry["last_used"]))
+        return [entry["document_ids"] for entry in sets[:self.max_sets]]
+
+
+class WarmupManager:
+    """
+    Preloads the indexes and retrievers of recently used document sets in the background.
+
+    The backend reports ready once every set is warm, or once
+    WARMUP_TIMEOUT_SECONDS have passed; sets still loading at that point
+    finish in the background.
+    """
+
+    def __init__(self, concurrency: int = WARMUP_CONCURRENCY, timeout_seconds: float = WARMUP_TIMEOUT_SECONDS):
+        """
+        Initialize the warm-up manager.
+
+        Args:
+            concurrency: Number of document sets warmed at the same time
+            timeout_seconds: Time after which the backend reports ready regardless
+        """
+        self.concurrency = concurrency
+        self.timeout_seconds = timeout_seconds
+        self.status = "not_started"
+        self.sets_total = 0
+        self.sets_warmed = 0
+        self.sets_failed = 0
+        self.rows_warmed = 0
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start warming recent document sets in a background thread."""
+        with self._lock:
+            if self._started_at is not None:
+                return
+            self._started_at = time.time()
+            self.status = "warming"
+        threading.Thread(target=self._run, name="warmup", daemon=True).start()
+
+    def _run(self) -> None:
+        # Imported here so that recording activity does not load the embedding service
+        from app.backend.services.embedding_service import get_embedding_model, warm_documents
+        from app.backend.services.chunker import count_tokens
+
+        try:
+            document_sets = get_activity_log().recent()
+            self.sets_total = len(document_sets)
+            print(f"Warming {len(document_sets)} recently used document sets")
+
+            # Shared state every first request needs: the embedding client and the tokenizer
+            get_embedding_model()
+            count_tokens("")
+
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency), thread_name_prefix="warmup") as executor:
+                futures = [executor.submit(warm_documents, document_ids) for document_ids in document_sets]
+                for future in as_completed(futures):
+                    try:
+                        rows = future.result()
+                        with self._lock:
+                            self.sets_warmed += 1
+                            self.rows_warmed += rows
+                    except Exception as e:
+                        print(f"Error warming document set: {str(e)}")
+                        with self._lock:
+                            self.sets_failed += 1
+        except Exception as e:
+            print(f"Error during warm-up: {str(e)}")
+
+        with self._lock:
+            self._finished_at = time.time()
+            self.status = "ready"
+        print(f"Warm-up finished in {self._finished_at - self._started_at:.1f}s")
+
+    def is_ready(self) -> bool:
+        """Check whether warm-up finished, timed out or is disabled."""
+        with self._lock:
+            if self._started_at is None:
+                return not WARMUP_ENABLED
+            return self._finished_at is not None or time.time() - self._started_at >= self.timeout_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get warm-up progress.
+
+        Returns:
+            Dictionary with the status, readiness, document set counts and elapsed time
+        """
+        ready = self.is_ready()
+        with self._lock:
+            status = self.status
+            if status == "warming" and ready:
+                status = "timed_out"
+            elapsed = None
+            if self._started_at is not None:
+                elapsed = (self._finished_at or time.time()) - self._started_at
+            return {
+                "status": status,
+                "ready": ready,
+                "sets_total": self.sets_total,
+                "sets_warmed": self.sets_warmed,
+                "sets_failed": self.sets_failed,
+                "rows_warmed": self.rows_warmed,
+                "elapsed_seconds": elapsed
+            }
+
+
+# Create singleton instances of ActivityLog and WarmupManager
+_activity_log = ActivityLog()
+_warmup_manager = WarmupManager()
+
+
+def get_activity_log() -> ActivityLog:
+    """Get the process-wide document set activity log."""
+    return _activity_log
+
+
+def get_warmup_manager() -> WarmupManager:
+    """Get the process-wide warm-up manager."""
+    return _warmup_manager
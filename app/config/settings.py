@@ -11,9 +11,10 @@ DATA_DIR = BASE_DIR / "app" / "data"
 RAW_DATA_DIR = DATA_DIR / "raw"
 PROCESSED_DATA_DIR = DATA_DIR / "processed"
 EMBEDDINGS_DIR = DATA_DIR / "embeddings"
+CORPUS_INDEX_DIR = DATA_DIR / "corpus_index"
 
 # Create directories if they don't exist
-for dir_path in [RAW_DATA_DIR, PROCESSED_DATA_DIR, EMBEDDINGS_DIR]:
+for dir_path in [RAW_DATA_DIR, PROCESSED_DATA_DIR, EMBEDDINGS_DIR, CORPUS_INDEX_DIR]:
     dir_path.mkdir(parents=True, exist_ok=True)
 
 # API Keys and External Services
@@ -26,6 +27,105 @@ EMBEDDING_MODEL = "text-embedding-ada-002"
 MAX_TOKENS = 4096
 TEMPERATURE = 0.2
 
+# Embedding Backend Settings
+# "openai", or "hashing" / "sentence-transformers" to embed on the local CPU
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HASHING_EMBEDDING_DIMENSION = int(os.getenv("HASHING_EMBEDDING_DIMENSION", "768"))
+# Concurrent query embeddings arriving within this window share one API request; 0 disables
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "256"))
+
+# Embedding Cache Settings
+EMBEDDING_CACHE_PATH = DATA_DIR / "embedding_cache.sqlite3"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Keep query embeddings in the embedding cache database so they survive restarts
+QUERY_EMBEDDING_CACHE_PERSIST = os.getenv("QUERY_EMBEDDING_CACHE_PERSIST", "false").lower() == "true"
+
+# Vector Store Cache Settings
+VECTORSTORE_CACHE_MAX_BYTES = int(os.getenv("VECTORSTORE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Cached stores are checked for indexes rewritten by other worker processes at most this often
+VECTORSTORE_CACHE_REVALIDATE_SECONDS = float(os.getenv("VECTORSTORE_CACHE_REVALIDATE_SECONDS", "5"))
+# "memory" reads indexes into each worker, "mmap" maps vectors and chunks from disk
+VECTORSTORE_LOAD_MODE = os.getenv("VECTORSTORE_LOAD_MODE", "memory")
+
+# Vector Index Settings
+# "flat", "hnsw", "ivfpq", or "auto" to promote flat indexes past the threshold
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "auto")
+VECTOR_INDEX_PROMOTION_THRESHOLD = int(os.getenv("VECTOR_INDEX_PROMOTION_THRESHOLD", "50000"))
+VECTOR_INDEX_APPROXIMATE_TYPE = os.getenv("VECTOR_INDEX_APPROXIMATE_TYPE", "hnsw")
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+IVFPQ_M = int(os.getenv("IVFPQ_M", "64"))
+# "none", "fp16" or "int8" scalar quantization of flat and HNSW index vectors
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+# Quantized indexes fetch this many times k candidates for exact re-ranking
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+# The index report builds its indexes over a random sample of at most this many stored vectors
+INDEX_REPORT_MAX_VECTORS = int(os.getenv("INDEX_REPORT_MAX_VECTORS", "20000"))
+
+# Corpus Sharding Settings
+# Documents are partitioned by id across this many corpus index shards; 1 keeps a single index
+CORPUS_SHARDS = int(os.getenv("CORPUS_SHARDS", "1"))
+# "thread" searches shards in-process, "process" serves each shard from its own worker process.
+# Each API server process starts its own shard workers, so use "process" with a single server process per host
+CORPUS_SHARD_MODE = os.getenv("CORPUS_SHARD_MODE", "thread")
+# Calls a shard worker process runs at once
+CORPUS_SHARD_WORKER_THREADS = int(os.getenv("CORPUS_SHARD_WORKER_THREADS", "4"))
+# Removed documents are tombstoned; the index is compacted once this fraction of its rows is dead
+CORPUS_COMPACTION_DEAD_FRACTION = float(os.getenv("CORPUS_COMPACTION_DEAD_FRACTION", "0.2"))
+
+# Hybrid Retrieval Settings
+# Fuse BM25 and vector rankings; short exact-match queries skip the embedding call
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Each ranking contributes this many times k candidates to the fusion
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "4"))
+LEXICAL_FAST_PATH_MAX_TERMS = int(os.getenv("LEXICAL_FAST_PATH_MAX_TERMS", "6"))
+# Queries without an identifier-like token take the fast path only with a term in at most this fraction of chunks
+LEXICAL_FAST_PATH_MAX_DF_FRACTION = float(os.getenv("LEXICAL_FAST_PATH_MAX_DF_FRACTION", "0.001"))
+
+# Search Batching Settings
+# Concurrent searches of the same index arriving within this window share one FAISS call; 0 disables
+SEARCH_BATCH_WINDOW_MS = float(os.getenv("SEARCH_BATCH_WINDOW_MS", "2"))
+SEARCH_BATCH_MAX_SIZE = int(os.getenv("SEARCH_BATCH_MAX_SIZE", "64"))
+
+# Chunking Settings
+# Chunk length and overlap in tokens of LLM_MODEL; at about four characters per token of English text,
+# the defaults match the earlier 1000-character chunks with 200 characters of overlap
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "250"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+# Chunks are embedded and written to the chunk store in batches of this size while the text streams in
+CHUNK_EMBEDDING_BATCH_SIZE = int(os.getenv("CHUNK_EMBEDDING_BATCH_SIZE", "128"))
+
+# Context Selection Settings
+# Diversify retrieved chunks by MMR and merge overlapping ones before prompt assembly
+CONTEXT_DIVERSIFY = os.getenv("CONTEXT_DIVERSIFY", "true").lower() == "true"
+# Retrieval fetches this many times k candidates for MMR to choose from
+CONTEXT_FETCH_FACTOR = int(os.getenv("CONTEXT_FETCH_FACTOR", "3"))
+# 1.0 ranks by relevance only, lower values favour chunks unlike those already picked
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+
+# Warm-up Settings
+# Document sets used in chats and searches are recorded and preloaded at startup
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_ACTIVITY_PATH = DATA_DIR / "recent_document_sets.json"
+WARMUP_MAX_SETS = int(os.getenv("WARMUP_MAX_SETS", "20"))
+WARMUP_MAX_AGE_DAYS = int(os.getenv("WARMUP_MAX_AGE_DAYS", "7"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+# The backend reports ready after this many seconds even if warm-up has not finished
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "120"))
+
+# Document Store Settings
+# Document status changes are journaled and folded into the document records every this many changes
+STATUS_JOURNAL_COMPACT_ENTRIES = int(os.getenv("STATUS_JOURNAL_COMPACT_ENTRIES", "500"))
+# Uploads larger than this are rejected while they stream in
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+
 # Application Settings
 APP_NAME = "EduChat - AI Study Companion"
 APP_DESCRIPTION = "An AI-powered tool for personalized academic support"
@@ -0,0 +1,111 @@
+import json
+import os
+import random
+import sys
+import threading
+
+import pytest
+
+# Add the repository root to the path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import Embeddings
+
+# The services import the document processors, which import services in turn; load them in the API's order
+import app.backend.services  # noqa: F401
+
+WORDS = ["derivative", "integral", "theorem", "matrix", "vector", "graph", "proof", "limit", "series", "function",
+         "area", "curve", "slope", "rate", "change", "space", "basis", "number", "prime", "set"]
+
+
+def make_text(seed: int, paragraphs: int = 12) -> str:
+    """Build a text of several paragraphs of random words."""
+    rng = random.Random(seed)
+    return "\n\n".join(
+        ". ".join(" ".join(rng.choices(WORDS, k=rng.randint(6, 14))) for _ in range(rng.randint(3, 6))) + "."
+        for _ in range(paragraphs)
+    )
+
+
+N_CALLERS = 16
+
+
+def run_concurrently(target):
+    """Call target(i) on N_CALLERS threads started together and return the results by caller."""
+    barrier = threading.Barrier(N_CALLERS)
+    results = [None] * N_CALLERS
+    errors = []
+
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(N_CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    return results
+
+
+class CountingEmbeddings(Embeddings):
+    """Local hashing embedder that counts the calls and texts it embeds."""
+
+    def __init__(self, dimension: int = 64):
+        from app.backend.services.embedding_backends import HashingEmbeddings
+        self.embeddings = HashingEmbeddings(dimension)
+        self.calls = 0
+        self.texts = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class EmbeddingEnvironment:
+    """Processed documents and embeddings under a temporary directory."""
+
+    def __init__(self, tmp_path, embeddings: CountingEmbeddings):
+        self.processed_dir = tmp_path / "processed"
+        self.embeddings_dir = tmp_path / "embeddings"
+        self.embeddings = embeddings
+        self.processed_dir.mkdir()
+        self.embeddings_dir.mkdir()
+
+    def write_document(self, document_id: str, text: str, title: str = "Notes") -> None:
+        """Write the processed text and metadata of a document."""
+        folder = self.processed_dir / document_id
+        folder.mkdir(exist_ok=True)
+        (folder / "content.txt").write_text(text, encoding="utf-8")
+        (folder / "metadata.json").write_text(json.dumps({"title": title}), encoding="utf-8")
+
+
+@pytest.fixture
+def embedding_env(tmp_path, monkeypatch):
+    """
+    Point the embedding service at a temporary directory with its own caches,
+    corpus index and a counting local embedder, so tests need no API key.
+    """
+    from app.backend.services import embedding_service, corpus_index, vectorstore_cache, warmup
+    from app.backend.services.embedding_backends import get_backend_id
+    from app.backend.services.embedding_cache import CachedEmbeddings, EmbeddingCache, QueryEmbeddingCache
+
+    env = EmbeddingEnvironment(tmp_path, CountingEmbeddings())
+    model = CachedEmbeddings(env.embeddings, get_backend_id(), cache=EmbeddingCache(str(tmp_path / "cache.sqlite3")),
+                             query_cache=QueryEmbeddingCache(db_path=None))
+    monkeypatch.setattr(embedding_service, "EMBEDDINGS_DIR", str(env.embeddings_dir))
+    monkeypatch.setattr(embedding_service, "PROCESSED_DATA_DIR", str(env.processed_dir))
+    monkeypatch.setattr(embedding_service, "_embedding_model", model)
+    monkeypatch.setattr(corpus_index, "_corpus_index", corpus_index.CorpusIndex(str(tmp_path / "corpus")))
+    monkeypatch.setattr(corpus_index, "CORPUS_COMPACTION_DEAD_FRACTION", 2.0)
+    monkeypatch.setattr(vectorstore_cache, "_vectorstore_cache", vectorstore_cache.VectorStoreCache())
+    monkeypatch.setattr(warmup, "_activity_log", warmup.ActivityLog(str(tmp_path / "recent_document_sets.json")))
+    return env
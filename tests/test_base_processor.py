@@ -0,0 +1,38 @@
+import os
+
+from app.backend.document_processors.base_processor import (
+    SEGMENTS_FILE, SegmentedText, load_segments, save_segments
+)
+
+
+def test_segmented_text_records_the_spans_of_non_empty_segments():
+    text = SegmentedText()
+    text.append("\n\n")
+    text.start_segment("page", "Page 1")
+    text.append("First page.\n")
+    text.start_segment("page", "Page 2")
+    text.append("   \n")
+    text.start_segment("table", "Table 1")
+    text.append("a | b\n1 | 2\n\n")
+
+    content, segments = text.build()
+
+    assert content == "First page.\n   \na | b\n1 | 2"
+    assert [(segment["label"], content[segment["start"]:segment["end"]]) for segment in segments] == [
+        ("Page 1", "First page.\n"), ("Table 1", "a | b\n1 | 2")
+    ]
+
+
+def test_segments_round_trip_and_stale_files_are_removed(tmp_path):
+    segments = [
+        {"type": "slide", "label": "Slide 1", "start": 0, "end": 10},
+        {"type": "table", "label": "Table 1", "start": 10, "end": 25},
+        {"type": "slide", "label": "Slide 2", "start": 25, "end": 40},
+    ]
+
+    save_segments(str(tmp_path), segments)
+    assert load_segments(str(tmp_path)) == segments
+
+    save_segments(str(tmp_path), [])
+    assert not os.path.exists(tmp_path / SEGMENTS_FILE)
+    assert load_segments(str(tmp_path)) == []
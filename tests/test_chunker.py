@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+from app.backend.services import chunker
+from app.backend.services.chunker import StreamingChunker, count_tokens
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+
+
+def make_text(seed=1):
+    rng = random.Random(seed)
+    parts = []
+    for page in range(1, 6):
+        parts.append(f"--- Page {page} ---\n")
+        for _ in range(rng.randint(2, 6)):
+            sentences = (" ".join(rng.choices(WORDS, k=rng.randint(3, 30))) for _ in range(rng.randint(1, 8)))
+            parts.append(". ".join(sentences) + rng.choice(["\n\n", "\n", "\n\n\n"]))
+    # A long run without any boundary, and a paragraph of words without a line break
+    parts.append("x" * 3000 + " " + "y " * 900)
+    return "".join(parts)
+
+
+def split(text, block_chars, chunk_tokens=250, overlap_tokens=50):
+    splitter = StreamingChunker(chunk_tokens, overlap_tokens, block_chars)
+    blocks = [text[i:i + block_chars] for i in range(0, len(text), block_chars)]
+    return [(chunk.metadata["start_index"], chunk.page_content) for chunk in splitter.split_stream(blocks, {})]
+
+
+def test_chunks_are_exact_slices_within_the_token_limit():
+    text = make_text()
+    chunks = split(text, 4096)
+
+    assert len(chunks) > 1
+    for start, content in chunks:
+        assert text[start:start + len(content)] == content
+        assert count_tokens(content) <= 250
+
+
+def test_chunks_overlap_and_cover_the_text():
+    text = make_text()
+    chunks = split(text, 4096)
+
+    for (start, content), (next_start, _) in zip(chunks, chunks[1:]):
+        assert start < next_start <= start + len(content) + 3
+    assert chunks[-1][0] + len(chunks[-1][1]) == len(text.rstrip())
+
+
+@pytest.mark.parametrize("block_chars", [7, 50, 64, 333, 4096])
+def test_chunks_do_not_depend_on_the_block_size(block_chars):
+    text = make_text()
+    assert split(text, block_chars) == split(text, len(text))
+
+
+@pytest.mark.parametrize("block_chars", [7, 50, 4096])
+def test_long_paragraphs_are_cut_independently_of_the_block_size(monkeypatch, block_chars):
+    monkeypatch.setattr(chunker, "MAX_PARAGRAPH_CHARS", 300)
+    text = make_text()
+    chunks = split(text, block_chars)
+
+    assert chunks == split(text, len(text))
+    for start, content in chunks:
+        assert text[start:start + len(content)] == content
+
+
+def test_page_header_stays_with_its_text():
+    text = make_text()
+    for _, content in split(text, 50):
+        assert not content.startswith("--- Page") or len(content) > len("--- Page 1 ---")
+
+
+def test_split_file_keeps_chunks_within_segments(tmp_path):
+    text = make_text()
+    path = tmp_path / "content.txt"
+    path.write_text(text, encoding="utf-8")
+    first = text.index("--- Page 2")
+    second = text.index("--- Page 4")
+    segments = [
+        {"type": "page", "label": "1", "start": 0, "end": first},
+        {"type": "page", "label": "2-3", "start": first, "end": second},
+    ]
+
+    chunks = list(StreamingChunker(100, 20, 64).split_file(str(path), {"document_id": "doc"}, segments))
+
+    for chunk in chunks:
+        start = chunk.metadata["start_index"]
+        end = start + len(chunk.page_content)
+        assert text[start:end] == chunk.page_content
+        assert chunk.metadata["document_id"] == "doc"
+        label = chunk.metadata.get("segment_label")
+        if label == "1":
+            assert end <= first
+        elif label == "2-3":
+            assert first <= start and end <= second
+        else:
+            assert start >= second
+    assert {chunk.metadata.get("segment_label") for chunk in chunks} == {"1", "2-3", None}
@@ -0,0 +1,60 @@
+import numpy as np
+
+from langchain_core.documents import Document
+
+from app.backend.services import context_selector
+from app.backend.services.context_selector import ContextStats, merge_overlapping, mmr_select, select_chunks
+
+TEXT = " ".join(f"Sentence {i} covers topic {i * 7 % 13}." for i in range(20))
+
+
+def chunk(start, end, document_id="a", **metadata):
+    return Document(page_content=TEXT[start:end], metadata={"document_id": document_id, "start_index": start, **metadata})
+
+
+def test_mmr_skips_near_duplicates():
+    vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]])
+
+    assert mmr_select([1.0, 0.95, 0.5], vectors, 2, lambda_mult=0.5) == [0, 2]
+    # Relevance alone keeps the retrieval order
+    assert mmr_select([1.0, 0.95, 0.5], vectors, 3, lambda_mult=1.0) == [0, 1, 2]
+    assert mmr_select([], np.zeros((0, 2)), 3) == []
+
+
+def test_overlapping_spans_of_a_document_are_merged():
+    merged = merge_overlapping([(1, chunk(40, 120)), (0, chunk(0, 60)), (5, chunk(200, 260))])
+
+    assert [doc.page_content for doc in merged] == [TEXT[0:120], TEXT[200:260]]
+    assert merged[0].metadata["merged_chunks"] == 2
+    assert merged[0].metadata["start_index"] == 0
+    assert "merged_chunks" not in merged[1].metadata
+
+
+def test_chunks_of_other_documents_are_not_merged():
+    merged = merge_overlapping([(0, chunk(0, 60, "a")), (1, chunk(40, 120, "b"))])
+
+    assert [doc.page_content for doc in merged] == [TEXT[0:60], TEXT[40:120]]
+
+
+def test_chunks_without_offsets_merge_with_their_predecessor_by_text():
+    first = Document(page_content=TEXT[0:80], metadata={"document_id": "a"})
+    second = Document(page_content=TEXT[50:140], metadata={"document_id": "a"})
+    unrelated = Document(page_content=TEXT[50:140], metadata={"document_id": "a"})
+
+    assert [doc.page_content for doc in merge_overlapping([(3, first), (4, second)])] == [TEXT[0:140]]
+    # Only the chunk stored right before can be merged
+    assert len(merge_overlapping([(3, first), (7, unrelated)])) == 2
+
+
+def test_selection_reports_the_tokens_saved(monkeypatch):
+    monkeypatch.setattr(context_selector, "_context_stats", ContextStats())
+    hits = [(3.0, 0, chunk(0, 60)), (2.0, 1, chunk(40, 120)), (1.0, 2, chunk(200, 260))]
+    vectors = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]])
+
+    context, report = select_chunks(hits, vectors, 3)
+
+    assert [doc.page_content for doc in context] == [TEXT[0:120], TEXT[200:260]]
+    assert report["candidates"] == 3 and report["chunks"] == 2
+    assert report["tokens_saved"] == report["tokens_before"] - report["tokens_after"] > 0
+    assert context_selector.get_context_stats().stats()["turns"] == 1
+    assert select_chunks([], np.zeros((0, 2)), 3)[1]["chunks"] == 0
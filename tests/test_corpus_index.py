@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+
+from langchain_core.documents import Document
+
+from app.backend.services import corpus_index, index_factory
+from app.backend.services.corpus_index import CorpusIndex, search_row_ranges
+from app.backend.services.lexical_index import LexicalIndex
+from app.backend.services.mmap_store import append_vectors
+
+DIMENSION = 16
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+
+
+@pytest.fixture(autouse=True)
+def no_background_compaction(monkeypatch):
+    monkeypatch.setattr(corpus_index, "CORPUS_COMPACTION_DEAD_FRACTION", 2.0)
+
+
+def make_document(doc_id, n_chunks, seed):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n_chunks, DIMENSION)).astype(np.float32)
+    chunks = [
+        Document(
+            page_content=" ".join(rng.choice(WORDS, size=8)) + f" {doc_id}term{row}",
+            metadata={"document_id": doc_id, "start_index": row * 100}
+        )
+        for row in range(n_chunks)
+    ]
+    return vectors, chunks
+
+
+def chunk_ids(results):
+    return [(chunk.metadata["document_id"], chunk.metadata["start_index"]) for chunk, _ in results]
+
+
+@pytest.fixture(params=["memory", "mmap"])
+def index_dir(request, tmp_path):
+    return str(tmp_path / request.param), request.param
+
+
+def test_search_is_restricted_to_the_selected_documents(index_dir):
+    path, load_mode = index_dir
+    index = CorpusIndex(path, load_mode=load_mode, embedding_backend="test")
+    a_vectors, a_chunks = make_document("a", 6, 0)
+    b_vectors, b_chunks = make_document("b", 4, 1)
+    assert index.add_document("a", a_vectors, a_chunks) == 6
+    index.add_document("b", b_vectors, b_chunks)
+
+    results = index.search(b_vectors[2].tolist(), ["a", "b"], k=3)
+    assert chunk_ids(results)[0] == ("b", 200)
+    assert results[0][1] == pytest.approx(0.0, abs=1e-4)
+
+    results = index.search(b_vectors[2].tolist(), ["a"], k=10)
+    assert {doc_id for doc_id, _ in chunk_ids(results)} == {"a"}
+    assert len(results) == 6
+    assert index.search(b_vectors[2].tolist(), ["missing"], k=3) == []
+
+
+def test_selector_search_only_falls_back_to_the_selected_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_factory, "VECTOR_INDEX_PROMOTION_THRESHOLD", 0)
+    monkeypatch.setattr(index_factory, "VECTOR_INDEX_APPROXIMATE_TYPE", "hnsw")
+    monkeypatch.setattr(index_factory, "HNSW_EF_SEARCH", 1)
+    monkeypatch.setattr(corpus_index, "EXACT_SEARCH_MAX_ROWS", 0)
+    exact_searches = []
+
+    def record_exact_search(vectors, queries, ranges, k):
+        exact_searches.append(list(ranges))
+        return search_row_ranges(vectors, queries, ranges, k)
+
+    monkeypatch.setattr(corpus_index, "search_row_ranges", record_exact_search)
+    index = CorpusIndex(str(tmp_path / "corpus"), embedding_backend="test")
+    for seed in range(20):
+        index.add_document(f"d{seed}", *make_document(f"d{seed}", 20, seed))
+    assert index.stats()["index_type"] == "hnsw"
+    query = make_document("d0", 20, 0)[0][0]
+
+    results = index.search(query.tolist(), ["d3", "d11"], k=10)
+
+    assert len(results) == 10
+    assert {doc_id for doc_id, _ in chunk_ids(results)} <= {"d3", "d11"}
+    selected = {index.document_ranges["d3"], index.document_ranges["d11"]}
+    assert all(set(ranges) <= selected for ranges in exact_searches)
+
+
+def test_appended_corpus_matches_a_rebuilt_one(tmp_path):
+    documents = {doc_id: make_document(doc_id, 8, seed) for seed, doc_id in enumerate("abcd")}
+    appended = CorpusIndex(str(tmp_path / "appended"), embedding_backend="test")
+    for doc_id, (vectors, chunks) in documents.items():
+        appended.add_document(doc_id, vectors, chunks)
+    appended = CorpusIndex(str(tmp_path / "appended"), embedding_backend="test")
+
+    all_vectors = np.concatenate([vectors for vectors, _ in documents.values()])
+    all_chunks = [chunk for _, chunks in documents.values() for chunk in chunks]
+    assert np.allclose(appended.get_vectors(), all_vectors)
+    rebuilt = LexicalIndex.from_texts(chunk.page_content for chunk in all_chunks)
+    for query in ["alpha beta", "cterm3", "kappa dterm7"]:
+        assert appended.lexical_index.search(query, 10) == pytest.approx(rebuilt.search(query, 10))
+
+    query_vector = documents["c"][0][3]
+    results = appended.search(query_vector.tolist(), list(documents), k=4)
+    assert chunk_ids(results)[0] == ("c", 300)
+
+
+def test_rows_of_an_interrupted_append_are_ignored(tmp_path):
+    path = str(tmp_path / "corpus")
+    index = CorpusIndex(path, embedding_backend="test")
+    index.add_document("a", *make_document("a", 5, 0))
+    # Vectors written past the committed row count, as by an append that did not finish
+    append_vectors(path, np.ones((3, DIMENSION), dtype=np.float32), 5)
+
+    reloaded = CorpusIndex(path, embedding_backend="test")
+    assert len(reloaded.get_vectors()) == 5
+    b_vectors, b_chunks = make_document("b", 2, 1)
+    reloaded.add_document("b", b_vectors, b_chunks)
+
+    reloaded = CorpusIndex(path, embedding_backend="test")
+    assert reloaded.stats()["chunks"] == 7
+    assert np.allclose(reloaded.get_vectors()[5:], b_vectors)
+    assert chunk_ids(reloaded.search(b_vectors[1].tolist(), ["a", "b"], k=1)) == [("b", 100)]
+
+
+def test_index_of_another_embedding_backend_is_treated_as_empty(tmp_path):
+    path = str(tmp_path / "corpus")
+    CorpusIndex(path, embedding_backend="test").add_document("a", *make_document("a", 3, 0))
+
+    index = CorpusIndex(path, embedding_backend="other")
+
+    assert not index.has_document("a")
+    assert index.stats()["chunks"] == 0
+
+
+def test_removed_documents_are_tombstoned_until_compaction(index_dir):
+    path, load_mode = index_dir
+    index = CorpusIndex(path, load_mode=load_mode, embedding_backend="test")
+    for seed, (doc_id, n_chunks) in enumerate([("a", 5), ("b", 5), ("c", 10)]):
+        index.add_document(doc_id, *make_document(doc_id, n_chunks, seed))
+    c_vectors, _ = make_document("c", 10, 2)
+    before = chunk_ids(index.search(c_vectors[0].tolist(), ["a", "c"], k=20))
+
+    assert index.remove_document("b") is True
+    assert index.remove_document("b") is False
+    assert not index.has_document("b")
+    assert index.search(c_vectors[0].tolist(), ["b"], k=5) == []
+    stats = index.stats()
+    assert stats["chunks"] == 20 and stats["dead_chunks"] == 5
+    assert index.dead_fraction() == pytest.approx(0.25)
+
+    assert index.compact() is True
+    assert index.compact() is False
+    stats = index.stats()
+    assert stats["chunks"] == 15 and stats["dead_chunks"] == 0
+    assert chunk_ids(index.search(c_vectors[0].tolist(), ["a", "c"], k=20)) == before
+
+    reloaded = CorpusIndex(path, load_mode=load_mode, embedding_backend="test")
+    assert chunk_ids(reloaded.search(c_vectors[0].tolist(), ["a", "c"], k=20)) == before
+    assert len(reloaded.get_vectors()) == 15
+
+
+def test_replacing_a_document_tombstones_its_old_rows(index_dir):
+    path, load_mode = index_dir
+    index = CorpusIndex(path, load_mode=load_mode, embedding_backend="test")
+    index.add_document("a", *make_document("a", 4, 0))
+    old_vectors, _ = make_document("a", 4, 0)
+    new_vectors, new_chunks = make_document("a", 3, 5)
+
+    index.add_document("a", new_vectors, new_chunks)
+
+    results = index.search(old_vectors[0].tolist(), ["a"], k=10)
+    assert len(results) == 3
+    assert index.stats()["dead_chunks"] == 4
+    assert np.allclose(index.get_vectors(), new_vectors)
@@ -0,0 +1,148 @@
+import hashlib
+import io
+import json
+import os
+
+import pytest
+
+from conftest import make_text
+from app.backend.services import document_service
+from app.backend.services.document_service import DocumentService
+
+
+class FakeUpload:
+    """Upload with the filename, file and size attributes of an UploadFile."""
+
+    def __init__(self, content: bytes, filename: str = "notes.pdf", size=None):
+        self.filename = filename
+        self.file = io.BytesIO(content)
+        self.size = size
+
+
+class FakeProcessor:
+    def __init__(self, processed_dir, doc_id, path, text):
+        self.folder = os.path.join(processed_dir, doc_id)
+        self.doc_id = doc_id
+        self.path = path
+        self.text = text
+
+    def process(self):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, "content.txt"), "w", encoding="utf-8") as f:
+            f.write(self.text)
+        with open(os.path.join(self.folder, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump({"title": "Notes", "document_id": self.doc_id, "file_path": self.path}, f)
+
+
+class FakeProcessorFactory:
+    """Counts the documents it hands a processor for."""
+
+    def __init__(self, processed_dir, text):
+        self.processed_dir = processed_dir
+        self.text = text
+        self.processed = []
+
+    def get_processor(self, path, doc_id):
+        self.processed.append(doc_id)
+        return FakeProcessor(self.processed_dir, doc_id, path, self.text)
+
+
+class ImmediateTasks:
+    """Background tasks that run as soon as they are added."""
+
+    def add_task(self, func, *args):
+        func(*args)
+
+
+def make_service(tmp_path, processed_dir=None, processor_factory=None):
+    return DocumentService(processor_factory, data_dir=str(tmp_path), raw_data_dir=str(tmp_path / "raw"),
+                           processed_data_dir=str(processed_dir or tmp_path / "processed"),
+                           embeddings_dir=str(tmp_path / "embeddings"))
+
+
+def test_upload_is_saved_with_its_size_and_hash(tmp_path):
+    service = make_service(tmp_path)
+    content = os.urandom(3 * document_service.UPLOAD_BLOCK_BYTES + 17)
+    path = str(tmp_path / "upload.pdf")
+
+    size, content_hash = service._save_upload(FakeUpload(content), path)
+
+    assert size == len(content)
+    assert content_hash == hashlib.sha256(content).hexdigest()
+    with open(path, "rb") as f:
+        assert f.read() == content
+
+
+def test_upload_over_the_limit_is_rejected_and_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_service, "MAX_UPLOAD_BYTES", 100)
+    monkeypatch.setattr(document_service, "UPLOAD_BLOCK_BYTES", 32)
+    service = make_service(tmp_path)
+    path = str(tmp_path / "upload.pdf")
+
+    # No declared size: rejected while streaming, once the limit is passed
+    upload = FakeUpload(b"x" * 200)
+    with pytest.raises(ValueError, match="too large"):
+        service._save_upload(upload, path)
+    assert not os.path.exists(path)
+    assert upload.file.tell() < 200
+
+    # A declared size over the limit is rejected before reading
+    upload = FakeUpload(b"x" * 200, size=200)
+    with pytest.raises(ValueError, match="too large"):
+        service._save_upload(upload, path)
+    assert upload.file.tell() == 0
+    assert not os.path.exists(path)
+
+    # Exactly at the limit is accepted
+    assert service._save_upload(FakeUpload(b"x" * 100), path)[0] == 100
+
+
+def test_link_processed_copies_text_and_rewrites_metadata(tmp_path):
+    service = make_service(tmp_path)
+    source = tmp_path / "processed" / "source"
+    source.mkdir(parents=True)
+    (source / "content.txt").write_text("Photosynthesis in plants.", encoding="utf-8")
+    (source / "segments.json").write_text("[]", encoding="utf-8")
+    (source / "metadata.json").write_text(
+        json.dumps({"title": "Biology", "document_id": "source", "file_path": "raw/source.pdf"}), encoding="utf-8"
+    )
+
+    assert service._link_processed("source", "copy", "raw/copy.pdf")
+
+    target = tmp_path / "processed" / "copy"
+    assert (target / "content.txt").read_text(encoding="utf-8") == "Photosynthesis in plants."
+    assert (target / "segments.json").read_text(encoding="utf-8") == "[]"
+    metadata = json.loads((target / "metadata.json").read_text(encoding="utf-8"))
+    assert metadata == {"title": "Biology", "document_id": "copy", "file_path": "raw/copy.pdf"}
+    # The copy is independent of the source, which processors may rewrite in place
+    assert not os.path.samefile(source / "content.txt", target / "content.txt")
+    assert json.loads((source / "metadata.json").read_text(encoding="utf-8"))["document_id"] == "source"
+
+
+def test_link_processed_needs_the_source_text(tmp_path):
+    service = make_service(tmp_path)
+    (tmp_path / "processed" / "source").mkdir(parents=True)
+
+    assert not service._link_processed("source", "copy", "raw/copy.pdf")
+    assert not (tmp_path / "processed" / "copy").exists()
+
+
+def test_duplicate_upload_is_linked_instead_of_processed(tmp_path, embedding_env):
+    factory = FakeProcessorFactory(str(embedding_env.processed_dir), make_text(6))
+    service = make_service(tmp_path, embedding_env.processed_dir, factory)
+    content = b"%PDF-1.4 identical lecture notes"
+
+    first = service.process_document("first", FakeUpload(content), background_tasks=ImmediateTasks())
+    calls = embedding_env.embeddings.calls
+    second = service.process_document("second", FakeUpload(content, "copy.pdf"), background_tasks=ImmediateTasks())
+
+    assert "duplicate_of" not in first
+    assert second["duplicate_of"] == "first"
+    assert second["content_hash"] == first["content_hash"]
+    assert factory.processed == ["first"]
+    assert embedding_env.embeddings.calls == calls
+    assert service.get_document_by_id("second")["processed"]
+    assert service.get_processed_text("second") == service.get_processed_text("first")
+    metadata = json.loads((embedding_env.processed_dir / "second" / "metadata.json").read_text(encoding="utf-8"))
+    assert metadata["document_id"] == "second"
+    assert metadata["file_path"] == second["file_path"]
@@ -0,0 +1,201 @@
+import json
+import sqlite3
+import threading
+
+from app.backend.services.document_store import DocumentStore
+
+
+def make_document(doc_id, **fields):
+    return {"id": doc_id, "status": "uploaded", "processed": False, "category": "notes", "content_hash": None, **fields}
+
+
+def column_status(db_path, doc_id):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT status FROM documents WHERE id = ?", (doc_id,)).fetchone()[0]
+
+
+def journal_entries(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM status_journal").fetchone()[0]
+
+
+def test_records_keep_insertion_order(tmp_path):
+    store = DocumentStore(tmp_path / "documents.sqlite3")
+    for doc_id in ["b", "a", "c"]:
+        store.insert(make_document(doc_id))
+
+    assert [document["id"] for document in store.list_all()] == ["b", "a", "c"]
+    assert store.get("a")["category"] == "notes"
+    assert store.get("missing") is None
+
+
+def test_find_by_hash_and_delete(tmp_path):
+    store = DocumentStore(tmp_path / "documents.sqlite3")
+    store.insert(make_document("a", content_hash="h1"))
+    store.insert(make_document("b", content_hash="h2"))
+    store.insert(make_document("c", content_hash="h1"))
+
+    assert [document["id"] for document in store.find_by_hash("h1")] == ["a", "c"]
+    assert store.delete("a") is True
+    assert store.delete("a") is False
+    assert [document["id"] for document in store.find_by_hash("h1")] == ["c"]
+
+
+def test_legacy_json_is_migrated_once(tmp_path):
+    json_path = tmp_path / "documents.json"
+    json_path.write_text(json.dumps([make_document("a"), make_document("b")]))
+    db_path = tmp_path / "documents.sqlite3"
+
+    store = DocumentStore(db_path, legacy_json_path=json_path)
+    store.delete("b")
+    store = DocumentStore(db_path, legacy_json_path=json_path)
+
+    assert [document["id"] for document in store.list_all()] == ["a"]
+    assert json_path.exists()
+
+
+def test_concurrent_writers_keep_every_record(tmp_path):
+    db_path = str(tmp_path / "documents.sqlite3")
+    DocumentStore(db_path)
+
+    def insert(worker):
+        store = DocumentStore(db_path)
+        for i in range(20):
+            store.insert(make_document(f"{worker}-{i}"))
+
+    threads = [threading.Thread(target=insert, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(DocumentStore(db_path).list_all()) == 80
+
+
+def test_reads_are_served_from_the_in_process_copy(tmp_path):
+    store = DocumentStore(tmp_path / "documents.sqlite3")
+    store.insert(make_document("a"))
+    store.get("a")
+    reloads = store.reloads
+
+    for _ in range(5):
+        document = store.get("a")
+        document["category"] = "changed by the caller"
+    store.insert(make_document("b"))
+    store.update("a", {"title": "Notes"})
+
+    # Writes through this store update the copy in place, and callers get their own records
+    assert store.reloads == reloads
+    assert store.get("a")["category"] == "notes"
+    assert [document["id"] for document in store.list_all()] == ["a", "b"]
+
+
+def test_other_stores_see_updated_records(tmp_path):
+    db_path = str(tmp_path / "documents.sqlite3")
+    writer = DocumentStore(db_path)
+    reader = DocumentStore(db_path)
+    writer.insert(make_document("a"))
+    assert reader.get("a")["category"] == "notes"
+
+    writer.update("a", {"category": "slides"})
+    assert reader.get("a")["category"] == "slides"
+    writer.insert(make_document("b"))
+    writer.delete("a")
+
+    assert reader.get("a") is None
+    assert [document["id"] for document in reader.list_all()] == ["b"]
+
+
+def test_status_change_is_journaled_and_sets_the_status_column(tmp_path):
+    db_path = str(tmp_path / "documents.sqlite3")
+    store = DocumentStore(db_path, compact_entries=100)
+    store.insert(make_document("a"))
+
+    document = store.update_status("a", "processed", True, "2024-01-01T00:00:00")
+
+    assert document["status"] == "processed" and document["processed"] is True
+    assert journal_entries(db_path) == 1
+    assert column_status(db_path, "a") == "processed"
+    assert store.update_status("missing", "processed", True, "2024-01-01T00:00:00") is None
+
+
+def test_other_stores_see_journaled_changes(tmp_path):
+    db_path = str(tmp_path / "documents.sqlite3")
+    writer = DocumentStore(db_path, compact_entries=100)
+    reader = DocumentStore(db_path, compact_entries=100)
+    writer.insert(make_document("a"))
+    assert reader.get("a")["status"] == "uploaded"
+    reloads = reader.reloads
+
+    writer.update_status("a", "processing", False, "2024-01-01T00:00:00")
+
+    assert reader.get("a")["status"] == "processing"
+    # Journal entries are applied to the in-process copy without reloading every record
+    assert reader.reloads == reloads
+
+
+def test_journal_is_folded_every_compact_entries(tmp_path):
+    db_path = str(tmp_path / "documents.sqlite3")
+    store = DocumentStore(db_path, compact_entries=3)
+    store.insert(make_document("a"))
+
+    for i, status in enumerate(["processing", "processed", "error"]):
+        store.update_status("a", status, status == "processed", f"2024-01-0{i + 1}T00:00:00")
+
+    assert journal_entries(db_path) == 0
+    with sqlite3.connect(db_path) as conn:
+        data = json.loads(conn.execute("SELECT data FROM documents WHERE id = 'a'").fetchone()[0])
+    assert data["status"] == "error" and data["last_modified"] == "2024-01-03T00:00:00"
+    assert store.get("a")["status"] == "error"
+
+
+def test_update_folds_the_documents_journal_first(tmp_path):
+    db_path = str(tmp_path / "documents.sqlite3")
+    store = DocumentStore(db_path, compact_entries=100)
+    store.insert(make_document("a"))
+    store.update_status("a", "processed", True, "2024-01-01T00:00:00")
+
+    document = store.update("a", {"title": "Notes"})
+
+    assert document["title"] == "Notes" and document["status"] == "processed"
+    assert journal_entries(db_path) == 0
+    assert DocumentStore(db_path).get("a") == document
+
+
+def test_opening_a_store_folds_a_stale_journal(tmp_path):
+    db_path = str(tmp_path / "documents.sqlite3")
+    DocumentStore(db_path).insert(make_document("a"))
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO status_journal (document_id, status, processed, changed_at) "
+            "VALUES ('a', 'processed', 1, '2024-01-01T00:00:00')"
+        )
+
+    store = DocumentStore(db_path)
+
+    assert column_status(db_path, "a") == "processed"
+    assert journal_entries(db_path) == 0
+    assert store.get("a")["processed"] is True
+
+
+def test_concurrent_status_updates_are_not_lost(tmp_path):
+    db_path = str(tmp_path / "documents.sqlite3")
+    setup = DocumentStore(db_path)
+    for worker in range(4):
+        setup.insert(make_document(f"doc-{worker}"))
+
+    def process(worker):
+        store = DocumentStore(db_path, compact_entries=7)
+        for i, status in enumerate(["processing", "embedding", "processed"] * 5):
+            store.update_status(f"doc-{worker}", status, status == "processed", f"2024-01-01T00:00:{i:02d}")
+
+    threads = [threading.Thread(target=process, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for document in DocumentStore(db_path).list_all():
+        assert document["status"] == "processed" and document["processed"] is True
+        assert document["last_modified"] == "2024-01-01T00:00:14"
+        assert column_status(db_path, document["id"]) == "processed"
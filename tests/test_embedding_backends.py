@@ -0,0 +1,51 @@
+import numpy as np
+
+from app.backend.services import embedding_backends, embedding_service
+from app.backend.services.embedding_backends import HashingEmbeddings, create_embeddings, get_backend_id
+from app.backend.services.embedding_service import EmbeddingService, generate_embeddings_for_document
+
+from conftest import make_text
+
+
+def test_hashing_embeddings_are_deterministic_and_normalized():
+    embeddings = HashingEmbeddings(128)
+
+    first = embeddings.embed_documents(["The derivative of x squared", ""])
+    again = HashingEmbeddings(128).embed_query("the  Derivative of x squared")
+
+    assert len(first[0]) == 128
+    assert abs(np.linalg.norm(first[0]) - 1.0) < 1e-6
+    assert first[0] == again
+    # Text without terms embeds to the zero vector rather than dividing by zero
+    assert not any(first[1])
+
+
+def test_hashing_embeddings_rank_shared_terms_closer():
+    embeddings = HashingEmbeddings(256)
+    query, near, far = (np.array(vector) for vector in embeddings.embed_documents([
+        "eigenvalues of a matrix", "the eigenvalues of a symmetric matrix", "a proof by induction"
+    ]))
+
+    assert query @ near > query @ far
+
+
+def test_backend_ids_name_the_backend_and_model(monkeypatch):
+    monkeypatch.setattr(embedding_backends, "HASHING_EMBEDDING_DIMENSION", 384)
+
+    assert get_backend_id("hashing") == "hashing:384"
+    assert get_backend_id("sentence-transformers").startswith("sentence-transformers:")
+    # OpenAI indexes keep the bare model name they were saved with before backends existed
+    assert get_backend_id("openai") == embedding_backends.EMBEDDING_MODEL
+    assert isinstance(create_embeddings("hashing"), HashingEmbeddings)
+    assert create_embeddings("unknown") is None
+
+
+def test_indexes_of_another_backend_are_not_used(embedding_env, monkeypatch):
+    embedding_env.write_document("a", make_text(0))
+    assert generate_embeddings_for_document("a")
+    assert EmbeddingService("a").has_embeddings()
+
+    monkeypatch.setattr(embedding_service, "get_backend_id",
+                        lambda backend="hashing": get_backend_id("openai") if backend == "openai" else "hashing:384")
+
+    assert not EmbeddingService("a").has_embeddings()
@@ -0,0 +1,102 @@
+import time
+
+from app.backend.services.embedding_cache import CachedEmbeddings, EmbeddingCache, QueryEmbeddingCache, make_cache_key
+
+from conftest import CountingEmbeddings
+
+
+def test_cache_keys_normalize_text_and_separate_models():
+    assert make_cache_key("model", "A  derivative\n") == make_cache_key("model", "A derivative")
+    assert make_cache_key("model", "A derivative") != make_cache_key("other", "A derivative")
+
+
+def test_cached_vectors_are_shared_across_cache_instances(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(db_path).put_many("model", ["first text", "second text"], [[1.0, 2.0], [3.0, 4.0]])
+
+    cache = EmbeddingCache(db_path)
+
+    assert cache.get_many("model", ["second  text", "unknown", "first text"]) == [[3.0, 4.0], None, [1.0, 2.0]]
+    assert cache.get_many("other", ["first text"]) == [None]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+
+
+def test_least_recently_used_vectors_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put_many("model", ["a"], [[1.0]])
+    time.sleep(0.01)
+    cache.put_many("model", ["b"], [[2.0]])
+    time.sleep(0.01)
+    cache.get_many("model", ["a"])
+    time.sleep(0.01)
+
+    cache.put_many("model", ["c"], [[3.0]])
+
+    assert cache.get_many("model", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+    assert cache.stats()["entries"] == 2
+
+
+def test_cached_embeddings_only_embed_missing_texts_once(tmp_path):
+    embeddings = CountingEmbeddings()
+    model = CachedEmbeddings(embeddings, "model", cache=EmbeddingCache(str(tmp_path / "cache.sqlite3")),
+                             query_cache=QueryEmbeddingCache(db_path=None))
+
+    first = model.embed_documents(["a proof", "a  proof", "a limit"])
+    second = model.embed_documents(["a limit", "a series"])
+
+    assert first[0] == first[1]
+    assert second[0] == first[2]
+    assert embeddings.texts == 3
+
+
+def test_query_vectors_expire_after_their_ttl(monkeypatch):
+    from app.backend.services import embedding_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    cache = QueryEmbeddingCache(ttl_seconds=60, db_path=None)
+    cache.put("model", "What is a limit?", [1.0, 2.0])
+
+    now[0] += 59
+    assert cache.get("model", "What is a  limit?") == [1.0, 2.0]
+    now[0] += 2
+    assert cache.get("model", "What is a limit?") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["expired"], stats["misses"], stats["entries"]) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_queries_are_evicted():
+    cache = QueryEmbeddingCache(max_entries=2, db_path=None)
+    cache.put("model", "a", [1.0])
+    cache.put("model", "b", [2.0])
+    assert cache.get("model", "a") == [1.0]
+
+    cache.put("model", "c", [3.0])
+
+    assert cache.get("model", "b") is None
+    assert cache.get("model", "a") == [1.0]
+    assert cache.get("model", "c") == [3.0]
+
+
+def test_persisted_query_vectors_are_shared_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    QueryEmbeddingCache(db_path=path).put("model", "a series", [0.5, 0.25])
+
+    other = QueryEmbeddingCache(db_path=path)
+
+    assert other.get("model", "a series") == [0.5, 0.25]
+    assert other.stats()["disk_hits"] == 1
+
+
+def test_repeated_queries_are_embedded_once():
+    embeddings = CountingEmbeddings()
+    model = CachedEmbeddings(embeddings, "model", cache=None, query_cache=QueryEmbeddingCache(db_path=None))
+
+    first = model.embed_query("What is a derivative?")
+    batch = model.embed_queries(["What is a  derivative?", "a limit", "a limit "])
+
+    assert batch[0] == first
+    assert batch[1] == batch[2]
+    assert embeddings.texts == 2
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from app.backend.services.embedding_coalescer import EmbeddingCoalescer
+
+from conftest import N_CALLERS, run_concurrently
+
+
+def slow_embed(texts):
+    time.sleep(0.02)
+    return [[float(len(text))] for text in texts]
+
+
+def test_coalescer_sends_a_lone_request_without_waiting():
+    coalescer = EmbeddingCoalescer(window_ms=1000)
+
+    started = time.perf_counter()
+    vector = coalescer.embed("model", slow_embed, "hello")
+
+    assert time.perf_counter() - started < 0.5
+    assert vector == [5.0]
+    assert coalescer.stats()["api_calls"] == 1
+
+
+def test_coalescer_batches_concurrent_requests():
+    coalescer = EmbeddingCoalescer(window_ms=50)
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        return slow_embed(texts)
+
+    results = run_concurrently(lambda i: coalescer.embed("model", embed, "x" * (i + 1)))
+
+    assert results == [[float(i + 1)] for i in range(N_CALLERS)]
+    assert sum(calls) == N_CALLERS
+    assert len(calls) < N_CALLERS
+    stats = coalescer.stats()
+    assert stats["requests"] == N_CALLERS and stats["api_calls"] == len(calls)
+    assert stats["api_calls_saved"] == N_CALLERS - len(calls)
+
+
+def test_coalescer_passes_errors_to_every_caller():
+    coalescer = EmbeddingCoalescer(window_ms=50)
+
+    def failing_embed(texts):
+        time.sleep(0.02)
+        raise RuntimeError("rate limited")
+
+    def embed(i):
+        with pytest.raises(RuntimeError, match="rate limited"):
+            coalescer.embed("model", failing_embed, str(i))
+        return True
+
+    assert all(run_concurrently(embed))
+
+
+def test_disabled_coalescer_embeds_directly():
+    coalescer = EmbeddingCoalescer(window_ms=0)
+
+    assert coalescer.embed("model", slow_embed, "abc") == [3.0]
+    assert coalescer.stats()["requests"] == 0
@@ -0,0 +1,117 @@
+import numpy as np
+
+from app.backend.services import embedding_service
+from app.backend.services.embedding_cache import EmbeddingCache
+from app.backend.services.embedding_service import (
+    EmbeddingService, generate_embeddings_for_document, get_index_report, get_vectorstore_for_documents,
+    search_batch_in_document, search_in_document
+)
+
+from conftest import make_text
+
+
+def test_merged_store_is_built_from_stored_vectors(embedding_env):
+    for seed, document_id in enumerate(["a", "b", "c"]):
+        embedding_env.write_document(document_id, make_text(seed))
+        assert generate_embeddings_for_document(document_id)
+    chunk_counts = [len(EmbeddingService(document_id).get_stored_chunks()[1]) for document_id in ["a", "b", "c"]]
+    calls, texts = embedding_env.embeddings.calls, embedding_env.embeddings.texts
+
+    merged = get_vectorstore_for_documents(["a", "b", "c"])
+
+    assert all(count > 1 for count in chunk_counts)
+    assert merged.index.ntotal == sum(chunk_counts)
+    assert (embedding_env.embeddings.calls, embedding_env.embeddings.texts) == (calls, texts)
+
+    # Each stored vector finds its own chunk in the merged store
+    vectors, chunks = EmbeddingService("b").get_stored_chunks()
+    for row in range(len(chunks)):
+        found, _ = merged.similarity_search_with_score_by_vector(np.asarray(vectors[row]).tolist(), k=1)[0]
+        assert found.page_content == chunks[row].page_content
+        assert found.metadata["document_id"] == "b"
+
+
+def test_merge_skips_documents_without_text(embedding_env):
+    embedding_env.write_document("a", make_text(0))
+    assert generate_embeddings_for_document("a")
+
+    merged = get_vectorstore_for_documents(["a", "missing"])
+
+    assert merged.index.ntotal == len(EmbeddingService("a").get_stored_chunks()[1])
+    assert get_vectorstore_for_documents([]) is None
+
+
+def test_identical_text_in_another_document_is_not_embedded_again(embedding_env):
+    text = make_text(0)
+    embedding_env.write_document("a", text)
+    assert generate_embeddings_for_document("a")
+    texts = embedding_env.embeddings.texts
+
+    embedding_env.write_document("b", text, title="Copy of notes")
+    assert generate_embeddings_for_document("b")
+
+    assert embedding_env.embeddings.texts == texts
+    vectors_a, _ = EmbeddingService("a").get_stored_chunks()
+    vectors_b, chunks_b = EmbeddingService("b").get_stored_chunks()
+    assert np.array_equal(vectors_a, vectors_b)
+    assert all(chunk.metadata["document_id"] == "b" for chunk in chunks_b)
+
+
+def test_index_report_samples_document_rows_and_skips_documents_without_embeddings(embedding_env, monkeypatch):
+    for seed, document_id in enumerate(["a", "b"]):
+        embedding_env.write_document(document_id, make_text(seed, paragraphs=30))
+        assert generate_embeddings_for_document(document_id)
+    stored = np.concatenate([np.asarray(EmbeddingService(doc_id).get_stored_chunks()[0]) for doc_id in ["a", "b"]])
+    reported = []
+    monkeypatch.setattr(embedding_service, "INDEX_REPORT_MAX_VECTORS", 10)
+    monkeypatch.setattr(embedding_service, "recall_latency_report",
+                        lambda vectors, k, max_vectors: reported.append(vectors) or [{"index_type": "flat"}])
+
+    assert get_index_report(["a", "missing", "b"]) == [{"index_type": "flat"}]
+
+    assert len(stored) > 10
+    assert reported[0].shape == (10, stored.shape[1])
+    # Every sampled row is a distinct stored vector
+    assert len({row.tobytes() for row in reported[0]}) == 10
+    assert {row.tobytes() for row in reported[0]} <= {row.tobytes() for row in stored}
+    assert get_index_report(["missing"]) == []
+
+
+def test_re_embedding_reuses_the_vectors_of_unchanged_chunks(embedding_env, tmp_path):
+    text = make_text(0, paragraphs=30)
+    embedding_env.write_document("a", text)
+    assert generate_embeddings_for_document("a")
+    old_vectors, old_chunks = EmbeddingService("a").get_stored_chunks()
+    old = {chunk.page_content: np.array(old_vectors[row]) for row, chunk in enumerate(old_chunks)}
+    # A fresh content cache, so unchanged chunks can only be reused from the previous index
+    embedding_service._embedding_model.cache = EmbeddingCache(str(tmp_path / "other-cache.sqlite3"))
+    texts = embedding_env.embeddings.texts
+
+    embedding_env.write_document("a", text + "\n\nan added closing paragraph about series")
+    assert generate_embeddings_for_document("a")
+
+    vectors, chunks = EmbeddingService("a").get_stored_chunks()
+    changed = [chunk.page_content for chunk in chunks if chunk.page_content not in old]
+    assert 0 < len(changed) < len(chunks)
+    assert embedding_env.embeddings.texts - texts == len(changed)
+    for row, chunk in enumerate(chunks):
+        if chunk.page_content in old:
+            assert np.array_equal(vectors[row], old[chunk.page_content])
+
+
+def test_batched_search_matches_single_searches_with_one_embedding_call(embedding_env):
+    embedding_env.write_document("a", make_text(0, paragraphs=30))
+    assert generate_embeddings_for_document("a")
+    queries = ["lecture notes on limits", "exam review of series", "proof of the theorem"]
+    calls = embedding_env.embeddings.calls
+
+    batched = search_batch_in_document("a", queries, top_k=4)
+
+    assert embedding_env.embeddings.calls == calls + 1
+    assert embedding_env.embeddings.texts >= len(queries)
+    for query, results in zip(queries, batched):
+        single = search_in_document("a", query, top_k=4)
+        assert len(results) == 4
+        assert [(result["text"], result["similarity_score"]) for result in results] == [
+            (result["text"], result["similarity_score"]) for result in single
+        ]
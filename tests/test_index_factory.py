@@ -0,0 +1,46 @@
+import faiss
+import numpy as np
+import pytest
+
+from app.backend.services.index_factory import (
+    RerankingIndex, build_index, get_index_type, get_quantization, wrap_for_search
+)
+
+K = 10
+
+
+def make_vectors(n, dimension=32, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dimension)).astype(np.float32)
+
+
+def recall(labels, truth):
+    return np.mean([len(set(found) & set(expected)) / K for found, expected in zip(labels, truth)])
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+@pytest.mark.parametrize("quantization", ["fp16", "int8"])
+def test_quantized_index_reranked_recall_matches_flat(index_type, quantization):
+    vectors = make_vectors(2000)
+    queries = make_vectors(50, seed=1)
+    _, truth = faiss.knn(queries, vectors, K)
+
+    index = wrap_for_search(build_index(vectors, index_type, quantization), vectors)
+    distances, labels = index.search(queries, K)
+
+    assert isinstance(index, RerankingIndex)
+    assert get_index_type(index) == index_type
+    assert get_quantization(index) == quantization
+    assert recall(labels, truth) >= 0.95
+    # Re-ranked distances are exact distances to the original vectors
+    found = labels >= 0
+    exact = ((vectors[labels[found]] - np.repeat(queries, K, axis=0)[found.ravel()]) ** 2).sum(axis=1)
+    assert np.allclose(distances[found], exact, rtol=1e-4)
+
+
+def test_unquantized_index_is_not_wrapped():
+    vectors = make_vectors(200)
+
+    index = wrap_for_search(build_index(vectors, "flat", "none"), vectors)
+
+    assert not isinstance(index, RerankingIndex)
+    assert get_quantization(index) == "none"
@@ -0,0 +1,147 @@
+import pytest
+
+from app.backend.services import lexical_index
+from app.backend.services.lexical_index import LexicalIndex, fuse_rankings, tokenize
+
+TEXTS = [
+    "The derivative of a function measures its rate of change.",
+    "An integral adds up the area under a curve.",
+    "The fundamental theorem links the derivative and the integral.",
+    "Matrices represent linear maps between vector spaces.",
+    "Eigenvalues of a matrix describe how it stretches vectors.",
+    "A proof by induction covers every natural number.",
+]
+
+
+def test_tokenize_lowercases_terms():
+    assert tokenize("The Derivative, of f(x)!") == ["the", "derivative", "of", "f", "x"]
+
+
+def test_search_ranks_chunks_containing_the_query_terms():
+    index = LexicalIndex.from_texts(TEXTS)
+
+    hits = index.search("derivative integral", 3)
+
+    assert hits[0][1] == 2
+    assert {row for _, row in hits} == {0, 1, 2}
+    assert all(score > 0 for score, _ in hits)
+    assert [score for score, _ in hits] == sorted((score for score, _ in hits), reverse=True)
+
+
+def test_search_is_restricted_to_row_ranges():
+    index = LexicalIndex.from_texts(TEXTS)
+
+    hits = index.search("derivative integral", 5, ranges=[(0, 1), (3, 6)])
+
+    assert [row for _, row in hits] == [0]
+    assert index.search("derivative", 5, ranges=[(3, 6)]) == []
+
+
+def test_summed_statistics_score_like_one_index():
+    whole = LexicalIndex.from_texts(TEXTS)
+    first, second = LexicalIndex.from_texts(TEXTS[:3]), LexicalIndex.from_texts(TEXTS[3:])
+    query = "the matrix derivative"
+    first_stats, second_stats = first.statistics(query), second.statistics(query)
+    statistics = {
+        "rows": first_stats["rows"] + second_stats["rows"],
+        "total_length": first_stats["total_length"] + second_stats["total_length"],
+        "df": {term: first_stats["df"].get(term, 0) + second_stats["df"].get(term, 0)
+               for term in set(first_stats["df"]) | set(second_stats["df"])},
+    }
+
+    merged = first.search(query, 10, statistics=statistics) + [
+        (score, row + 3) for score, row in second.search(query, 10, statistics=statistics)
+    ]
+
+    expected = whole.search(query, 10)
+    assert sorted(row for _, row in merged) == sorted(row for _, row in expected)
+    for score, row in merged:
+        assert score == pytest.approx(dict((r, s) for s, r in expected)[row], rel=1e-5)
+
+
+def test_appended_index_matches_a_rebuilt_one(tmp_path):
+    LexicalIndex.from_texts(TEXTS[:2]).save(str(tmp_path))
+    index = LexicalIndex.load(str(tmp_path))
+    index = index.append(str(tmp_path), TEXTS[2:4], 2)
+    index = index.append(str(tmp_path), TEXTS[4:], 4)
+    rebuilt = LexicalIndex.from_texts(TEXTS)
+
+    for loaded in (index, LexicalIndex.load(str(tmp_path))):
+        assert len(loaded.lengths) == len(TEXTS)
+        for query in ["derivative integral", "matrix vectors", "the", "proof induction number"]:
+            assert loaded.statistics(query) == rebuilt.statistics(query)
+            got, expected = loaded.search(query, 6), rebuilt.search(query, 6)
+            assert [row for _, row in got] == [row for _, row in expected]
+            assert [score for score, _ in got] == pytest.approx([score for score, _ in expected])
+
+
+def test_append_overwrites_rows_left_by_an_interrupted_append(tmp_path):
+    LexicalIndex.from_texts(TEXTS[:2]).save(str(tmp_path))
+    index = LexicalIndex.load(str(tmp_path))
+    # Rows written past the vocabulary are not part of the index
+    LexicalIndex.from_texts(TEXTS[:2]).append(str(tmp_path), ["orphaned rows"], 2)
+    index = index.append(str(tmp_path), TEXTS[2:], 2)
+
+    assert "orphaned" not in index.vocabulary
+    assert [row for _, row in index.search("matrix", 6)] == [row for _, row in LexicalIndex.from_texts(TEXTS).search("matrix", 6)]
+
+
+def test_exact_matches_keep_phrase_hits(monkeypatch):
+    # Every term counts as rare, so only the phrase decides
+    monkeypatch.setattr(lexical_index, "LEXICAL_FAST_PATH_MAX_DF_FRACTION", 1.0)
+    index = LexicalIndex.from_texts(TEXTS)
+    hits = index.search("the derivative", 6)
+
+    exact = index.exact_matches("the derivative", hits, lambda row: TEXTS[row])
+
+    assert [row for _, row in exact] == [row for _, row in hits if row in (0, 2)]
+    assert index.exact_matches("derivative unknownterm", hits, lambda row: TEXTS[row]) == []
+
+
+def test_fuse_rankings_favours_rows_ranked_by_both():
+    fused = fuse_rankings([[1, 2, 3], [3, 1, 4]], k=3, rrf_k=60)
+
+    assert [row for _, row in fused] == [1, 3, 2]
+    assert fused[0][0] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[1][0] == pytest.approx(1 / 63 + 1 / 61)
+    assert len(fuse_rankings([[1, 2, 3], [4, 5]], k=2)) == 2
+
+
+def test_search_over_ranges_matches_filtering_the_full_ranking():
+    texts = [f"term{row % 7} shared {'rare' if row % 11 == 0 else 'common'} words" for row in range(200)]
+    index = LexicalIndex.from_texts(texts)
+    ranges = [(150, 180), (10, 40), (90, 91)]
+
+    hits = index.search("shared rare term3", 200, ranges=ranges)
+
+    selected = [(score, row) for score, row in index.search("shared rare term3", 200)
+                if any(start <= row < end for start, end in ranges)]
+    assert sorted(row for _, row in hits) == sorted(row for _, row in selected)
+    assert [score for score, _ in hits] == pytest.approx(sorted((score for score, _ in selected), reverse=True))
+
+
+def test_questions_of_common_words_skip_the_fast_path(monkeypatch):
+    texts = ["what is a derivative of a function", "a study companion for calculus"] + [
+        f"notes {row} on what a derivative is, a study companion" for row in range(40)
+    ]
+    index = LexicalIndex.from_texts(texts)
+    monkeypatch.setattr(lexical_index, "LEXICAL_FAST_PATH_MAX_DF_FRACTION", 0.05)
+
+    for query in ["what is a derivative", "study companion"]:
+        hits = index.search(query, 10)
+        assert index.exact_matches(query, hits, lambda row: texts[row]) == []
+
+
+def test_identifiers_and_rare_terms_take_the_fast_path(monkeypatch):
+    texts = ["see section 3.2 for max_len", "the softMax layer", "a lemniscate curve"] + [
+        f"common notes on curves {row}" for row in range(40)
+    ]
+    index = LexicalIndex.from_texts(texts)
+    monkeypatch.setattr(lexical_index, "LEXICAL_FAST_PATH_MAX_DF_FRACTION", 0.05)
+
+    for query, row in [("section 3.2", 0), ("max_len", 0), ("softMax", 1), ("lemniscate", 2)]:
+        hits = index.search(query, 10)
+        assert [hit_row for _, hit_row in index.exact_matches(query, hits, lambda row: texts[row])] == [row]
+    # Rarity is judged with summed statistics when given
+    statistics = {"rows": 10, "total_length": 40, "df": {"lemniscate": 1}}
+    assert index.exact_matches("lemniscate", index.search("lemniscate", 10), lambda row: texts[row], statistics) == []
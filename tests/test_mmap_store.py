@@ -0,0 +1,145 @@
+import json
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from langchain_core.documents import Document
+
+from app.backend.services.mmap_store import (
+    LazyChunkList, MmapFlatIndex, append_array, append_chunks, load_mmap_vectorstore, save_index, save_mmap_files,
+    write_chunks
+)
+
+
+def test_append_array_grows_a_saved_array_in_place(tmp_path):
+    path = str(tmp_path / "rows.npy")
+    first = np.arange(12, dtype=np.float32).reshape(4, 3)
+    append_array(path, first, 0)
+    inode = os.stat(path).st_ino
+
+    second = np.arange(100, 106, dtype=np.float32).reshape(2, 3)
+    append_array(path, second, 4)
+
+    assert os.stat(path).st_ino == inode
+    assert np.array_equal(np.load(path), np.concatenate([first, second]))
+    assert np.array_equal(np.load(path, mmap_mode="r"), np.concatenate([first, second]))
+
+
+def test_append_array_overwrites_rows_past_keep_rows(tmp_path):
+    path = str(tmp_path / "rows.npy")
+    append_array(path, np.arange(5, dtype=np.int32), 0)
+
+    append_array(path, np.array([70, 80], dtype=np.int32), 3)
+
+    assert np.load(path).tolist() == [0, 1, 2, 70, 80]
+
+
+def test_append_array_rewrites_arrays_of_another_dtype(tmp_path):
+    path = str(tmp_path / "rows.npy")
+    np.save(path, np.arange(3, dtype=np.int64))
+
+    append_array(path, np.array([9], dtype=np.int32), 3)
+
+    loaded = np.load(path)
+    assert loaded.dtype == np.int32 and loaded.tolist() == [0, 1, 2, 9]
+
+
+def make_chunks(start, n, **metadata):
+    return [
+        Document(page_content=f"chunk {row} text", metadata={"document_id": "doc", "start_index": row * 10, **metadata})
+        for row in range(start, start + n)
+    ]
+
+
+def test_appended_chunks_read_back_like_a_full_write(tmp_path):
+    appended, written = str(tmp_path / "appended"), str(tmp_path / "written")
+    os.makedirs(appended)
+    os.makedirs(written)
+    first, second = make_chunks(0, 3), make_chunks(3, 2, segment_label="page 2")
+    write_chunks(appended, first)
+
+    append_chunks(appended, second, 3)
+    write_chunks(written, first + second)
+
+    appended_chunks, written_chunks = LazyChunkList(appended), LazyChunkList(written)
+    assert len(appended_chunks) == len(written_chunks) == 5
+    for got, expected in zip(appended_chunks, written_chunks):
+        assert got.page_content == expected.page_content
+        assert got.metadata == expected.metadata
+    assert appended_chunks[4].metadata["segment_label"] == "page 2"
+    assert "segment_label" not in appended_chunks[0].metadata
+
+
+def test_mmap_load_mode_matches_memory(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 8)).astype(np.float32)
+    chunks = [Document(page_content=f"chunk {row}", metadata={"row": row}) for row in range(50)]
+    index = faiss.IndexFlatL2(8)
+    index.add(vectors)
+    folder = str(tmp_path / "index")
+    save_mmap_files(folder, vectors, chunks)
+    save_index(folder, index)
+
+    mapped = load_mmap_vectorstore(folder, None, mmap_vectors=True)
+    loaded = load_mmap_vectorstore(folder, None, mmap_vectors=False)
+
+    assert isinstance(mapped.index, MmapFlatIndex)
+    assert not isinstance(loaded.index, MmapFlatIndex)
+    queries = rng.standard_normal((5, 8)).astype(np.float32)
+    mapped_distances, mapped_labels = mapped.index.search(queries, 4)
+    loaded_distances, loaded_labels = loaded.index.search(queries, 4)
+    assert np.array_equal(mapped_labels, loaded_labels)
+    assert np.allclose(mapped_distances, loaded_distances, rtol=1e-5)
+    for query in queries:
+        mapped_hits = mapped.similarity_search_with_score_by_vector(query.tolist(), k=3)
+        loaded_hits = loaded.similarity_search_with_score_by_vector(query.tolist(), k=3)
+        assert [doc.page_content for doc, _ in mapped_hits] == [doc.page_content for doc, _ in loaded_hits]
+        assert [doc.metadata["row"] for doc, _ in mapped_hits] == [int(doc.page_content.split()[1]) for doc, _ in mapped_hits]
+    assert np.array_equal(mapped.index.reconstruct_n(10, 5), vectors[10:15])
+
+
+def test_stores_without_mmap_files_are_not_loaded(tmp_path):
+    assert load_mmap_vectorstore(str(tmp_path), None) is None
+
+
+def test_chunks_round_trip_through_the_columnar_store(tmp_path):
+    chunks = [
+        Document(page_content="Ableitung — f′(x)", metadata={"document_id": "a", "page": 1, "tags": ["calc"]}),
+        Document(page_content="", metadata={"document_id": "a", "page": 2}),
+        Document(page_content="series", metadata={"document_id": "a", "segment": {"type": "slide", "label": "3"}}),
+    ]
+    write_chunks(str(tmp_path), chunks)
+
+    loaded = LazyChunkList(str(tmp_path))
+
+    assert len(loaded) == 3
+    assert [(chunk.page_content, chunk.metadata) for chunk in loaded] == [
+        (chunk.page_content, chunk.metadata) for chunk in chunks
+    ]
+    assert loaded[-1].page_content == "series"
+    assert [chunk.page_content for chunk in loaded[1:]] == ["", "series"]
+    # Each distinct metadata value is stored once
+    assert loaded.values[0] == ["a"]
+    with pytest.raises(IndexError):
+        loaded[3]
+
+
+def test_empty_chunk_store_loads(tmp_path):
+    write_chunks(str(tmp_path), [])
+
+    assert len(LazyChunkList(str(tmp_path))) == 0
+
+
+def test_legacy_chunk_files_are_read(tmp_path):
+    lines = [json.dumps({"page_content": f"chunk {row}", "metadata": {"row": row}}).encode("utf-8") + b"\n"
+             for row in range(3)]
+    (tmp_path / "chunks.jsonl").write_bytes(b"".join(lines))
+    np.save(str(tmp_path / "chunks.offsets.npy"), np.cumsum([0] + [len(line) for line in lines]).astype(np.int64))
+
+    loaded = LazyChunkList(str(tmp_path))
+
+    assert [(chunk.page_content, chunk.metadata) for chunk in loaded] == [
+        (f"chunk {row}", {"row": row}) for row in range(3)
+    ]
@@ -0,0 +1,96 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.backend.services.search_dispatcher import SearchDispatcher
+
+from conftest import N_CALLERS, run_concurrently
+
+
+def slow_search(queries):
+    """Search returning each query's first value as its label, taking a while per batch."""
+    time.sleep(0.02)
+    labels = queries[:, :1].astype(np.int64)
+    return np.zeros_like(labels, dtype=np.float32), labels
+
+
+def test_dispatcher_runs_a_lone_search_without_waiting():
+    dispatcher = SearchDispatcher(window_ms=1000)
+
+    started = time.perf_counter()
+    distances, labels = dispatcher.search("index", slow_search, np.array([[7.0, 0.0]]))
+
+    assert time.perf_counter() - started < 0.5
+    assert labels.tolist() == [[7]]
+    assert dispatcher.stats()["batches"] == 1
+
+
+def test_dispatcher_batches_concurrent_searches():
+    dispatcher = SearchDispatcher(window_ms=50)
+
+    results = run_concurrently(lambda i: dispatcher.search("index", slow_search, np.array([[float(i), 0.0]])))
+
+    assert [labels.tolist() for _, labels in results] == [[[i]] for i in range(N_CALLERS)]
+    stats = dispatcher.stats()
+    assert stats["requests"] == N_CALLERS
+    assert stats["batches"] < N_CALLERS
+    assert stats["mean_batch_size"] > 1
+
+
+def test_dispatcher_keeps_keys_and_multi_row_requests_apart():
+    dispatcher = SearchDispatcher(window_ms=50)
+
+    def search(i):
+        key = "even" if i % 2 == 0 else "odd"
+        return dispatcher.search(key, slow_search, np.array([[float(i), 0.0], [float(i + 100), 0.0]]))
+
+    results = run_concurrently(search)
+
+    assert [labels.tolist() for _, labels in results] == [[[i], [i + 100]] for i in range(N_CALLERS)]
+
+
+def test_dispatcher_closes_full_batches():
+    dispatcher = SearchDispatcher(window_ms=1000, max_batch=4)
+
+    run_concurrently(lambda i: dispatcher.search("index", slow_search, np.array([[float(i), 0.0]])))
+
+    assert all(size <= 4 for size in (int(bucket[2:]) for bucket in dispatcher.stats()["batch_size_histogram"]))
+
+
+def test_dispatcher_passes_search_errors_to_the_caller():
+    dispatcher = SearchDispatcher(window_ms=50)
+
+    def failing_search(queries):
+        raise RuntimeError("index unavailable")
+
+    with pytest.raises(RuntimeError, match="index unavailable"):
+        dispatcher.search("index", failing_search, np.array([[1.0]]))
+
+
+def test_disabled_dispatcher_searches_directly():
+    dispatcher = SearchDispatcher(window_ms=0)
+
+    _, labels = dispatcher.search("index", slow_search, np.array([[3.0]]))
+
+    assert labels.tolist() == [[3]]
+    assert dispatcher.stats()["requests"] == 0
+
+
+def test_dispatcher_only_runs_the_searches_of_its_batches():
+    dispatcher = SearchDispatcher(window_ms=50)
+    calls = []
+
+    def search(queries):
+        calls.append(len(queries))
+        return slow_search(queries)
+
+    for _ in range(3):
+        run_concurrently(lambda i: dispatcher.search("index", search, np.array([[float(i), 0.0]])))
+    dispatcher.search("index", search, np.array([[1.0, 0.0]]))
+
+    stats = dispatcher.stats()
+    assert len(calls) == stats["batches"]
+    assert sum(calls) == stats["requests"] == 3 * N_CALLERS + 1
+    # The unbatched baseline comes from batches that held a single query
+    assert stats["single_search_ms"] is not None
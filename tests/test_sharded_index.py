@@ -0,0 +1,74 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from app.backend.services import sharded_index
+from app.backend.services.sharded_index import ProcessShard
+
+from conftest import run_concurrently
+
+
+class SlowIndex:
+    """Stand-in corpus index whose calls take as long as asked."""
+
+    def __init__(self, index_dir, load_mode):
+        pass
+
+    def echo(self, value, seconds):
+        time.sleep(seconds)
+        return value
+
+    def fail(self):
+        raise ValueError("bad row range")
+
+
+def serve_in_thread(shard, monkeypatch):
+    """Serve a ProcessShard from a thread of this process instead of a worker process."""
+    monkeypatch.setattr(sharded_index, "CorpusIndex", SlowIndex)
+
+    def start():
+        parent_conn, child_conn = multiprocessing.Pipe()
+        shard._process = threading.Thread(
+            target=sharded_index._serve_shard, args=(shard.index_dir, shard.load_mode, child_conn, shard.threads),
+            daemon=True
+        )
+        shard._process.start()
+        shard._conn = parent_conn
+        shard._pending = {}
+        threading.Thread(target=shard._read_answers, args=(parent_conn, shard._pending), daemon=True).start()
+
+    monkeypatch.setattr(shard, "_start", start)
+
+
+def test_concurrent_calls_share_the_worker_pipe(tmp_path, monkeypatch):
+    shard = ProcessShard(str(tmp_path), "memory", threads=16)
+    serve_in_thread(shard, monkeypatch)
+
+    started = time.perf_counter()
+    # Later callers ask for shorter calls, so answers come back out of order
+    results = run_concurrently(lambda i: shard.call("echo", i, 0.3 - i * 0.01))
+
+    assert results == list(range(len(results)))
+    assert time.perf_counter() - started < 1.5
+
+
+def test_worker_errors_reach_the_caller(tmp_path, monkeypatch):
+    shard = ProcessShard(str(tmp_path), "memory")
+    serve_in_thread(shard, monkeypatch)
+
+    with pytest.raises(RuntimeError, match="bad row range"):
+        shard.call("fail")
+    assert shard.call("echo", "still serving", 0) == "still serving"
+
+
+def test_shard_workers_are_claimed_once_per_host(tmp_path):
+    index_dir = str(tmp_path / "shard-00")
+
+    owner = sharded_index._claim_shard(index_dir)
+    assert owner is not None
+    assert sharded_index._claim_shard(index_dir) is None
+
+    owner.close()
+    assert sharded_index._claim_shard(index_dir) is not None
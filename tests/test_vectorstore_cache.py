@@ -0,0 +1,124 @@
+import os
+import types
+
+import numpy as np
+
+from app.backend.services import vectorstore_cache
+from app.backend.services.embedding_service import generate_embeddings_for_document, search_in_document
+from app.backend.services.vectorstore_cache import VectorStoreCache, get_vectorstore_cache
+
+from conftest import make_text
+
+
+class FakeIndex:
+    def __init__(self, size):
+        self.resident_bytes = size
+
+
+def make_store(size):
+    return types.SimpleNamespace(index=FakeIndex(size), docstore=None)
+
+
+def make_saved_index(tmp_path, name):
+    path = tmp_path / name
+    path.mkdir()
+    (path / "index.faiss").write_bytes(b"index")
+    return str(path)
+
+
+def count_stats(monkeypatch):
+    calls = []
+    getmtime = os.path.getmtime
+
+    def counting_getmtime(path):
+        calls.append(path)
+        return getmtime(path)
+
+    monkeypatch.setattr(vectorstore_cache.os.path, "getmtime", counting_getmtime)
+    return calls
+
+
+def test_hits_do_not_touch_the_disk(tmp_path, monkeypatch):
+    cache = VectorStoreCache(max_bytes=1000, revalidate_seconds=60)
+    path = make_saved_index(tmp_path, "a")
+    store = make_store(100)
+    loads = []
+    stats = count_stats(monkeypatch)
+
+    def loader():
+        loads.append(1)
+        return store
+
+    assert cache.get("a", path, loader) is store
+    assert cache.get("a", path, loader) is store
+    assert cache.get("a", path, loader) is store
+
+    assert len(loads) == 1
+    assert len(stats) == 1
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["resident_bytes"] == 100
+
+
+def test_least_recently_used_stores_are_evicted(tmp_path):
+    cache = VectorStoreCache(max_bytes=250, revalidate_seconds=60)
+    paths = {name: make_saved_index(tmp_path, name) for name in "abc"}
+    stores = {name: make_store(100) for name in "abc"}
+
+    cache.get("a", paths["a"], lambda: stores["a"])
+    cache.get("b", paths["b"], lambda: stores["b"])
+    cache.get("a", paths["a"], lambda: stores["a"])
+    cache.get("c", paths["c"], lambda: stores["c"])
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["resident_bytes"] == 200
+    # "b" was used least recently, so it was evicted and loads again
+    assert list(cache._entries) == ["a", "c"]
+    reloaded = make_store(100)
+    assert cache.get("b", paths["b"], lambda: reloaded) is reloaded
+
+
+def test_invalidate_drops_the_store(tmp_path):
+    cache = VectorStoreCache(max_bytes=1000, revalidate_seconds=60)
+    path = make_saved_index(tmp_path, "a")
+    old, new = make_store(100), make_store(50)
+
+    cache.get("a", path, lambda: old)
+    cache.invalidate("a")
+
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["resident_bytes"] == 0
+    assert cache.get("a", path, lambda: new) is new
+    assert cache.stats()["resident_bytes"] == 50
+
+
+def test_rewritten_index_is_reloaded_after_revalidation(tmp_path, monkeypatch):
+    cache = VectorStoreCache(max_bytes=1000, revalidate_seconds=0)
+    path = make_saved_index(tmp_path, "a")
+    old, new = make_store(100), make_store(100)
+    stats = count_stats(monkeypatch)
+
+    cache.get("a", path, lambda: old)
+    # Unchanged index: revalidated by its mtime and served from memory
+    assert cache.get("a", path, lambda: new) is old
+    os.utime(os.path.join(path, "index.faiss"), (0, 0))
+
+    assert cache.get("a", path, lambda: new) is new
+    assert len(stats) == 3
+    assert cache.stats()["hits"] == 1
+
+
+def test_loaded_document_stores_are_measured(embedding_env):
+    embedding_env.write_document("a", make_text(0))
+    assert generate_embeddings_for_document("a")
+
+    assert search_in_document("a", "lecture notes", top_k=3)
+    assert search_in_document("a", "exam review", top_k=3)
+
+    stats = get_vectorstore_cache().stats()
+    store = get_vectorstore_cache()._entries["a"]["vectorstore"]
+    assert stats["entries"] == 1
+    assert stats["hits"] >= 1
+    assert stats["resident_bytes"] >= store.stored_vectors.nbytes + store.docstore.chunks.resident_bytes
+    assert stats["resident_bytes"] > np.asarray(store.stored_vectors).nbytes
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+from app.backend.api import main
+from app.backend.services import embedding_service, warmup
+from app.backend.services.warmup import ActivityLog, WarmupManager, get_activity_log
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_activity_log_keeps_the_most_used_recent_sets(tmp_path, monkeypatch):
+    log = ActivityLog(str(tmp_path / "activity.json"), max_sets=2)
+    log.record(["b", "a"])
+    log.record(["c"])
+    # Uses within the record interval are not written again
+    log.record(["a", "b"])
+    assert sorted(log.recent()) == [["a", "b"], ["c"]]
+
+    monkeypatch.setattr(warmup, "RECORD_INTERVAL_SECONDS", 0)
+    log.record(["a", "b"])
+    log.record(["d"])
+
+    # The least recently used set is dropped; the rest are ordered by use count
+    assert ActivityLog(str(tmp_path / "activity.json"), max_sets=2).recent() == [["a", "b"], ["d"]]
+
+
+def test_ready_reports_warming_until_the_timeout(embedding_env, monkeypatch):
+    release = threading.Event()
+    warmed = []
+
+    def warm_documents(document_ids):
+        release.wait(5)
+        warmed.append(document_ids)
+        return 3
+
+    monkeypatch.setattr(embedding_service, "warm_documents", warm_documents)
+    get_activity_log().record(["a", "b"])
+    manager = WarmupManager(timeout_seconds=0.3)
+    monkeypatch.setattr(main, "get_warmup_manager", lambda: manager)
+
+    manager.start()
+    response = asyncio.run(main.readiness_check())
+    assert response.status_code == 503
+
+    assert wait_for(manager.is_ready)
+    assert manager.stats()["status"] == "timed_out"
+    assert asyncio.run(main.readiness_check())["status"] == "ready"
+
+    # The set still loading finishes in the background
+    release.set()
+    assert wait_for(lambda: manager.stats()["status"] == "ready")
+    stats = manager.stats()
+    assert warmed == [["a", "b"]]
+    assert (stats["sets_total"], stats["sets_warmed"], stats["rows_warmed"]) == (1, 1, 3)
+
+
+def test_failed_sets_do_not_block_readiness(embedding_env, monkeypatch):
+    def warm_documents(document_ids):
+        raise RuntimeError("index missing")
+
+    monkeypatch.setattr(embedding_service, "warm_documents", warm_documents)
+    get_activity_log().record(["a"])
+    manager = WarmupManager(timeout_seconds=60)
+
+    manager.start()
+
+    assert wait_for(lambda: manager.stats()["status"] == "ready")
+    assert manager.is_ready()
+    assert manager.stats()["sets_failed"] == 1